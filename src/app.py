@@ -1,21 +1,37 @@
 import sys
 from flask import Flask
 from flask_cors import CORS
-from routes.detectionRoutes import detection_api
 import os
 
-# Création du dossier 'uploads' s'il n'existe pas
 UPLOAD_FOLDER = "uploads"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app = Flask(__name__)
-CORS(app)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-# Configuration du dossier d'upload
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-# Enregistrer les routes
-app.register_blueprint(detection_api, url_prefix="/api/detection")
+def create_app():
+    """Application Flask et routes (l'import des routes crée le détecteur partagé et les files d'analyse)."""
+    from routes.detectionRoutes import detection_api
+
+    # Création du dossier 'uploads' s'il n'existe pas
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    app = Flask(__name__)
+    CORS(app)
+
+    # Configuration du dossier d'upload
+    app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+
+    # Enregistrer les routes
+    app.register_blueprint(detection_api, url_prefix="/api/detection")
+    return app
+
+
+# Les workers « spawn » (pool d'inférence, analyse par segments) réimportent le module principal sous le
+# nom `__mp_main__` : ils n'ont besoin ni de l'application ni des routes.
+if __name__ != "__mp_main__":
+    app = create_app()
 
 if __name__ == "__main__":
+    # 🔥 Préchargement optionnel du modèle (sinon il est chargé à la première requête)
+    if os.getenv("MODEL_WARMUP", "0") == "1":
+        from models.yoloModel import get_model
+        get_model(warmup=True)
     app.run(debug=True, port=5000)
@@ -0,0 +1,146 @@
+"""
+⚖️ Parité d'un moteur d'inférence exporté (ONNX, ONNX INT8, OpenVINO) avec le modèle PyTorch.
+
+Les deux modèles analysent les mêmes images ; une détection du moteur testé correspond à une détection
+de référence de même classe avec un IoU >= `--iou`. Le script rapporte rappel, précision, IoU moyen,
+écart de confiance et débit de chaque moteur, et sort en erreur si le rappel ou la précision passent
+sous `--min-recall` / `--min-precision` (utilisable en CI avant de changer INFERENCE_BACKEND).
+
+Usage (depuis le dossier src) :
+    python -m benchmarks.backendParity chemin/vers/video.mp4 --backend onnx --frames 200
+    python -m benchmarks.backendParity img1.jpg img2.jpg --backend onnx-int8 --model n --threads 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from models.inferenceBackends import BACKENDS  # noqa: E402
+from models.yoloModel import get_model, run_inference  # noqa: E402
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+
+
+def load_images(paths, frame_count):
+    """Images données, ou `frame_count` frames réparties sur la durée de chaque vidéo."""
+    images = []
+    for path in paths:
+        if not path.lower().endswith(VIDEO_EXTENSIONS):
+            image = cv2.imread(path)
+            if image is None:
+                raise ValueError(f"Image illisible : {path}")
+            images.append(image)
+            continue
+        cap = cv2.VideoCapture(path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        for index in np.linspace(0, max(total - 1, 0), num=min(frame_count, max(total, 1))).astype(int).tolist():
+            cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ok, frame = cap.read()
+            if ok:
+                images.append(frame)
+        cap.release()
+    if not images:
+        raise ValueError("Aucune image à analyser")
+    return images
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU de toutes les paires de boîtes (N, 4) x (M, 4)."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def match(reference: np.ndarray, candidate: np.ndarray, iou_threshold: float):
+    """Appariement glouton par IoU décroissant, à classe égale ; retourne les paires (i_ref, i_cand, iou)."""
+    if not len(reference) or not len(candidate):
+        return []
+    ious = box_iou(reference[:, :4], candidate[:, :4])
+    ious[reference[:, None, 5] != candidate[None, :, 5]] = 0
+    pairs, used_reference, used_candidate = [], set(), set()
+    for flat in np.argsort(-ious, axis=None):
+        i, j = (int(v) for v in np.unravel_index(flat, ious.shape))
+        if ious[i, j] < iou_threshold:
+            break
+        if i not in used_reference and j not in used_candidate:
+            pairs.append((i, j, float(ious[i, j])))
+            used_reference.add(i)
+            used_candidate.add(j)
+    return pairs
+
+
+def timed_inference(model, images, batch_size, imgsz):
+    outputs = []
+    start = time.perf_counter()
+    for index in range(0, len(images), batch_size):
+        outputs.extend(run_inference(images[index:index + batch_size], model=model, imgsz=imgsz))
+    return outputs, len(images) / (time.perf_counter() - start)
+
+
+def compare(images, model_name, backend, threads=None, batch_size=1, imgsz=640, iou_threshold=0.5):
+    reference_model = get_model(model_name, device="cpu", backend="torch", threads=threads, warmup=True)
+    candidate_model = get_model(model_name, backend=backend, threads=threads, warmup=True)
+    reference, reference_fps = timed_inference(reference_model, images, batch_size, imgsz)
+    candidate, candidate_fps = timed_inference(candidate_model, images, batch_size, imgsz)
+
+    matched = reference_total = candidate_total = 0
+    ious, confidence_deltas = [], []
+    for expected, found in zip(reference, candidate):
+        pairs = match(expected, found, iou_threshold)
+        matched += len(pairs)
+        reference_total += len(expected)
+        candidate_total += len(found)
+        for i, j, iou in pairs:
+            ious.append(iou)
+            confidence_deltas.append(abs(float(expected[i, 4]) - float(found[j, 4])))
+    return {
+        "images": len(images),
+        "backend": backend,
+        "reference_detections": reference_total,
+        "candidate_detections": candidate_total,
+        "recall": round(matched / reference_total, 4) if reference_total else 1.0,
+        "precision": round(matched / candidate_total, 4) if candidate_total else 1.0,
+        "mean_iou": round(float(np.mean(ious)), 4) if ious else None,
+        "max_confidence_delta": round(max(confidence_deltas), 4) if confidence_deltas else None,
+        "torch_fps": round(reference_fps, 2),
+        "candidate_fps": round(candidate_fps, 2),
+        "speedup": round(candidate_fps / reference_fps, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parité d'un moteur d'inférence exporté avec PyTorch")
+    parser.add_argument("inputs", nargs="+", help="Images ou vidéos de test")
+    parser.add_argument("--backend", choices=[name for name in BACKENDS if name != "torch"], default="onnx")
+    parser.add_argument("--model", default=None, help="n/s/m/l/x ou fichier de poids (défaut : YOLO_MODEL)")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--frames", type=int, default=100, help="Frames échantillonnées par vidéo")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU minimal d'une correspondance")
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    parser.add_argument("--min-precision", type=float, default=0.95)
+    args = parser.parse_args()
+
+    images = load_images(args.inputs, args.frames)
+    report = compare(images, args.model, args.backend, args.threads, args.batch_size, args.imgsz, args.iou)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if report["recall"] < args.min_recall or report["precision"] < args.min_precision:
+        print(f"❌ Parité insuffisante (rappel {report['recall']}, précision {report['precision']})")
+        sys.exit(1)
+    print(f"✅ Parité atteinte, x{report['speedup']} plus rapide que PyTorch")
+
+
+if __name__ == "__main__":
+    main()
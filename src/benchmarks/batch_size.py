@@ -0,0 +1,57 @@
+"""
+⏱️ Benchmark du débit (fps) de IntruderDetector.detect_intruder_in_video selon la taille de paquet.
+
+Usage (depuis le dossier src) :
+    python -m benchmarks.batch_size chemin/vers/video.mp4 --batch-sizes 1 2 4 8 16
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controllers.detect_intruder_video import IntruderDetector  # noqa: E402
+
+
+def run(video_path, batch_sizes, repeats=1):
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if total_frames <= 0:
+        raise ValueError(f"Vidéo illisible ou vide : {video_path}")
+
+    rows = []
+    for batch_size in batch_sizes:
+        detector = IntruderDetector(batch_size=batch_size)
+        durations = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = detector.detect_intruder_in_video(video_path)
+            durations.append(time.perf_counter() - start)
+            if result.get("status") != "success":
+                raise RuntimeError(result.get("message"))
+        best = min(durations)
+        rows.append((batch_size, best, total_frames / best))
+    return total_frames, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit de l'analyse vidéo en fonction de la taille de paquet")
+    parser.add_argument("video", help="Vidéo de test")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--repeats", type=int, default=1, help="Nombre d'exécutions par taille (on garde la meilleure)")
+    args = parser.parse_args()
+
+    total_frames, rows = run(args.video, args.batch_sizes, args.repeats)
+    baseline_fps = rows[0][2]
+    print(f"\n{total_frames} frames analysées")
+    print(f"{'batch':>6} | {'durée (s)':>10} | {'fps':>8} | {'gain':>6}")
+    for batch_size, duration, fps in rows:
+        print(f"{batch_size:>6} | {duration:>10.2f} | {fps:>8.2f} | x{fps / baseline_fps:>5.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+🧪 Modèle factice, compatible avec l'interface YOLO utilisée par le projet.
+
+Il « détecte » comme personnes (classe 0) les zones claires des scènes synthétiques, par seuillage
+et composantes connexes. Son coût est quasi nul (optionnellement une latence fixe par image), ce qui
+isole le coût du reste du pipeline : décodage, suivi, annotation, encodage et alertes.
+"""
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import OBJECT_INTENSITY
+
+
+class _Tensor:
+    """Imite un tenseur torch : `.cpu().numpy()`."""
+
+    def __init__(self, array):
+        self._array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._array
+
+
+class _Boxes:
+    def __init__(self, data):
+        self.data = _Tensor(data)
+
+
+class _Result:
+    def __init__(self, data):
+        self.boxes = _Boxes(data)
+
+
+class StubModel:
+    def __init__(self, latency_ms: float = 0.0, min_area: int = 100, confidence: float = 0.9):
+        self.latency_ms = latency_ms  # Latence simulée par image (entrée 640 px)
+        self.min_area = min_area
+        self.confidence = confidence
+        self.overrides = {}
+        self.calls = 0
+        self.images = 0
+
+    def _detect(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        _, mask = cv2.threshold(gray, OBJECT_INTENSITY - 20, 255, cv2.THRESH_BINARY)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+        stats = stats[1:count]  # Composante 0 : le fond
+        stats = stats[stats[:, cv2.CC_STAT_AREA] >= self.min_area]
+        data = np.empty((len(stats), 6), dtype=np.float32)
+        data[:, 0] = stats[:, cv2.CC_STAT_LEFT]
+        data[:, 1] = stats[:, cv2.CC_STAT_TOP]
+        data[:, 2] = stats[:, cv2.CC_STAT_LEFT] + stats[:, cv2.CC_STAT_WIDTH]
+        data[:, 3] = stats[:, cv2.CC_STAT_TOP] + stats[:, cv2.CC_STAT_HEIGHT]
+        data[:, 4] = self.confidence
+        data[:, 5] = 0
+        return _Result(data)
+
+    def __call__(self, frames, verbose=False, **kwargs):
+        if isinstance(frames, np.ndarray):
+            frames = [frames]
+        self.calls += 1
+        self.images += len(frames)
+        if self.latency_ms:
+            # Coût proportionnel au nombre de pixels d'entrée (référence : imgsz 640)
+            scale = (kwargs.get("imgsz", 640) / 640) ** 2
+            time.sleep(self.latency_ms * scale * len(frames) / 1000)
+        return [self._detect(frame) for frame in frames]
@@ -0,0 +1,361 @@
+"""
+📊 Suite de benchmarks reproductibles du pipeline de détection.
+
+Scénarios (sur des données synthétiques générées localement, sans réseau) :
+- `video`  : IntruderDetector.detect_intruder_in_video (fps, latence par étage, alertes/s)
+- `image`  : detectionController.detect_intruder (latence par image)
+- `image_batch` : detectionController.detect_intruders_batch sur les mêmes images (images/s)
+- `motion` : MotionDetector.analyze_motion (latence par frame)
+- `alerts` : models.alertModel.save_alert + écriture groupée (alertes/s)
+
+Par défaut le modèle est un modèle factice (`--model stub`) et les alertes sont écrites dans une
+collection en mémoire (`--alerts memory`) : les résultats ne dépendent ni d'un GPU ni de MongoDB.
+
+Usage (depuis le dossier src) :
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --width 1920 --height 1080 --frames 600 --objects 8 --batch-size 4
+    python -m benchmarks.suite --model n --baseline bench.json   # yolov8n sur CPU, comparaison
+    python -m benchmarks.suite --inference-workers 4             # modèle répliqué dans 4 processus
+"""
+import argparse
+import contextlib
+import functools
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.stubModel import StubModel  # noqa: E402
+from benchmarks.synthetic import generate_frames, generate_image, generate_video  # noqa: E402
+from controllers.detect_behavior import MotionDetector  # noqa: E402
+from controllers.detect_intruder_video import IntruderDetector  # noqa: E402
+from controllers.detectionController import detect_intruder, detect_intruders_batch  # noqa: E402
+from models import alertModel  # noqa: E402
+from models.inferencePool import InferencePool  # noqa: E402
+from models.alertWriter import AlertWriter  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS = ("video", "image", "image_batch", "motion", "alerts")
+PERCENTILES = (50, 90, 99)
+# Métriques comparées à la référence : (chemin, sens) ; +1 = plus grand est meilleur
+COMPARED_METRICS = (("fps", 1), ("alerts_per_s", 1), ("latency_ms.total.p50", -1), ("latency_ms.total.p99", -1))
+
+
+# ----------------------------------------------------------------- mesures
+class LatencyRecorder:
+    """Accumule des durées par étage (ms par frame) ; appelable comme `stage_observer`."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def __call__(self, stage, seconds, frames=1):
+        self.samples.setdefault(stage, []).append(seconds * 1000 / max(frames, 1))
+
+    def summary(self):
+        return {stage: latency_summary(values) for stage, values in self.samples.items()}
+
+
+def latency_summary(values):
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return {}
+    summary = {f"p{p}": round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+    summary["mean"] = round(float(values.mean()), 3)
+    summary["count"] = int(len(values))
+    return summary
+
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus depuis son démarrage (None si indisponible)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux : kilo-octets ; macOS : octets
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class _MemoryCollection:
+    """Collection en mémoire : mesure le coût de l'application sans celui du réseau."""
+
+    def __init__(self):
+        self.count = 0
+
+    def insert_many(self, documents, ordered=True):
+        self.count += len(documents)
+
+    def bulk_write(self, requests, ordered=True):
+        self.count += len(requests)  # Révisions d'évènements d'alerte (ReplaceOne upsert)
+
+
+@contextlib.contextmanager
+def alert_sink(mode, work_dir):
+    """Redirige `save_alert` vers un writer dont la collection est en mémoire (`memory`) ou MongoDB (`mongo`)."""
+    if mode == "mongo":
+        yield alertModel.alert_writer
+        return
+    collection = _MemoryCollection()
+    writer = AlertWriter(lambda: collection, lambda: True, spool_path=os.path.join(work_dir, "spool.jsonl"))
+    original = alertModel.alert_writer
+    alertModel.alert_writer = writer
+    try:
+        yield writer
+    finally:
+        writer.close()
+        alertModel.alert_writer = original
+
+
+def _load_model(name, stub_latency_ms, inference_workers=0):
+    """Modèle du benchmark ; avec `inference_workers`, répliqué dans un pool de processus."""
+    from models.yoloModel import get_model
+    if name == "stub":
+        factory = functools.partial(StubModel, latency_ms=stub_latency_ms)
+    else:
+        factory = functools.partial(get_model, name, None, "fp32", True)
+    if inference_workers > 0:
+        return InferencePool(factory, inference_workers, name="bench")
+    return factory()
+
+
+# --------------------------------------------------------------- scénarios
+def bench_video(args, model, video_path, work_dir):
+    latencies = LatencyRecorder()
+    detector = IntruderDetector(batch_size=args.batch_size, motion_gating=args.motion_gating,
+                                pipeline=args.pipeline, model=model, stage_observer=latencies,
+                                render_video=args.render_video)
+    alerts = 0
+
+    def count_alerts(frame_number, time_s, detections, frame_alerts):
+        nonlocal alerts
+        alerts += len(frame_alerts)
+
+    with alert_sink(args.alerts, work_dir) as writer:
+        start = time.perf_counter()
+        result = detector.detect_intruder_in_video(video_path, frame_callback=count_alerts,
+                                                   collect_detections=False)
+        writer.flush()
+        elapsed = time.perf_counter() - start
+    if result.get("status") != "success":
+        raise RuntimeError(result.get("message"))
+    shutil.rmtree(os.path.dirname(result["detections_path"]), ignore_errors=True)
+
+    summary = latencies.summary()
+    frame_totals = np.sum([latencies.samples[stage] for stage in ("decode", "inference", "encode")], axis=0)
+    summary["total"] = latency_summary(frame_totals)
+    frames = result["stage_stats"]["encode"]["frames"]
+    return {
+        "frames": frames,
+        "duration_s": round(elapsed, 3),
+        "fps": round(frames / elapsed, 2),
+        "alerts": alerts,
+        "alerts_per_s": round(alerts / elapsed, 1),
+        "frames_inferred": result["frames_inferred"],
+        "bottleneck": result["bottleneck"],
+        "latency_ms": summary,
+    }
+
+
+def bench_image(args, model, work_dir):
+    paths = [generate_image(os.path.join(work_dir, f"image_{index}.jpg"), args.width, args.height,
+                            args.objects, seed=args.seed + index) for index in range(args.images)]
+    latencies = LatencyRecorder()
+    start = time.perf_counter()
+    for path in paths:
+        image_start = time.perf_counter()
+        result = detect_intruder(path, model=model, save_annotated=args.save_annotated)
+        latencies("total", time.perf_counter() - image_start)
+        if result.get("status") != "success":
+            raise RuntimeError(result.get("message"))
+    elapsed = time.perf_counter() - start
+    return {"images": len(paths), "duration_s": round(elapsed, 3), "fps": round(len(paths) / elapsed, 2),
+            "latency_ms": latencies.summary()}
+
+
+def bench_image_batch(args, model, work_dir):
+    images = []
+    for index in range(args.images):
+        path = generate_image(os.path.join(work_dir, f"image_{index}.jpg"), args.width, args.height,
+                              args.objects, seed=args.seed + index)
+        with open(path, "rb") as image_file:
+            images.append((os.path.basename(path), image_file.read()))
+    start = time.perf_counter()
+    results = detect_intruders_batch(images, model=model, save_annotated=args.save_annotated,
+                                     output_dir=os.path.join(work_dir, "annotated"), max_batch=args.image_batch_size)
+    elapsed = time.perf_counter() - start
+    failed = [result for result in results if result.get("status") != "success"]
+    if failed:
+        raise RuntimeError(failed[0].get("message"))
+    latencies = LatencyRecorder()
+    latencies("total", elapsed, frames=len(images))  # Coût amorti par image
+    return {"images": len(images), "duration_s": round(elapsed, 3), "fps": round(len(images) / elapsed, 2),
+            "latency_ms": latencies.summary()}
+
+
+def bench_motion(args):
+    frames = list(generate_frames(args.width, args.height, min(args.frames, 300), args.objects, args.seed))
+    detector = MotionDetector()
+    latencies = LatencyRecorder()
+    start = time.perf_counter()
+    for frame in frames:
+        frame_start = time.perf_counter()
+        detector.analyze_motion(frame)
+        latencies("total", time.perf_counter() - frame_start)
+    elapsed = time.perf_counter() - start
+    return {"frames": len(frames), "duration_s": round(elapsed, 3), "fps": round(len(frames) / elapsed, 2),
+            "latency_ms": latencies.summary()}
+
+
+def bench_alerts(args, work_dir):
+    latencies = LatencyRecorder()
+    with alert_sink(args.alerts, work_dir) as writer:
+        start = time.perf_counter()
+        for index in range(args.alert_count):
+            call_start = time.perf_counter()
+            alertModel.save_alert("Personne", 0.9, [10, 20, 110, 220], 3.0, index % 2 == 0,
+                                  frame=index, video_path="benchmark.mp4", track_id=index % 50)
+            latencies("total", time.perf_counter() - call_start)
+        alertModel.close_alert_events("benchmark.mp4")
+        writer.flush(timeout=60)
+        elapsed = time.perf_counter() - start
+    return {"alerts": args.alert_count, "duration_s": round(elapsed, 3),
+            "alerts_per_s": round(args.alert_count / elapsed, 1), "latency_ms": latencies.summary()}
+
+
+# -------------------------------------------------------------- comparaison
+def _lookup(result, path):
+    for key in path.split("."):
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+
+def compare(current, baseline, tolerance):
+    """Écarts relatifs avec la référence ; une régression dépasse `tolerance` dans le mauvais sens."""
+    rows = []
+    for scenario, result in current["scenarios"].items():
+        reference = baseline.get("scenarios", {}).get(scenario)
+        if reference is None:
+            continue
+        for path, direction in COMPARED_METRICS:
+            value, reference_value = _lookup(result, path), _lookup(reference, path)
+            if not value or not reference_value:
+                continue
+            change = (value - reference_value) / reference_value
+            rows.append({"scenario": scenario, "metric": path, "baseline": reference_value, "current": value,
+                         "change": round(change, 4), "regression": change * direction < -tolerance})
+    return rows
+
+
+# ---------------------------------------------------------------------- CLI
+def run(args):
+    work_dir = tempfile.mkdtemp(prefix="intrusdetect-bench-")
+    model = None
+    try:
+        model = _load_model(args.model, args.stub_latency_ms, args.inference_workers)
+        scenarios = {}
+        if "video" in args.scenarios:
+            video_path = generate_video(os.path.join(work_dir, "synthetic.mp4"), args.width, args.height,
+                                        args.frames, args.objects, args.fps, args.seed)
+            scenarios["video"] = bench_video(args, model, video_path, work_dir)
+        if "image" in args.scenarios:
+            scenarios["image"] = bench_image(args, model, work_dir)
+        if "image_batch" in args.scenarios:
+            scenarios["image_batch"] = bench_image_batch(args, model, work_dir)
+        if "motion" in args.scenarios:
+            scenarios["motion"] = bench_motion(args)
+        if "alerts" in args.scenarios:
+            scenarios["alerts"] = bench_alerts(args, work_dir)
+        for result in scenarios.values():
+            result["peak_rss_mb"] = peak_rss_mb()  # Pic cumulé du processus à la fin du scénario
+    finally:
+        if isinstance(model, InferencePool):
+            model.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "tolerance")}
+    return {
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "processor": platform.processor(), "cpu_count": os.cpu_count(),
+                        "opencv": cv2.__version__, "numpy": np.__version__},
+        "config": config,
+        "scenarios": scenarios,
+    }
+
+
+def _print_report(report, comparison):
+    for scenario, result in report["scenarios"].items():
+        rate = f"{result['fps']} fps" if "fps" in result else f"{result['alerts_per_s']} alertes/s"
+        total = result["latency_ms"].get("total", {})
+        print(f"{scenario:>7} | {rate:>16} | p50 {total.get('p50')} ms | p99 {total.get('p99')} ms"
+              f" | RSS max {result['peak_rss_mb']} Mo")
+        for stage in ("decode", "inference", "encode"):
+            if stage in result["latency_ms"]:
+                stage_latency = result["latency_ms"][stage]
+                print(f"{'':>7} |   {stage:<9} p50 {stage_latency['p50']} ms | p99 {stage_latency['p99']} ms")
+    if comparison:
+        print("\nComparaison avec la référence :")
+        for row in comparison:
+            flag = "⚠️ régression" if row["regression"] else ""
+            print(f"{row['scenario']:>7} | {row['metric']:<22} | {row['baseline']:>10} -> {row['current']:>10}"
+                  f" ({row['change']:+.1%}) {flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks reproductibles du pipeline de détection")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--frames", type=int, default=300, help="Longueur de la vidéo synthétique")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--objects", type=int, default=3, help="Nombre d'objets en mouvement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--images", type=int, default=20, help="Nombre d'images du scénario image")
+    parser.add_argument("--save-annotated", action="store_true", help="Inclure l'écriture des images annotées")
+    parser.add_argument("--image-batch-size", type=int, default=16, help="Images par appel au modèle (image_batch)")
+    parser.add_argument("--alert-count", type=int, default=5000, help="Nombre d'alertes du scénario alerts")
+    parser.add_argument("--model", default="stub", help="stub (défaut), ou n/s/m/l/x / fichier de poids YOLO")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="Latence simulée du modèle factice")
+    parser.add_argument("--inference-workers", type=int, default=0,
+                        help="Processus d'inférence (0 : modèle dans le processus du benchmark)")
+    parser.add_argument("--alerts", choices=("memory", "mongo"), default="memory")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--motion-gating", action="store_true")
+    parser.add_argument("--pipeline", action="store_true")
+    parser.add_argument("--render-video", action="store_true", help="Encoder la vidéo annotée pendant l'analyse")
+    parser.add_argument("--output", help="Fichier JSON de résultats")
+    parser.add_argument("--baseline", help="Résultats JSON de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Écart relatif toléré avant régression")
+    args = parser.parse_args()
+
+    report = run(args)
+    comparison = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            comparison = compare(report, json.load(baseline_file), args.tolerance)
+        report["comparison"] = {"baseline": args.baseline, "tolerance": args.tolerance, "metrics": comparison}
+
+    _print_report(report, comparison)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\n💾 Résultats enregistrés dans {args.output}")
+    # Code de sortie non nul en cas de régression (utilisable en intégration continue)
+    sys.exit(1 if any(row["regression"] for row in comparison) else 0)
+
+
+if __name__ == "__main__":
+    main()
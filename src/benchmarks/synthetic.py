@@ -0,0 +1,75 @@
+"""
+🎬 Génération locale de vidéos et d'images de test (aucun accès réseau).
+
+Des rectangles clairs (les « intrus ») se déplacent en ligne droite et rebondissent sur les bords
+d'un fond texturé légèrement bruité. Tout est déterminé par `seed` : deux exécutions avec les mêmes
+paramètres produisent exactement les mêmes images.
+"""
+import os
+
+import cv2
+import numpy as np
+
+OBJECT_INTENSITY = 235  # Les objets sont plus clairs que tout le fond (repérables par seuillage)
+BACKGROUND_MAX = 150
+
+
+def _background(width, height, rng):
+    """Fond fixe : dégradé + texture, pour que la compression et la soustraction de fond travaillent."""
+    gradient = np.linspace(40, 110, width, dtype=np.float32)[None, :].repeat(height, axis=0)
+    texture = rng.integers(0, 40, size=(height, width), dtype=np.int16).astype(np.float32)
+    gray = np.clip(gradient + texture, 0, BACKGROUND_MAX).astype(np.uint8)
+    return cv2.merge([gray, gray, gray])
+
+
+def _initial_objects(width, height, objects, rng):
+    sizes = np.stack([rng.integers(width // 20, width // 8, objects),
+                      rng.integers(height // 8, height // 3, objects)], axis=1)
+    positions = rng.uniform(0, 1, (objects, 2)) * (np.array([width, height]) - sizes)
+    velocities = rng.uniform(2, 12, (objects, 2)) * rng.choice([-1, 1], (objects, 2))
+    return positions, sizes, velocities
+
+
+def _draw(background, positions, sizes, rng, noise):
+    frame = background.copy()
+    for (x, y), (w, h) in zip(positions.astype(int), sizes):
+        cv2.rectangle(frame, (x, y), (x + int(w), y + int(h)), (OBJECT_INTENSITY,) * 3, -1)
+    if noise:
+        frame = cv2.add(frame, rng.integers(0, noise, frame.shape, dtype=np.uint8))
+    return frame
+
+
+def generate_frames(width=1280, height=720, frames=300, objects=3, seed=0, noise=6):
+    """Itère sur les frames (BGR) d'une scène synthétique."""
+    rng = np.random.default_rng(seed)
+    background = _background(width, height, rng)
+    positions, sizes, velocities = _initial_objects(width, height, objects, rng)
+    limits = np.array([width, height]) - sizes
+    for _ in range(frames):
+        yield _draw(background, positions, sizes, rng, noise)
+        positions = positions + velocities
+        # Rebond sur les bords
+        bounced = (positions < 0) | (positions > limits)
+        velocities = np.where(bounced, -velocities, velocities)
+        positions = np.clip(positions, 0, limits)
+
+
+def generate_video(path, width=1280, height=720, frames=300, objects=3, fps=30, seed=0):
+    """Écrit une vidéo MP4 synthétique et retourne son chemin."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not out.isOpened():
+        raise RuntimeError(f"Impossible d'écrire la vidéo de test : {path}")
+    for frame in generate_frames(width, height, frames, objects, seed):
+        out.write(frame)
+    out.release()
+    return path
+
+
+def generate_image(path, width=1280, height=720, objects=3, seed=0):
+    """Écrit une image synthétique (JPEG ou PNG selon l'extension) et retourne son chemin."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    frame = next(generate_frames(width, height, 1, objects, seed))
+    if not cv2.imwrite(path, frame):
+        raise RuntimeError(f"Impossible d'écrire l'image de test : {path}")
+    return path
@@ -0,0 +1,150 @@
+"""
+🎚️ Qualité adaptative pour la détection en direct.
+
+Le contrôleur mesure la latence (capture -> résultat) ou le débit de chaque flux et descend ou remonte
+d'un niveau de QUALITY_LEVELS pour tenir la cible : taille d'entrée du modèle, inférence une frame sur N
+et sensibilité au mouvement. Utilisé par `detect_live` et par le service multi-caméras.
+"""
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence
+
+from controllers.detect_behavior import MotionGate
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class QualityLevel:
+    name: str
+    imgsz: int  # Taille d'entrée du modèle (multiple de 32)
+    inference_stride: int  # Une inférence toutes les N frames traitées, détections réutilisées entre les deux
+    motion_min_area: int  # Aire minimale (px²) d'une zone en mouvement pour déclencher l'inférence
+
+
+# Du plus fidèle au plus économe ; chaque niveau réduit le coût d'environ 30 à 50 %
+QUALITY_LEVELS = (
+    QualityLevel("max", 640, 1, 800),
+    QualityLevel("high", 512, 1, 1200),
+    QualityLevel("medium", 416, 2, 1600),
+    QualityLevel("low", 320, 3, 2400),
+    QualityLevel("minimal", 256, 4, 3200),
+)
+
+
+class AdaptiveQualityController:
+    """
+    🎚️ Ajuste la qualité d'un flux en direct pour tenir une cible de latence ou de débit.
+    - Mesure : latence bout à bout (capture -> résultat) ou frames traitées par seconde, lissées (EMA).
+    - Au-dessus de la cible : un niveau plus bas (entrée du modèle plus petite, inférence une frame
+      sur N, déclenchement par mouvement moins sensible).
+    - Nettement sous la cible (`upgrade_ratio`) pendant `upgrade_after` frames : un niveau plus haut.
+    - Après chaque changement, `settle_frames` frames sans décision : la mesure doit d'abord refléter
+      le nouveau niveau (évite les oscillations).
+    """
+
+    def __init__(self, target_latency: Optional[float] = None, target_fps: Optional[float] = None,
+                 levels: Sequence[QualityLevel] = QUALITY_LEVELS, initial_level: int = 0,
+                 smoothing: float = 0.2, upgrade_ratio: float = 0.6, upgrade_after: int = 60,
+                 settle_frames: int = 15):
+        if (target_latency is None) == (target_fps is None):
+            raise ValueError("Indiquer une cible : latence (secondes) ou fps")
+        if not levels:
+            raise ValueError("Au moins un niveau de qualité est nécessaire")
+        self.target_latency = target_latency
+        self.target_fps = target_fps
+        self.levels = tuple(levels)
+        self.level_index = min(max(int(initial_level), 0), len(self.levels) - 1)
+        self.smoothing = smoothing
+        self.upgrade_ratio = upgrade_ratio
+        self.upgrade_after = max(int(upgrade_after), 1)
+        self.settle_frames = max(int(settle_frames), 0)
+
+        self.latency: Optional[float] = None  # Moyennes glissantes
+        self.frame_interval: Optional[float] = None
+        self.changes = 0
+        self._last_observed_at: Optional[float] = None
+        self._frames_since_change = 0
+        self._frames_under_target = 0
+        self._frames_since_inference: Optional[int] = None
+
+    @property
+    def level(self) -> QualityLevel:
+        return self.levels[self.level_index]
+
+    def should_infer(self) -> bool:
+        """Appelé pour chaque frame que le modèle devrait voir : False si le pas d'inférence la saute."""
+        if self._frames_since_inference is None or self._frames_since_inference + 1 >= self.level.inference_stride:
+            self._frames_since_inference = 0
+            return True
+        self._frames_since_inference += 1
+        return False
+
+    def inference_kwargs(self) -> Dict[str, Any]:
+        return {"imgsz": self.level.imgsz}
+
+    def apply_motion_sensitivity(self, gate: Optional[MotionGate]):
+        if gate is not None:
+            gate.motion_detector.min_area = self.level.motion_min_area
+
+    def pressure(self) -> Optional[float]:
+        """> 1 : la cible n'est pas tenue ; < 1 : marge disponible."""
+        if self.target_latency is not None:
+            return self.latency / self.target_latency if self.latency is not None else None
+        return self.target_fps * self.frame_interval if self.frame_interval is not None else None
+
+    @property
+    def fps(self) -> Optional[float]:
+        return 1.0 / self.frame_interval if self.frame_interval else None
+
+    def observe(self, latency: float, now: Optional[float] = None) -> bool:
+        """Mesure d'une frame traitée ; retourne True si le niveau de qualité a changé."""
+        now = time.monotonic() if now is None else now
+        self.latency = latency if self.latency is None else self.latency + self.smoothing * (latency - self.latency)
+        if self._last_observed_at is not None:
+            # Moyenne des intervalles (et non des débits instantanés, que deux frames rapprochées faussent)
+            interval = max(now - self._last_observed_at, 1e-6)
+            self.frame_interval = interval if self.frame_interval is None else \
+                self.frame_interval + self.smoothing * (interval - self.frame_interval)
+        self._last_observed_at = now
+
+        self._frames_since_change += 1
+        pressure = self.pressure()
+        if pressure is None or self._frames_since_change <= self.settle_frames:
+            return False
+        if pressure > 1.0 and self.level_index < len(self.levels) - 1:
+            return self._change(+1, pressure)
+        if pressure < self.upgrade_ratio and self.level_index > 0:
+            self._frames_under_target += 1
+            if self._frames_under_target >= self.upgrade_after:
+                return self._change(-1, pressure)
+        else:
+            self._frames_under_target = 0
+        return False
+
+    def _change(self, step: int, pressure: float) -> bool:
+        previous = self.level.name
+        self.level_index += step
+        self.changes += 1
+        self._frames_since_change = 0
+        self._frames_under_target = 0
+        self._frames_since_inference = None
+        logger.info(f"🎚️ Qualité {previous} -> {self.level.name} (charge {pressure:.2f} de la cible, "
+                    f"imgsz {self.level.imgsz}, inférence 1 frame sur {self.level.inference_stride})")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        level = self.level
+        return {
+            "quality_level": level.name,
+            "quality_index": self.level_index,
+            "imgsz": level.imgsz,
+            "inference_stride": level.inference_stride,
+            "motion_min_area": level.motion_min_area,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "fps": round(self.fps, 2) if self.fps is not None else None,
+            "target_latency_ms": round(self.target_latency * 1000, 1) if self.target_latency is not None else None,
+            "target_fps": self.target_fps,
+            "quality_changes": self.changes,
+        }
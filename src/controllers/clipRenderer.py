@@ -0,0 +1,111 @@
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, Optional
+
+import cv2
+
+from controllers.detect_intruder_video import UPLOADS_DIR, draw_detection
+from controllers.zones import ZoneSet
+from models.detectionStore import DetectionStore
+
+logger = logging.getLogger(__name__)
+
+RENDER_DIR = os.path.join(UPLOADS_DIR, "renders")
+
+
+class RenderError(Exception):
+    """Rendu impossible : vidéo source ou détections introuvables (supprimées, évincées du cache)."""
+
+
+def clip_path_for(detections_path: str, first_frame: int, last_frame: Optional[int]) -> str:
+    """Chemin du rendu d'un intervalle : un même extrait demandé deux fois n'est rendu qu'une fois."""
+    digest = hashlib.sha256(os.path.abspath(detections_path).encode()).hexdigest()[:16]
+    return os.path.join(RENDER_DIR, f"{digest}_{first_frame}_{last_frame or 'end'}.mp4")
+
+
+def render_clip(detections_path: str, start_time: Optional[float] = None, end_time: Optional[float] = None,
+                video_path: Optional[str] = None, output_path: Optional[str] = None,
+                progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    🎬 Vidéo annotée rendue à la demande depuis les détections enregistrées d'une analyse.
+    - `start_time` / `end_time` (secondes) : extrait seulement ; par défaut la vidéo entière.
+    - La vidéo source est relue à partir de la première frame de l'extrait (pas de nouvelle inférence) ;
+      les boîtes, étiquettes et zones sont dessinées comme pendant l'analyse.
+    - Un extrait déjà rendu est réutilisé ; un rendu est écrit dans un fichier temporaire unique puis
+      renommé : deux rendus simultanés du même extrait ne s'écrasent pas.
+    - `progress_callback(frames_rendues, total_frames)` : appelé après chaque frame (jobs de rendu).
+    Lève RenderError si un fichier manque, ValueError si l'intervalle ne contient aucune frame.
+    """
+    if not os.path.exists(detections_path):
+        raise RenderError("Détections introuvables")
+    store = DetectionStore.load(detections_path)
+    metadata = store.metadata
+    video_path = video_path or metadata.get("source_video")
+    if not video_path or not os.path.exists(video_path):
+        raise RenderError("Vidéo source introuvable")
+
+    fps = metadata["fps"]
+    first_frame = max(int(round(start_time * fps)), 1) if start_time is not None else 1
+    last_frame = int(round(end_time * fps)) if end_time is not None else None
+    if last_frame is not None and last_frame < first_frame:
+        raise ValueError("Intervalle vide")
+    output_path = output_path or clip_path_for(detections_path, first_frame, last_frame)
+    if os.path.exists(output_path):
+        return {"video_path": output_path, "start_frame": first_frame, "end_frame": last_frame, "cached": True}
+
+    start = time.perf_counter()
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RenderError("Vidéo source illisible")
+    if first_frame > 1:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first_frame - 1)
+    frame_number = int(cap.get(cv2.CAP_PROP_POS_FRAMES))  # Position réellement atteinte
+    columns = store.columns
+    rows = store.frame_range(frame_number + 1, last_frame)
+    row = rows.start
+    zones = ZoneSet.from_spec(metadata.get("zones"))
+    total_frames = (last_frame or int(cap.get(cv2.CAP_PROP_FRAME_COUNT))) - frame_number
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(suffix=".mp4", dir=os.path.dirname(output_path) or ".")
+    os.close(descriptor)
+    out = cv2.VideoWriter(temporary, cv2.VideoWriter_fourcc(*'mp4v'), fps, (metadata["width"], metadata["height"]))
+    frames_written = drawn = 0
+    completed = False
+    try:
+        while last_frame is None or frame_number < last_frame:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame_number += 1
+            while row < rows.stop and columns["frame"][row] < frame_number:
+                row += 1
+            if zones is not None:
+                zones.draw(frame)
+            while row < rows.stop and columns["frame"][row] == frame_number:
+                draw_detection(frame, tuple(columns["bbox"][row].tolist()), int(columns["class_id"][row]),
+                               float(columns["confidence"][row]), float(columns["speed"][row]),
+                               bool(columns["is_running"][row]), int(columns["track_id"][row]))
+                row += 1
+                drawn += 1
+            out.write(frame)
+            frames_written += 1
+            if progress_callback is not None:
+                progress_callback(frames_written, total_frames)
+        if not frames_written:
+            raise ValueError("Aucune frame dans l'intervalle demandé")
+        out.release()
+        os.replace(temporary, output_path)
+        completed = True
+    finally:
+        cap.release()
+        out.release()
+        if not completed:
+            os.remove(temporary)
+    render_time = time.perf_counter() - start
+    logger.info(f"🎬 Rendu de {frames_written} frames ({drawn} détections) en {render_time:.2f}s: {output_path}")
+    return {"video_path": output_path, "start_frame": first_frame, "end_frame": frame_number,
+            "frames": frames_written, "detections": drawn, "render_time": round(render_time, 3), "cached": False}
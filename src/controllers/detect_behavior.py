@@ -2,9 +2,12 @@ import cv2
 import numpy as np
 from enum import Enum
 from typing import Tuple, List, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import math
 
+# Boîte (x1, y1, x2, y2) en pixels, bornes hautes exclues
+Region = Tuple[int, int, int, int]
+
 @dataclass
 class MotionData:
     is_moving: bool
@@ -13,6 +16,8 @@ class MotionData:
     direction: Tuple[float, float]
     contour_area: float
     bounding_box: Optional[Tuple[int, int, int, int]] = None
+    # Toutes les zones en mouvement (élargies et fusionnées), de la plus grande à la plus petite
+    regions: List[Region] = field(default_factory=list)
 
 class MovementType(Enum):
     STATIONARY = 0
@@ -20,15 +25,37 @@ class MovementType(Enum):
     RUNNING = 2
     ERRATIC = 3
 
+def merge_regions(boxes: List[Region]) -> List[Region]:
+    """Fusionne les boîtes qui se chevauchent ou se touchent, jusqu'à stabilité ; triées par aire décroissante."""
+    merged = [tuple(int(v) for v in box) for box in boxes]
+    changed = True
+    while changed and len(merged) > 1:
+        changed = False
+        result = []
+        for box in merged:
+            for index, other in enumerate(result):
+                if box[0] <= other[2] and other[0] <= box[2] and box[1] <= other[3] and other[1] <= box[3]:
+                    result[index] = (min(box[0], other[0]), min(box[1], other[1]),
+                                     max(box[2], other[2]), max(box[3], other[3]))
+                    changed = True
+                    break
+            else:
+                result.append(box)
+        merged = result
+    return sorted(merged, key=lambda b: (b[2] - b[0]) * (b[3] - b[1]), reverse=True)
+
+
 class MotionDetector:
     def __init__(self, 
                  threshold: int = 25,
                  min_area: int = 800,
                  history_size: int = 10,
                  running_threshold: float = 20.0,
-                 background_subtractor: str = 'MOG2'):
+                 background_subtractor: str = 'MOG2',
+                 region_padding: int = 32):
         self.threshold = threshold
         self.min_area = min_area
+        self.region_padding = region_padding  # Marge (px) autour de chaque zone en mouvement
         self.history_size = history_size
         self.running_threshold = running_threshold
 
@@ -100,23 +127,42 @@ class MotionDetector:
 
         return flows, valid_idx.tolist()
 
+    def _motion_contours(self, fg_mask: np.ndarray) -> List[Tuple[float, Tuple[int, int, int, int]]]:
+        """Aire et boîte `(x, y, w, h)` de chaque contour au-dessus de `min_area`."""
+        contours, _ = cv2.findContours(fg_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        moving = []
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if area > self.min_area:
+                moving.append((area, cv2.boundingRect(contour)))
+        return moving
+
+    @staticmethod
+    def _largest_motion_region(moving) -> Tuple[float, Optional[Tuple[int, int, int, int]]]:
+        """Retourne l'aire et la boîte du plus grand contour en mouvement."""
+        if not moving:
+            return 0, None
+        return max(moving, key=lambda item: item[0])
+
+    def _motion_regions(self, moving, frame_shape) -> List[Region]:
+        """Boîtes des contours en mouvement, élargies de `region_padding` et fusionnées si elles se touchent."""
+        height, width = frame_shape[:2]
+        pad = self.region_padding
+        boxes = [(max(x - pad, 0), max(y - pad, 0), min(x + w + pad, width), min(y + h + pad, height))
+                 for _, (x, y, w, h) in moving]
+        return merge_regions(boxes)
+
+    def detect_regions(self, frame: np.ndarray) -> List[Region]:
+        """Zones en mouvement de la frame (soustraction de fond seule) ; liste vide si la scène est statique."""
+        moving = self._motion_contours(self._apply_background_subtraction(frame))
+        return self._motion_regions(moving, frame.shape)
+
     def analyze_motion(self, frame: np.ndarray) -> MotionData:
         """Détecte et analyse le mouvement dans une frame."""
         fg_mask = self._apply_background_subtraction(frame)
         flows, valid_points = self._calculate_optical_flow(frame)
-        contours, _ = cv2.findContours(fg_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        max_area = 0
-        bounding_box = None
-        current_position = None
-
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            if area > self.min_area and area > max_area:
-                max_area = area
-                x, y, w, h = cv2.boundingRect(contour)
-                bounding_box = (x, y, w, h)
-                current_position = (x + w // 2, y + h // 2)
+        moving = self._motion_contours(fg_mask)
+        max_area, bounding_box = self._largest_motion_region(moving)
 
         avg_speed = sum(math.hypot(dx, dy) for dx, dy in flows) / len(flows) if flows else 0
         is_running = avg_speed > self.running_threshold
@@ -127,7 +173,8 @@ class MotionDetector:
             speed=avg_speed,
             direction=(0, 0),  # Ajout d'une direction par défaut
             contour_area=max_area,
-            bounding_box=bounding_box
+            bounding_box=bounding_box,
+            regions=self._motion_regions(moving, frame.shape)
         )
 
     def _visualize_motion(self, frame: np.ndarray, motion_data: MotionData) -> np.ndarray:
@@ -142,3 +189,49 @@ class MotionDetector:
                         cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
 
         return result_frame
+
+
+class MotionGate:
+    """
+    Décide, frame par frame, si le modèle YOLO doit être exécuté.
+    - Le modèle tourne quand `MotionDetector` voit un mouvement au-dessus de `min_area`.
+    - Sans mouvement, les dernières détections sont réutilisées pendant au plus `max_reuse_frames` frames,
+      puis la scène est considérée vide.
+    - Une inférence complète est forcée au moins toutes les `force_inference_every` frames.
+    """
+    INFER = "infer"
+    REUSE = "reuse"
+    EMPTY = "empty"
+
+    def __init__(self,
+                 motion_detector: Optional[MotionDetector] = None,
+                 max_reuse_frames: int = 15,
+                 force_inference_every: int = 30):
+        self.motion_detector = motion_detector or MotionDetector()
+        self.max_reuse_frames = max(int(max_reuse_frames), 0)
+        self.force_inference_every = max(int(force_inference_every), 1)
+        self.frames_since_inference = None  # None tant qu'aucune inférence n'a eu lieu
+        self.frames_inferred = 0
+        self.frames_skipped = 0
+        self.regions: List[Region] = []  # Zones en mouvement de la dernière frame examinée
+        self.forced = False  # Dernière inférence imposée par `force_inference_every` (frame entière)
+
+    def decide(self, frame: np.ndarray) -> str:
+        # La soustraction de fond doit voir toutes les frames pour garder un modèle de fond à jour
+        self.regions = self.motion_detector.detect_regions(frame)
+        motion = bool(self.regions)
+        forced = (self.frames_since_inference is None
+                  or self.frames_since_inference + 1 >= self.force_inference_every)
+        self.forced = forced
+
+        if motion or forced:
+            self.frames_since_inference = 0
+            self.frames_inferred += 1
+            return self.INFER
+
+        self.frames_since_inference += 1
+        self.frames_skipped += 1
+        return self.REUSE if self.frames_since_inference <= self.max_reuse_frames else self.EMPTY
+
+    def stats(self) -> dict:
+        return {"frames_inferred": self.frames_inferred, "frames_skipped": self.frames_skipped}
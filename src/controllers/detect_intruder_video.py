@@ -1,15 +1,23 @@
 import cv2
 import os
 import numpy as np
-import json
 from datetime import datetime
 import logging
-from models.yoloModel import model
+import time
+from models.inferenceBackends import resolve_backend
+from models.yoloModel import get_model, run_inference, resolve_model_name
 from tqdm import tqdm
-from dataclasses import dataclass, asdict
-from typing import List, Dict, Any, Optional, Tuple
-from models.alertModel import save_alert
-from models.database import alerts_collection  # Correction ajoutée
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from models.alertModel import close_alert_events, end_alert_frame, save_alert
+from models.detectionStore import DetectionStore
+from models.threatRules import DANGEROUS_CLASSES, PERSON_CLASS_ID, THREAT_RULES
+from controllers.detect_behavior import MotionDetector, MotionGate
+from controllers.regionInference import RegionInference
+from controllers.zones import ZoneSet
+from controllers.tracker import MultiObjectTracker
+from controllers.pipeline import run_pipeline, bottleneck, StageObserver
+from utils.metrics import FRAMES, FRAMES_INFERRED, INFERENCE_BATCH, QUEUE_DEPTH, observe_stage
 
 # Configuration du logger
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -18,12 +26,25 @@ logger = logging.getLogger(__name__)
 UPLOADS_DIR = "uploads"
 os.makedirs(UPLOADS_DIR, exist_ok=True)
 
-# 🚨 CLASSES D'OBJETS DANGEREUX (Personnes + Armes + Véhicules)
-DANGEROUS_CLASSES = {
-    0: "Personne",
-    49: "Couteau",
-    67: "Pistolet",
-}
+# Rappel par frame : (numéro de frame, temps en secondes, détections, alertes)
+FrameCallback = Callable[[int, float, List[Dict[str, Any]], List[Dict[str, Any]]], None]
+
+def draw_detection(frame: np.ndarray, bbox, class_id: int, confidence: float, speed: float, is_running: bool,
+                   track_id: int):
+    """Boîte et étiquette d'une détection (vert : personne, rouge : arme, orange : personne qui court)."""
+    x1, y1, x2, y2 = bbox
+    color = (0, 255, 0) if class_id == PERSON_CLASS_ID else (0, 0, 255)
+    if is_running:
+        color = (0, 165, 255)  # Orange si la personne court
+    cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+    cv2.putText(frame, f"#{track_id} {DANGEROUS_CLASSES[class_id]} {confidence:.2f} | Speed: {speed:.2f} m/s",
+                (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+
+
+def detections_path_for(output_video_path: str) -> str:
+    """Fichier de détections (.npz) associé à une sortie d'analyse."""
+    return os.path.splitext(output_video_path)[0] + ".npz"
+
 
 @dataclass
 class Detection:
@@ -34,6 +55,8 @@ class Detection:
     is_running: bool
     speed: float
     object_type: str
+    track_id: int = 0
+    zone_id: Optional[str] = None
 
 @dataclass
 class DetectionReport:
@@ -45,115 +68,422 @@ class DetectionReport:
     total_persons_detected: int  
 
 class IntruderDetector:
-    def __init__(self):
-        self.previous_positions = {}  # Stocker les positions des objets des frames précédentes
+    def __init__(self,
+                 batch_size: int = 1,
+                 motion_gating: bool = False,
+                 motion_min_area: int = 800,
+                 max_reuse_frames: int = 15,
+                 force_inference_every: int = 30,
+                 track_max_age: int = 15,
+                 pipeline: bool = False,
+                 pipeline_queue_size: int = 4,
+                 model=None,
+                 model_name: Optional[str] = None,
+                 stage_observer: Optional[StageObserver] = None,
+                 region_inference: bool = False,
+                 region_tile_size: int = 640,
+                 region_max_coverage: float = 0.5,
+                 zones: Optional[ZoneSet] = None,
+                 render_video: bool = False):
         self.running_threshold = 2.5  # Seuil de vitesse pour détecter la course
+        self.batch_size = max(int(batch_size), 1)  # Nombre de frames par appel au modèle
+        # Inférence conditionnée au mouvement (désactivée par défaut)
+        self.motion_gating = motion_gating
+        self.motion_min_area = motion_min_area
+        self.max_reuse_frames = max_reuse_frames
+        self.force_inference_every = force_inference_every
+        # Inférence sur les seules zones en mouvement, à la résolution native (voir `RegionInference`).
+        # Les zones viennent de la détection de mouvement : elle est activée avec ce mode.
+        self.region_inference = region_inference
+        self.region_tile_size = region_tile_size
+        self.region_max_coverage = region_max_coverage
+        # Zones de détection par défaut (remplaçables par analyse) : seules les détections dans une zone
+        # comptent, et le modèle ne voit que les boîtes englobantes des zones
+        self.zones = zones
+        self.track_max_age = track_max_age  # Frames sans détection avant suppression d'une piste
+        # Vidéo annotée encodée pendant l'analyse ; sinon rendue à la demande depuis les détections enregistrées
+        self.render_video = render_video
+        # Décodage, inférence et annotation/encodage dans des threads séparés
+        self.pipeline = pipeline
+        self.pipeline_queue_size = pipeline_queue_size
+        # Modèle injecté, sinon celui du registre (chargé au premier usage)
+        self._model = model
+        self.model_name = model_name
+        # Latence de chaque étage (décodage, inférence, encodage) : benchmarks et métriques
+        self.stage_observer = stage_observer
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = get_model(self.model_name)
+        return self._model
+
+    def result_config(self, zones: Optional[ZoneSet] = None) -> Dict[str, Any]:
+        """Modèle et réglages qui influent sur le rapport (clé du cache de résultats)."""
+        zones = zones if zones is not None else self.zones
+        return {
+            "model": resolve_model_name(self.model_name),
+            "backend": resolve_backend(),
+            "threat_rules": THREAT_RULES.digest(),
+            "running_threshold": self.running_threshold,
+            "track_max_age": self.track_max_age,
+            "motion_gating": bool(self.motion_gating or self.region_inference),
+            "motion_min_area": self.motion_min_area,
+            "max_reuse_frames": self.max_reuse_frames,
+            "force_inference_every": self.force_inference_every,
+            "region_inference": self._create_region_inference().config() if self.region_inference else None,
+            "zones": zones.config() if zones is not None else None,
+        }
+
+    def _create_motion_gate(self) -> MotionGate:
+        return MotionGate(MotionDetector(min_area=self.motion_min_area),
+                          max_reuse_frames=self.max_reuse_frames,
+                          force_inference_every=self.force_inference_every)
+
+    def _create_region_inference(self) -> RegionInference:
+        return RegionInference(tile_size=self.region_tile_size, max_coverage=self.region_max_coverage)
 
     def _prepare_output_paths(self, video_path: str) -> Tuple[str, str]:
+        """Dossier et vidéo de sortie d'une analyse (le dossier n'est créé qu'une fois la vidéo ouverte)."""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         base_name = os.path.splitext(os.path.basename(video_path))[0]
         output_dir = os.path.join(UPLOADS_DIR, "detections", f"{base_name}_{timestamp}")
-        os.makedirs(output_dir, exist_ok=True)
         output_video_path = os.path.join(output_dir, f"{base_name}_detection.mp4")
         return output_dir, output_video_path
 
-    def detect_intruder_in_video(self, video_path: str) -> Dict[str, Any]:
+    def _read_batches(self, cap: cv2.VideoCapture, batch_size: int, gate: Optional[MotionGate] = None,
+                      first_frame: int = 1, last_frame: Optional[int] = None):
+        """
+        Lit la vidéo par paquets de `(numéro, frame, décision, zones)`, de `first_frame` à `last_frame` inclus.
+        `zones` : régions en mouvement vues par `gate` pour une frame à inférer (None sans détection de mouvement).
+        Un paquet est envoyé dès qu'il contient `batch_size` frames à inférer (le dernier peut être incomplet).
+        """
+        batch = []
+        pending_inferences = 0
+        frame_number = 0
+        if first_frame > 1:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, first_frame - 1)
+            frame_number = int(cap.get(cv2.CAP_PROP_POS_FRAMES))  # Position réellement atteinte
+        while cap.isOpened() and (last_frame is None or frame_number < last_frame):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame_number += 1  # Numérotation à partir de 1, comme CAP_PROP_POS_FRAMES après lecture
+            decision = gate.decide(frame) if gate is not None else MotionGate.INFER
+            # Inférence forcée : frame entière, pour voir aussi les objets immobiles
+            regions = gate.regions if gate is not None and decision == MotionGate.INFER and not gate.forced else None
+            batch.append((frame_number, frame, decision, regions))
+            if decision == MotionGate.INFER:
+                pending_inferences += 1
+            # Les frames sautées ne comptent pas dans le paquet, mais on borne la mémoire retenue
+            if pending_inferences >= batch_size or len(batch) >= batch_size * 4:
+                yield batch
+                batch = []
+                pending_inferences = 0
+        if batch:
+            yield batch  # Vidage du dernier paquet en fin de vidéo
+
+    def _infer_batch(self, frames: List[np.ndarray], regions: Optional[List[Any]] = None,
+                     region_inference: Optional[RegionInference] = None) -> List[np.ndarray]:
+        """
+        Une seule passe du modèle pour toutes les frames du paquet.
+        Avec `region_inference`, seules les `regions` de chaque frame (mouvement, zones) sont analysées.
+        """
+        INFERENCE_BATCH.labels(source="video").observe(len(frames))
+        FRAMES_INFERRED.labels(source="video").inc(len(frames))
+        if region_inference is not None and regions is not None:
+            return region_inference.infer(frames, regions, self.model, source="video")
+        return run_inference(frames, model=self.model)
+
+    def _observe_pipeline_stage(self, stage: str, seconds: float, frames: int):
+        """Métriques des étages décodage et inférence (l'étage encode est détaillé dans `_process_frame`)."""
+        if stage != "encode":
+            observe_stage("video", stage, seconds / max(frames, 1))
+        if self.stage_observer is not None:
+            self.stage_observer(stage, seconds, frames)
+
+    def _frame_regions(self, frame: np.ndarray, motion_regions: Optional[List[Any]],
+                       zones: Optional[ZoneSet]) -> Optional[List[Any]]:
+        """Découpes à analyser : zones en mouvement (mode `region_inference`), limitées aux zones de détection."""
+        motion_regions = motion_regions if self.region_inference else None
+        if zones is None:
+            return motion_regions
+        return zones.crop_regions(frame.shape, motion_regions)
+
+    def _process_frame(self, frame: np.ndarray, detections: np.ndarray, frame_number: int, fps: int,
+                       output_video_path: str, tracker: MultiObjectTracker,
+                       emit: bool = True,
+                       metrics_source: str = "video",
+                       zones: Optional[ZoneSet] = None,
+                       event_time: Optional[float] = None,
+                       store: Optional[DetectionStore] = None,
+                       draw: bool = True,
+                       alerts: bool = True) -> Tuple[int, List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Post-traitement d'une frame : suivi, vitesse par piste, annotation, détails et alertes.
+        Avec `emit=False` (frames de recouvrement d'un segment), seul le suivi est mis à jour.
+        `metrics_source` : libellé des métriques d'étage ("video", ou "live" pour les caméras).
+        `zones` : seules les détections dans une zone sont gardées, avec l'identifiant de leur zone.
+        `event_time` : horloge des évènements d'alerte (par défaut le temps de la frame dans la vidéo).
+        `store` : les détections de la frame y sont ajoutées en colonnes ; `draw=False` : frame non annotée.
+        `alerts=False` : détections suivies, annotées et enregistrées, sans alerte ni fermeture d'évènement
+        (détections reprises d'une frame non inférée, voir `MotionGate`, ou alertes rejouées par l'appelant).
+        Retourne le nombre de personnes détectées, les détections et les alertes de la frame.
+        """
+        start = time.perf_counter()
+        # Classes surveillées, seuils de confiance par classe et boîtes bornées à la frame, en une opération
+        detections = THREAT_RULES.select(detections, image_shape=frame.shape, class_ids=THREAT_RULES.video_class_ids)
+        zone_ids = [None] * len(detections)
+        if zones is not None:
+            detections, zone_ids = zones.assign(detections, frame.shape)
+        class_ids = detections[:, 5].astype(np.int64)
+
+        # Identifiants de piste et vitesse (px/frame) pour toutes les détections en une fois
+        track_ids, track_speeds = tracker.update(detections[:, :4], class_ids)
+        if not emit:
+            observe_stage(metrics_source, "postprocess", time.perf_counter() - start)
+            return 0, [], []
+        speeds = track_speeds / fps * 30  # Normalisation de la vitesse
+        running = speeds > self.running_threshold
+        threat_levels = THREAT_RULES.level_names(class_ids, speeds, running)
+        boxes = detections[:, :4].astype(np.int32)
+        persons_detected = int(np.count_nonzero(class_ids == PERSON_CLASS_ID))
+        frame_detections = []
+        frame_alerts = []
+        if store is not None:
+            store.append(frame_number, frame_number / fps, boxes, detections[:, 4], class_ids, speeds,
+                         running, track_ids, zone_ids)
+        postprocessed = time.perf_counter()
+        if zones is not None and draw:
+            zones.draw(frame)
+
+        for bbox, confidence, class_id, object_type, track_id, speed, is_running, zone_id in zip(
+                boxes.tolist(), detections[:, 4].tolist(), class_ids.tolist(), THREAT_RULES.class_names(class_ids),
+                track_ids.tolist(), speeds.tolist(), running.tolist(), zone_ids):
+            if draw:
+                draw_detection(frame, tuple(bbox), class_id, confidence, speed, is_running, track_id)
+
+            detection = Detection(
+                frame=frame_number,
+                time=frame_number / fps,
+                bbox=bbox,
+                confidence=confidence,
+                is_running=is_running,
+                speed=speed,
+                object_type=object_type,
+                track_id=track_id,
+                zone_id=zone_id
+            )
+            frame_detections.append(vars(detection))  # Pas de copie profonde (contrairement à asdict)
+        drawn = time.perf_counter()
+
+        if alerts:
+            event_time = frame_number / fps if event_time is None else event_time
+            for detection, threat_level in zip(frame_detections, threat_levels):
+                alert = save_alert(detection["object_type"], detection["confidence"], detection["bbox"],
+                                   detection["speed"], detection["is_running"], frame=frame_number,
+                                   video_path=output_video_path, track_id=detection["track_id"],
+                                   zone_id=detection["zone_id"], event_time=event_time, threat_level=threat_level)
+                frame_alerts.append(alert)
+                logger.debug(f"🔴 ALERTE SAUVEGARDÉE: {alert}")
+            end_alert_frame(output_video_path, event_time)  # Ferme les évènements des objets disparus
+
+        observe_stage(metrics_source, "postprocess", postprocessed - start)
+        observe_stage(metrics_source, "draw", drawn - postprocessed)
+        observe_stage(metrics_source, "alerts", time.perf_counter() - drawn)
+        return persons_detected, frame_detections, frame_alerts
+
+    def detect_intruder_in_video(self, video_path: str, batch_size: Optional[int] = None,
+                                 motion_gating: Optional[bool] = None,
+                                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                                 pipeline: Optional[bool] = None,
+                                 frame_callback: Optional[FrameCallback] = None,
+                                 collect_detections: bool = True,
+                                 capture: Optional[Any] = None,
+                                 zones: Optional[ZoneSet] = None,
+                                 render_video: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        Analyse une vidéo image par image.
+        - `batch_size` : nombre de frames envoyées au modèle en un seul appel (par défaut celui du détecteur).
+          Le post-traitement, la vitesse et les alertes restent calculés dans l'ordre des frames.
+        - `motion_gating` : n'exécute le modèle que sur les frames en mouvement (voir `MotionGate`).
+        - `progress_callback(frames_traitées, total_frames)` : appelé après chaque frame.
+        - `pipeline` : décodage, inférence et annotation/encodage se recouvrent (files bornées entre étages).
+          Le rapport contient dans tous les cas les mesures par étage (`stage_stats`).
+        - `frame_callback(numéro, temps, détections, alertes)` : appelé pour chaque frame contenant des
+          détections, au fil de l'analyse (diffusion en continu).
+        - `collect_detections=False` : le rapport ne contient pas la liste des détections. Elles sont dans
+          tous les cas enregistrées en colonnes dans `detections_path` (voir `DetectionStore`).
+        - `render_video` : encode la vidéo annotée pendant l'analyse (par défaut selon le détecteur) ;
+          sinon `video_path` est None et la vidéo ou un extrait se rendent à la demande (`render_clip`).
+        - `capture` : source de frames compatible `cv2.VideoCapture` à utiliser au lieu d'ouvrir `video_path`
+          (ex. `GrowingVideoCapture` pour une vidéo encore en cours d'upload).
+        - `zones` : zones de détection de cette analyse (par défaut celles du détecteur, voir `ZoneSet`).
+        L'état d'une analyse est local à l'appel : un même détecteur peut servir plusieurs vidéos en parallèle.
+        """
+        _, output_video_path = self._prepare_output_paths(video_path)
+        return self._analyze(video_path, output_video_path, batch_size=batch_size, motion_gating=motion_gating,
+                             progress_callback=progress_callback, pipeline=pipeline, frame_callback=frame_callback,
+                             collect_detections=collect_detections, capture=capture, zones=zones,
+                             render_video=render_video)
+
+    def analyze_segment(self, video_path: str, output_video_path: str, start_frame: int, end_frame: int,
+                        overlap: int = 0, first_track_id: int = 1,
+                        zones: Optional[ZoneSet] = None) -> Dict[str, Any]:
+        """
+        Analyse les frames `start_frame` à `end_frame` (numérotées à partir de 1) d'une vidéo.
+        Les `overlap` frames précédentes sont décodées et suivies sans être annotées ni signalées,
+        pour que les vitesses soient correctes dès la première frame du segment.
+        Aucune alerte n'est enregistrée : l'appelant les rejoue depuis les détections fusionnées des segments,
+        à l'aide des frames aux détections réutilisées listées dans `reused_frames` (voir `shardedVideo`).
+        """
+        return self._analyze(video_path, output_video_path, start_frame=start_frame, end_frame=end_frame,
+                             warmup_frames=overlap, first_track_id=first_track_id, zones=zones,
+                             save_alerts=False)
+
+    def _analyze(self, video_path: str, output_video_path: str, batch_size: Optional[int] = None,
+                 motion_gating: Optional[bool] = None,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 pipeline: Optional[bool] = None, start_frame: int = 1, end_frame: Optional[int] = None,
+                 warmup_frames: int = 0, alert_video_path: Optional[str] = None,
+                 first_track_id: int = 1, frame_callback: Optional[FrameCallback] = None,
+                 collect_detections: bool = True, capture: Optional[Any] = None,
+                 zones: Optional[ZoneSet] = None, render_video: Optional[bool] = None,
+                 save_alerts: bool = True) -> Dict[str, Any]:
         start_time = datetime.now()
-        cap = cv2.VideoCapture(video_path)
+        batch_size = max(int(batch_size or self.batch_size), 1)
+        motion_gating = self.motion_gating if motion_gating is None else motion_gating
+        zones = zones if zones is not None else self.zones
+        region_inference = self._create_region_inference() if self.region_inference or zones is not None else None
+        pipeline = self.pipeline if pipeline is None else pipeline
+        render_video = self.render_video if render_video is None else render_video
+        cap = capture if capture is not None else cv2.VideoCapture(video_path)
         if not cap.isOpened():
             logger.error(f"Impossible de charger la vidéo: {video_path}")
             return {"status": "error", "message": "Fichier vidéo inaccessible"}
+        os.makedirs(os.path.dirname(output_video_path) or ".", exist_ok=True)
 
         fps = max(int(cap.get(cv2.CAP_PROP_FPS)), 1)  # Éviter la division par zéro
         frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
-        output_dir, output_video_path = self._prepare_output_paths(video_path)
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_video_path, fourcc, fps, (frame_width, frame_height))
-
+        out = None
+        if render_video:
+            out = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (frame_width, frame_height))
+        store = DetectionStore({"source_video": video_path, "fps": fps, "width": frame_width, "height": frame_height,
+                                "classes": THREAT_RULES.video_names, "zone_ids": zones.ids if zones is not None else [],
+                                "zones": zones.config() if zones is not None else None})
+
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if end_frame is not None and total_frames > 0:
+            end_frame = min(end_frame, total_frames)
+        read_start = max(start_frame - max(int(warmup_frames), 0), 1)  # Frames de recouvrement incluses
+        alert_video_path = alert_video_path or output_video_path
+
+        # Pistes propres à cette vidéo (ou à ce segment)
+        tracker = MultiObjectTracker(max_age=self.track_max_age, first_id=first_track_id)
         total_persons_detected = 0
-        detection_details = []
-        progress_bar = tqdm(total=int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), desc="Analyse de la vidéo", unit="frames")
-
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            results = model(frame)
-            detections = results[0].boxes.data.cpu().numpy() if results[0].boxes is not None else []
-
-            current_positions = {}  
-
-            for obj in detections:
-                x1, y1, x2, y2 = map(int, obj[:4])
-                confidence = float(obj[4])
-                class_id = int(obj[5])
-
-                if class_id not in DANGEROUS_CLASSES:
-                    continue  
-
-                object_type = DANGEROUS_CLASSES[class_id]
-
-                center_x, center_y = (x1 + x2) // 2, (y1 + y2) // 2
-                object_key = f"{class_id}_{center_x}_{center_y}"
-
-                speed = 0.0
-                is_running = False
-
-                if object_key in self.previous_positions:
-                    prev_x, prev_y = self.previous_positions[object_key]
-                    distance = np.linalg.norm([center_x - prev_x, center_y - prev_y])
-                    speed = (distance / fps) * 30  # Normalisation de la vitesse
-
-                    if speed > self.running_threshold:
-                        is_running = True
-
-                current_positions[object_key] = (center_x, center_y)
-
-                if class_id == 0:
-                    total_persons_detected += 1
-
-                color = (0, 255, 0) if class_id == 0 else (0, 0, 255)
-                if is_running:
-                    color = (0, 165, 255)  # Orange si la personne court
-
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                cv2.putText(frame, f"{object_type} {confidence:.2f} | Speed: {speed:.2f} m/s", (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-
-                detection = Detection(
-                    frame=int(cap.get(cv2.CAP_PROP_POS_FRAMES)),
-                    time=int(cap.get(cv2.CAP_PROP_POS_FRAMES)) / fps,
-                    bbox=[x1, y1, x2, y2],
-                    confidence=confidence,
-                    is_running=is_running,
-                    speed=speed,
-                    object_type=object_type
-                )
-                detection_details.append(asdict(detection))
-
-                alert = save_alert(object_type, confidence, [x1, y1, x2, y2], speed, is_running,
-                                   frame=int(cap.get(cv2.CAP_PROP_POS_FRAMES)), video_path=output_video_path)
-                logger.info(f"🔴 ALERTE SAUVEGARDÉE: {alert}")
-
-            self.previous_positions = current_positions
-            out.write(frame)
-            progress_bar.update(1)
-
-        cap.release()
-        out.release()
-        progress_bar.close()
-
+        progress_bar = tqdm(total=(end_frame or total_frames) - read_start + 1, desc="Analyse de la vidéo",
+                            unit="frames")
+
+        gate = self._create_motion_gate() if motion_gating or self.region_inference else None
+        empty_detections = np.empty((0, 6), dtype=np.float32)
+        last_detections = empty_detections
+        reused_frames: List[int] = []  # Sans `save_alerts` : frames dont l'appelant ne rejouera pas les alertes
+        frames_emitted = frames_inferred = 0  # Frames de la plage demandée, hors recouvrement
+
+        def inference_stage(batch):
+            """Une passe du modèle pour les frames à inférer, puis réutilisation pour les frames sautées."""
+            nonlocal last_detections, frames_emitted, frames_inferred
+            to_infer = [(frame, self._frame_regions(frame, regions, zones))
+                        for _, frame, decision, regions in batch if decision == MotionGate.INFER]
+            inferred = iter(self._infer_batch([frame for frame, _ in to_infer], [regions for _, regions in to_infer],
+                                              region_inference) if to_infer else [])
+
+            resolved = []
+            for frame_number, frame, decision, _ in batch:
+                if frame_number >= start_frame:
+                    frames_emitted += 1
+                    if decision == MotionGate.INFER:
+                        frames_inferred += 1
+                if decision == MotionGate.INFER:
+                    last_detections = next(inferred)
+                    detections = last_detections
+                elif decision == MotionGate.REUSE:
+                    detections = last_detections  # Scène statique : on garde les dernières détections
+                else:
+                    detections = empty_detections
+                resolved.append((frame_number, frame, detections, decision == MotionGate.REUSE))
+            return resolved
+
+        def encode_stage(resolved):
+            """Suivi, annotation, alertes et écriture de la vidéo annotée, dans l'ordre des frames."""
+            nonlocal total_persons_detected
+            frames_counter = FRAMES.labels(source="video")
+            for frame_number, frame, detections, reused in resolved:
+                emit = frame_number >= start_frame
+                if reused and emit and not save_alerts:
+                    reused_frames.append(frame_number)
+                persons, frame_detections, frame_alerts = self._process_frame(frame, detections, frame_number, fps,
+                                                                              alert_video_path, tracker, emit,
+                                                                              zones=zones, store=store,
+                                                                              draw=render_video,
+                                                                              alerts=save_alerts and not reused)
+                total_persons_detected += persons
+                if frame_callback is not None and frame_detections:
+                    frame_callback(frame_number, frame_number / fps, frame_detections, frame_alerts)
+                if emit and out is not None:
+                    write_start = time.perf_counter()
+                    out.write(frame)
+                    observe_stage("video", "encode", time.perf_counter() - write_start)
+                frames_counter.inc()
+                progress_bar.update(1)
+                if progress_callback is not None:
+                    progress_callback(progress_bar.n, progress_bar.total)
+
+        try:
+            frames = self._read_batches(cap, batch_size, gate, first_frame=read_start, last_frame=end_frame)
+            stage_stats = run_pipeline(frames, inference_stage, encode_stage,
+                                       threaded=pipeline, queue_size=self.pipeline_queue_size, frame_count=len,
+                                       stage_observer=self._observe_pipeline_stage)
+        finally:
+            cap.release()
+            if out is not None:
+                out.release()
+            progress_bar.close()
+            close_alert_events(alert_video_path)
+
+        slowest_stage = bottleneck(stage_stats)
+        if pipeline:
+            # Profondeur moyenne des files entre étages lors de la dernière analyse
+            QUEUE_DEPTH.labels(queue="pipeline_decoded").set(stage_stats["decode"].to_dict()["queue_depth_avg"])
+            QUEUE_DEPTH.labels(queue="pipeline_inferred").set(stage_stats["inference"].to_dict()["queue_depth_avg"])
+        logger.info(f"⏱️ Étage limitant: {slowest_stage} | " +
+                    " | ".join(f"{name}: {stats.to_dict()['fps']} fps" for name, stats in stage_stats.items()))
+
+        detections_path = store.save(detections_path_for(output_video_path))
         processing_time = (datetime.now() - start_time).total_seconds()
 
         result = {
             "status": "success",
-            "video_path": output_video_path,
+            "video_path": output_video_path if render_video else None,
+            "source_video_path": video_path,
+            "detections_path": detections_path,
+            "detection_count": len(store),
             "total_persons_detected": total_persons_detected,
-            "detections": detection_details,
-            "processing_time": processing_time
+            "detections": store.records() if collect_detections else None,
+            "processing_time": processing_time,
+            "batch_size": batch_size,
+            "motion_gating": gate is not None,
+            "frames_inferred": frames_inferred,
+            "frames_skipped": frames_emitted - frames_inferred,
+            "region_inference": region_inference.stats() if region_inference is not None else None,
+            "zones": zones.ids if zones is not None else None,
+            "pipeline": bool(pipeline),
+            "stage_stats": {name: stats.to_dict() for name, stats in stage_stats.items()},
+            "bottleneck": slowest_stage
         }
+        if not save_alerts:
+            result["reused_frames"] = reused_frames
 
-        return json.loads(json.dumps(result, default=lambda o: bool(o) if isinstance(o, np.bool_) else o))
+        return result
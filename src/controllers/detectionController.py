@@ -1,98 +1,245 @@
 import cv2
 import numpy as np
 import os
-from models.yoloModel import model
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from models.yoloModel import run_inference
+from controllers.regionInference import RegionInference
+from models.threatRules import PERSON_CLASS_ID, THREAT_RULES
+from utils.metrics import FRAMES, FRAMES_INFERRED, INFERENCE_BATCH, observe_stage
 from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-def detect_intruder(image_path, confidence_threshold=0.5, save_annotated=True):
+BATCH_MAX_IMAGES = int(os.getenv("IMAGE_BATCH_SIZE", 16))  # Images par appel au modèle (analyse par lots)
+IO_WORKERS = int(os.getenv("IMAGE_IO_WORKERS", 4))  # Threads de décodage et d'écriture des images annotées
+LETTERBOX_SIZE = 640  # Entrée du modèle : les images de même forme après letterbox sont inférées ensemble
+LETTERBOX_STRIDE = 32
+
+
+def _person_detections(image, detections, confidence_threshold, zones):
+    """Personnes au-dessus du seuil (et dans une zone si `zones`) : tableau (N, 6) et identifiants de zone."""
+    persons = THREAT_RULES.select(detections, confidence_threshold, image.shape, class_ids=(PERSON_CLASS_ID,))
+    if zones is not None:
+        return zones.assign(persons, image.shape)
+    return persons, [None] * len(persons)
+
+
+def _detection_details(image_shape, persons, zone_ids):
+    height, width = image_shape[:2]
+    details = []
+    for obj, zone_id in zip(persons.tolist(), zone_ids):
+        x1, y1, x2, y2, confidence, class_id = obj
+        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+        # Calculer le pourcentage de la surface de l'image occupée par la détection
+        area_percentage = (x2 - x1) * (y2 - y1) / (width * height) * 100
+        details.append({
+            "bbox": [float(x1), float(y1), float(x2), float(y2)],
+            "confidence": float(confidence),
+            "class_id": int(class_id),
+            "class_name": "personne",
+            "area_percentage": float(area_percentage),
+            "zone_id": zone_id
+        })
+    return details
+
+
+def annotate_image(image, details, zones=None):
+    """Copie de l'image avec les personnes détectées (rectangles rouges) et les zones."""
+    annotated_image = image.copy()
+    if zones is not None:
+        zones.draw(annotated_image)
+    for detection in details:
+        x1, y1, x2, y2 = map(int, detection["bbox"])
+        cv2.rectangle(annotated_image, (x1, y1), (x2, y2), (0, 0, 255), 2)
+        # Ajouter le texte avec le niveau de confiance
+        cv2.putText(annotated_image, f"Personne: {detection['confidence']:.2f}", (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
+    return annotated_image
+
+
+def _report(details, confidence_threshold, annotated_image_path):
+    person_count = len(details)
+    intrusion_detected = person_count > 0
+    return {
+        "status": "success",
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "message": f"{person_count} intrus détecté{'s' if person_count > 1 else ''} !" if intrusion_detected else "Aucune intrusion détectée",
+        "intrusion_detected": intrusion_detected,
+        "person_count": person_count,
+        "confidence_threshold": confidence_threshold,
+        "detections": details,
+        "annotated_image_path": annotated_image_path
+    }
+
+
+def _annotated_path(output_dir, name):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    base_name, ext = os.path.splitext(os.path.basename(name))
+    return os.path.join(output_dir, f"{base_name}_detection_{timestamp}{ext or '.jpg'}")
+
+
+def detect_intruder(image_path, confidence_threshold=0.5, save_annotated=True, model=None, zones=None):
+    """
+    🖼️ Détecte les personnes dans une image.
+    - `zones` (ZoneSet) : le modèle ne voit que les boîtes englobantes des zones, et seules les personnes
+      dont les pieds sont dans une zone sont comptées (avec l'identifiant de la zone).
+    """
     try:
         # Charger l'image avec OpenCV
+        start = time.perf_counter()
         image = cv2.imread(image_path)
+        observe_stage("image", "decode", time.perf_counter() - start)
         if image is None:
             return {"status": "error", "message": f"Impossible de charger l'image: {image_path}"}
-            
-        # Créer une copie pour l'annotation
-        annotated_image = image.copy()
-        
-        # Récupérer les dimensions de l'image
-        height, width = image.shape[:2]
-        
-        # Effectuer la détection avec YOLOv8
-        results = model(image)
-
-        # Récupérer les objets détectés
-        detections = results[0].boxes.data.cpu().numpy()
+
+        # Effectuer la détection avec YOLOv8 (modèle partagé du registre par défaut)
+        start = time.perf_counter()
+        if zones is not None:
+            detections = RegionInference().infer([image], [zones.crop_regions(image.shape)], model, source="image")[0]
+        else:
+            detections = run_inference([image], model=model)[0]
+        observe_stage("image", "inference", time.perf_counter() - start)
+        FRAMES_INFERRED.labels(source="image").inc()
 
         # Filtrer pour détecter les humains (ID 0 dans COCO dataset) avec confiance suffisante
-        persons_detected = [obj for obj in detections if int(obj[5]) == 0 and obj[4] >= confidence_threshold]  
-
-        # Déterminer s'il y a une intrusion
-        person_count = len(persons_detected)
-        intrusion_detected = person_count > 0
-        
-        # Préparer des informations détaillées sur chaque détection
-        detection_details = []
-        
-        # Dessiner les rectangles pour chaque personne détectée
-        for obj in persons_detected:
-            x1, y1, x2, y2, confidence, class_id = obj.tolist() if hasattr(obj, 'tolist') else list(obj)
-            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-            
-            # Calculer le pourcentage de la surface de l'image occupée par la détection
-            box_area = (x2 - x1) * (y2 - y1)
-            image_area = width * height
-            area_percentage = (box_area / image_area) * 100
-            
-            # Dessiner le rectangle (rouge)
-            cv2.rectangle(annotated_image, (x1, y1), (x2, y2), (0, 0, 255), 2)
-            
-            # Ajouter le texte avec le niveau de confiance
-            confidence_text = f"Personne: {confidence:.2f}"
-            cv2.putText(annotated_image, confidence_text, (x1, y1 - 10), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
-            
-            detection_details.append({
-                "bbox": [float(x1), float(y1), float(x2), float(y2)],
-                "confidence": float(confidence),
-                "class_id": int(class_id),
-                "class_name": "personne",
-                "area_percentage": float(area_percentage)
-            })
+        start = time.perf_counter()
+        persons, zone_ids = _person_detections(image, detections, confidence_threshold, zones)
+        details = _detection_details(image.shape, persons, zone_ids)
+        observe_stage("image", "postprocess", time.perf_counter() - start)
 
         # Sauvegarder l'image annotée si demandé
         annotated_image_path = None
-        if save_annotated and intrusion_detected:
-            # Générer un nom de fichier basé sur l'horodatage
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = os.path.basename(image_path)
-            base_name, ext = os.path.splitext(filename)
-            
+        if save_annotated and details:
+            start = time.perf_counter()
+            annotated_image = annotate_image(image, details, zones)
+            observe_stage("image", "draw", time.perf_counter() - start)
+
             # Créer le dossier de sortie s'il n'existe pas
             output_dir = os.path.join(os.path.dirname(image_path), "detections")
             os.makedirs(output_dir, exist_ok=True)
-            
-            # Chemin complet pour l'image annotée
-            annotated_image_path = os.path.join(output_dir, f"{base_name}_detection_{timestamp}{ext}")
-            
-            # Sauvegarder l'image
-            cv2.imwrite(annotated_image_path, annotated_image)
+            annotated_image_path = _annotated_path(output_dir, image_path)
 
-        # Ajouter un horodatage
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            start = time.perf_counter()
+            cv2.imwrite(annotated_image_path, annotated_image)
+            observe_stage("image", "encode", time.perf_counter() - start)
+        FRAMES.labels(source="image").inc()
 
-        return {
-            "status": "success",
-            "timestamp": timestamp,
-            "message": f"{person_count} intrus détecté{'s' if person_count > 1 else ''} !" if intrusion_detected else "Aucune intrusion détectée",
-            "intrusion_detected": intrusion_detected,
-            "person_count": person_count,
-            "confidence_threshold": confidence_threshold,
-            "detections": detection_details,
-            "annotated_image_path": annotated_image_path
-        }
+        return _report(details, confidence_threshold, annotated_image_path)
     except Exception as e:
         return {
-            "status": "error", 
+            "status": "error",
             "message": str(e),
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
\ No newline at end of file
+        }
+
+
+def letterbox_shape(image_shape, size=LETTERBOX_SIZE, stride=LETTERBOX_STRIDE):
+    """Forme de l'entrée du modèle après letterbox minimal (côté long à `size`, bords au multiple de `stride`)."""
+    height, width = image_shape[:2]
+    ratio = size / max(height, width)
+    return (int(np.ceil(round(height * ratio) / stride)) * stride,
+            int(np.ceil(round(width * ratio) / stride)) * stride)
+
+
+def _decode(data: bytes):
+    start = time.perf_counter()
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    return image, time.perf_counter() - start
+
+
+def detect_intruders_batch(images: Sequence[Tuple[str, bytes]], confidence_threshold=0.5, save_annotated=False,
+                           output_dir=None, model=None, zones=None, max_batch=BATCH_MAX_IMAGES,
+                           io_workers=IO_WORKERS) -> List[Dict[str, Any]]:
+    """
+    🗂️ Détecte les personnes dans une série d'images (rafales de clichés) ; un rapport par image, dans l'ordre.
+    - Décodage en mémoire dans `io_workers` threads (OpenCV relâche le GIL), au plus `2 × io_workers`
+      images d'avance.
+    - Inférence par paquets de `max_batch` images de même forme après letterbox : aucune image n'est
+      agrandie ni complétée au-delà de ce qu'exige la sienne. Un paquet complet part dès qu'il est décodé,
+      pendant le décodage des suivants ; au-delà de `2 × max_batch` images décodées en attente (formes très
+      variées), le plus gros paquet part incomplet. Avec `zones`, seules leurs découpes sont analysées.
+    - `save_annotated` : images annotées écrites dans `output_dir` par un pool de threads, pendant
+      l'inférence des paquets suivants (au plus `2 × io_workers` écritures en attente).
+    Une image illisible donne un rapport en erreur sans interrompre le lot.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+    if save_annotated:
+        output_dir = output_dir or os.path.join("uploads", "detections", f"batch_{datetime.now():%Y%m%d_%H%M%S}")
+        os.makedirs(output_dir, exist_ok=True)
+
+    max_batch = max(int(max_batch), 1)
+    read_ahead = max(int(io_workers), 1) * 2  # Décodages et écritures en vol : la mémoire reste bornée
+    region_inference = RegionInference() if zones is not None else None
+    writes = deque()
+
+    def infer(chunk):
+        """Un appel au modèle pour un paquet d'images de même forme, puis rapports et écritures."""
+        indices, frames = zip(*chunk)
+        start = time.perf_counter()
+        if region_inference is not None:
+            outputs = region_inference.infer(list(frames), [zones.crop_regions(frame.shape) for frame in frames],
+                                             model, source="image")
+        else:
+            outputs = run_inference(list(frames), model=model)
+        observe_stage("image", "inference", (time.perf_counter() - start) / len(chunk))
+        INFERENCE_BATCH.labels(source="image").observe(len(chunk))
+        FRAMES_INFERRED.labels(source="image").inc(len(chunk))
+
+        for index, image, detections in zip(indices, frames, outputs):
+            start = time.perf_counter()
+            persons, zone_ids = _person_detections(image, detections, confidence_threshold, zones)
+            details = _detection_details(image.shape, persons, zone_ids)
+            observe_stage("image", "postprocess", time.perf_counter() - start)
+            annotated_image_path = None
+            if save_annotated and details:
+                annotated_image_path = _annotated_path(output_dir, f"{index:04d}_{images[index][0]}")
+                writes.append(pool.submit(_write_annotated, image, details, zones, annotated_image_path))
+                if len(writes) > read_ahead:
+                    writes.popleft().result()
+            results[index] = _report(details, confidence_threshold, annotated_image_path)
+            FRAMES.labels(source="image").inc()
+
+    def decode_ahead():
+        """Images décodées dans l'ordre, avec au plus `read_ahead` décodages soumis d'avance."""
+        decoding = deque()
+        for _, data in images:
+            decoding.append(pool.submit(_decode, data))
+            if len(decoding) >= read_ahead:
+                yield decoding.popleft().result()
+        while decoding:
+            yield decoding.popleft().result()
+
+    with ThreadPoolExecutor(max_workers=max(int(io_workers), 1), thread_name_prefix="image-io") as pool:
+        groups: Dict[Tuple[int, int], List[Tuple[int, np.ndarray]]] = {}
+        waiting = 0  # Images décodées en attente d'un paquet
+        for index, (image, seconds) in enumerate(decode_ahead()):
+            if image is None:
+                results[index] = {"status": "error", "message": f"Impossible de décoder l'image: {images[index][0]}"}
+                continue
+            observe_stage("image", "decode", seconds)
+            shape = letterbox_shape(image.shape)
+            group = groups.setdefault(shape, [])
+            group.append((index, image))
+            waiting += 1
+            if len(group) >= max_batch:
+                waiting -= len(group)
+                infer(groups.pop(shape))
+            elif waiting > 2 * max_batch:
+                largest = max(groups, key=lambda key: len(groups[key]))  # Formes trop variées : paquet incomplet
+                waiting -= len(groups[largest])
+                infer(groups.pop(largest))
+        for group in groups.values():
+            infer(group)
+        for write in writes:
+            write.result()
+    return results
+
+
+def _write_annotated(image, details, zones, path):
+    start = time.perf_counter()
+    annotated_image = annotate_image(image, details, zones)
+    observe_stage("image", "draw", time.perf_counter() - start)
+    start = time.perf_counter()
+    cv2.imwrite(path, annotated_image)
+    observe_stage("image", "encode", time.perf_counter() - start)
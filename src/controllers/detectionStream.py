@@ -0,0 +1,93 @@
+import json
+import queue
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+_END = object()
+
+
+def _json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+class StreamClosed(Exception):
+    """Levée dans l'analyse quand le client s'est déconnecté : l'analyse s'arrête."""
+
+
+class DetectionStream:
+    """
+    📡 Relais entre une analyse vidéo (producteur) et une réponse HTTP en continu (consommateur).
+    - Les événements passent par une file bornée : si le client lit lentement, l'analyse attend,
+      et la mémoire du serveur ne grandit pas avec la longueur de la vidéo.
+    - Formats : NDJSON (un objet JSON par ligne) ou Server-Sent Events.
+    """
+
+    FORMATS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+    def __init__(self, max_events: int = 256, progress_interval: float = 1.0, keepalive_interval: float = 15.0):
+        self._queue: queue.Queue = queue.Queue(maxsize=max_events)
+        self.progress_interval = progress_interval
+        self.keepalive_interval = keepalive_interval
+        self._last_progress = 0.0
+        self.closed = False
+
+    # ------------------------------------------------------ côté analyse
+    def on_frame(self, frame_number: int, time_s: float, detections: List[Dict[str, Any]],
+                 alerts: List[Dict[str, Any]]):
+        self._put({"event": "frame", "frame": frame_number, "time": round(time_s, 3),
+                   "detections": detections, "alerts": alerts})
+
+    def on_progress(self, frames_processed: int, total_frames: int):
+        now = time.monotonic()
+        if now - self._last_progress >= self.progress_interval or frames_processed == total_frames:
+            self._last_progress = now
+            self._put({"event": "progress", "frames_processed": frames_processed, "total_frames": total_frames})
+
+    def finish(self, result: Dict[str, Any]):
+        summary = {key: value for key, value in result.items() if key != "detections"}
+        self._put({"event": "end" if result.get("status") == "success" else "error", **summary})
+        self._put(_END)
+
+    def fail(self, message: str):
+        try:
+            self._put({"event": "error", "status": "error", "message": message})
+            self._put(_END)
+        except StreamClosed:
+            pass
+
+    def _put(self, event):
+        while True:
+            if self.closed:
+                raise StreamClosed("Client déconnecté")
+            try:
+                self._queue.put(event, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    # ---------------------------------------------------- côté réponse
+    def close(self):
+        self.closed = True
+
+    def events(self) -> Iterator[Optional[Dict[str, Any]]]:
+        """Événements dans l'ordre ; `None` signale une période d'inactivité (keep-alive)."""
+        while True:
+            try:
+                event = self._queue.get(timeout=self.keepalive_interval)
+            except queue.Empty:
+                yield None
+                continue
+            if event is _END:
+                return
+            yield event
+
+    @staticmethod
+    def format(event: Optional[Dict[str, Any]], fmt: str) -> str:
+        if fmt == "sse":
+            if event is None:
+                return ": keep-alive\n\n"
+            return f"event: {event['event']}\ndata: {json.dumps(event, default=_json_default)}\n\n"
+        if event is None:
+            return "\n"
+        return json.dumps(event, default=_json_default) + "\n"
@@ -1,89 +1,161 @@
 import cv2
-import torch
 import numpy as np
 import logging
 import sys
 import os
-from ultralytics import YOLO
+import threading
+import time
 
 # Ajouter le chemin src au sys.path pour éviter les erreurs d'import
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controllers.adaptiveQuality import AdaptiveQualityController
+from controllers.detect_behavior import MotionDetector, MotionGate
+from controllers.multiCamera import LatestFrameCapture
+from controllers.regionInference import RegionInference
+from models.threatRules import PERSON_CLASS_ID, THREAT_RULES
+from models.yoloModel import get_model, run_inference
+from utils.metrics import FRAMES, FRAMES_INFERRED, observe_stage
 
 # Configuration du logger
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-# Charger le modèle YOLO directement ici (évite les problèmes d'import)
-MODEL_PATH = os.path.join("models", "yolov8x.pt")  # Assure-toi que le modèle est bien ici
-device = "cuda" if torch.cuda.is_available() else "cpu"
-
-try:
-    model = YOLO(MODEL_PATH).to(device)
-    logger.info(f"✅ Modèle YOLOv8 chargé avec succès sur {device.upper()} !")
-except Exception as e:
-    logger.error(f"❌ Erreur lors du chargement du modèle : {e}")
-    sys.exit(1)
-
-# 🚨 Classes dangereuses à détecter (Personnes + Armes + Véhicules dangereux)
-DANGEROUS_CLASSES = {
-    0: "Personne",
-    1: "Vélo", 
-    2: "Voiture", 
-    3: "Moto", 
-    5: "Camion",
-    6: "Bus",
-    7: "Train",
-    8: "Avion",
-    49: "Couteau",   # Si modèle personnalisé
-    67: "Pistolet",  # Si modèle personnalisé
-    70: "Arme",      # Si modèle personnalisé
-    71: "Batte"      # Si modèle personnalisé
-    
-}
-
-def detect_live():
-    """🚀 Détection en temps réel avec la webcam"""
-    cap = cv2.VideoCapture(0)  # 0 = Webcam par défaut
-
-    if not cap.isOpened():
-        logger.error("❌ Impossible d'ouvrir la webcam !")
+LIVE_MAX_RETRIES = int(os.getenv("LIVE_MAX_RETRIES", 5))  # Reconnexions consécutives avant l'arrêt
+
+def detect_live(motion_gating=False, motion_min_area=800, max_reuse_frames=15, force_inference_every=30,
+                model_name=None, source=0, target_latency_ms=None, target_fps=None, display=True, max_frames=None,
+                zones=None):
+    """
+    🚀 Détection en temps réel avec la webcam
+    - `motion_gating` : n'exécute YOLO que lorsque du mouvement est détecté (voir `MotionGate`).
+    - `model_name` : taille ou poids du modèle (le même modèle partagé que l'API par défaut).
+    - La capture tourne dans son propre thread et ne garde que la dernière frame : chaque tour de boucle
+      traite la frame la plus récente, les frames périmées sont abandonnées (pas de retard cumulé).
+    - `target_latency_ms` ou `target_fps` : la qualité (taille d'entrée, inférence une frame sur N,
+      sensibilité au mouvement) s'adapte pour tenir la cible ; le niveau courant est affiché.
+    - `display=False` : sans fenêtre (machine sans écran) ; `max_frames` arrête après N frames traitées.
+    - Webcam introuvable : arrêt immédiat (None) ; webcam perdue : arrêt après LIVE_MAX_RETRIES reconnexions.
+    - `zones` (ZoneSet) : YOLO ne voit que les boîtes englobantes des zones, et seules les détections
+      dont les pieds sont dans une zone sont affichées.
+    Pour plusieurs caméras sans affichage (inférence batchée partagée) : `controllers/multiCamera.py`.
+    """
+    try:
+        model = get_model(model_name, warmup=True)
+    except Exception as e:
+        logger.error(f"❌ Erreur lors du chargement du modèle : {e}")
         return
-    
+
+    frame_ready = threading.Event()
+    # Pas de webcam : abandon immédiat ; webcam perdue en cours de route : quelques reconnexions puis arrêt
+    capture = LatestFrameCapture("live", source, on_frame=frame_ready.set, retry_first_open=False,
+                                 max_retries=LIVE_MAX_RETRIES)
+    capture.start()
     logger.info("🎥 Détection en temps réel activée... (Appuie sur 'Q' pour quitter)")
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            logger.error("❌ Erreur lors de la capture vidéo")
-            break
-        
-        # 🔍 Détection avec YOLO
-        results = model(frame)
-        detections = results[0].boxes.data.cpu().numpy() if results[0].boxes is not None else []
-        
-        for obj in detections:
-            x1, y1, x2, y2 = map(int, obj[:4])
-            confidence = float(obj[4])
-            class_id = int(obj[5])
-
-            if class_id not in DANGEROUS_CLASSES:
-                continue  # Ignorer les objets non pertinents
-
-            object_type = DANGEROUS_CLASSES[class_id]
-            color = (0, 255, 0) if class_id == 0 else (0, 0, 255)  # 🟩 Vert pour personne, 🟥 Rouge pour danger
-            
-            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-            cv2.putText(frame, f"{object_type} {confidence:.2f}", (x1, y1 - 10), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-        
-        cv2.imshow("Détection en Temps Réel - YOLOv8", frame)
-        
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-    
-    cap.release()
-    cv2.destroyAllWindows()
+    gate = MotionGate(MotionDetector(min_area=motion_min_area), max_reuse_frames=max_reuse_frames,
+                      force_inference_every=force_inference_every) if motion_gating else None
+    controller = None
+    if target_latency_ms is not None or target_fps is not None:
+        controller = AdaptiveQualityController(
+            target_latency=target_latency_ms / 1000.0 if target_latency_ms is not None else None,
+            target_fps=target_fps)
+        controller.apply_motion_sensitivity(gate)
+    region_inference = RegionInference() if zones is not None else None
+    last_detections = np.empty((0, 6), dtype=np.float32)
+    frames_counter = FRAMES.labels(source="live")
+    inferred_counter = FRAMES_INFERRED.labels(source="live")
+    frames_processed = 0
+
+    try:
+        while max_frames is None or frames_processed < max_frames:
+            frame_ready.clear()
+            taken = capture.take()
+            if taken is None:
+                if capture.failed:
+                    if capture.frames_read == 0:
+                        logger.error("❌ Impossible d'ouvrir la webcam !")
+                    break
+                # Pas encore de nouvelle frame (ou caméra en reconnexion)
+                frame_ready.wait(0.5)
+                if display and cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+                continue
+            _, frame, captured_at = taken
+
+            decision = gate.decide(frame) if gate is not None else MotionGate.INFER
+            if decision == MotionGate.INFER and controller is not None and not controller.should_infer():
+                decision = MotionGate.REUSE  # Inférence une frame sur N au niveau de qualité courant
+            if decision == MotionGate.INFER:
+                # 🔍 Détection avec YOLO
+                start = time.perf_counter()
+                kwargs = controller.inference_kwargs() if controller is not None else {}
+                if region_inference is not None:
+                    last_detections = region_inference.infer([frame], [zones.crop_regions(frame.shape)], model,
+                                                             source="live", **kwargs)[0]
+                else:
+                    last_detections = run_inference([frame], model=model, **kwargs)[0]
+                observe_stage("live", "inference", time.perf_counter() - start)
+                inferred_counter.inc()
+                detections = last_detections
+            elif decision == MotionGate.REUSE:
+                detections = last_detections  # Pas de mouvement : on garde les dernières détections
+            else:
+                detections = last_detections[:0]
+
+            start = time.perf_counter()
+            # Objets non pertinents ignorés (classes et seuils de `THREAT_RULES`), en une opération
+            detections = THREAT_RULES.select(detections, image_shape=frame.shape)
+            zone_ids = [None] * len(detections)
+            if zones is not None:
+                detections, zone_ids = zones.assign(detections, frame.shape)
+                zones.draw(frame)
+            class_ids = detections[:, 5].astype(np.int64)
+            for (x1, y1, x2, y2), confidence, class_id, object_type, zone_id in zip(
+                    detections[:, :4].astype(np.int32).tolist(), detections[:, 4].tolist(), class_ids.tolist(),
+                    THREAT_RULES.class_names(class_ids), zone_ids):
+                # 🟩 Vert pour personne, 🟥 Rouge pour danger
+                color = (0, 255, 0) if class_id == PERSON_CLASS_ID else (0, 0, 255)
+
+                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+                label = f"{object_type} {confidence:.2f}" + (f" [{zone_id}]" if zone_id else "")
+                cv2.putText(frame, label, (x1, y1 - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+            observe_stage("live", "draw", time.perf_counter() - start)
+
+            latency = time.monotonic() - captured_at
+            if controller is not None:
+                if controller.observe(latency):
+                    controller.apply_motion_sensitivity(gate)
+                cv2.putText(frame, f"Qualite: {controller.level.name} | {latency * 1000:.0f} ms", (10, 25),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+
+            if display:
+                start = time.perf_counter()
+                cv2.imshow("Détection en Temps Réel - YOLOv8", frame)
+                observe_stage("live", "display", time.perf_counter() - start)
+            frames_counter.inc()
+            frames_processed += 1
+
+            if display and cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        capture.stop()
+        if display:
+            cv2.destroyAllWindows()
+    if capture.failed and capture.frames_read == 0:
+        return None
+
+    stats = {"frames_processed": frames_processed, "frames_dropped": capture.frames_dropped}
+    if gate is not None:
+        logger.info(f"📊 Frames inférées: {gate.frames_inferred} | Frames sautées: {gate.frames_skipped}")
+        stats.update(gate.stats())
+    if controller is not None:
+        logger.info(f"🎚️ Niveau de qualité final: {controller.level.name}")
+        stats.update(controller.stats())
     logger.info("🛑 Détection en temps réel arrêtée.")
+    return stats
 
 if __name__ == "__main__":
     detect_live()
@@ -0,0 +1,559 @@
+"""
+🎥 Détection en direct sur plusieurs caméras avec un seul modèle.
+
+Chaque source (URL RTSP/HTTP, index de périphérique, ou fichier lu en boucle pour les tests locaux)
+a son thread de capture qui ne garde que la dernière frame : une caméra rapide ou un modèle saturé
+ne crée jamais de retard cumulé. Un ordonnanceur central regroupe les frames fraîches de toutes les
+caméras en appels batchés au modèle partagé, avec au plus une frame par caméra et par paquet.
+
+Exemple :
+    python src/controllers/multiCamera.py --source entree=rtsp://10.0.0.5/stream --source 0 \\
+        --source parking=samples/parking.mp4 --max-batch 16 --metrics-port 9100
+"""
+import argparse
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controllers.adaptiveQuality import AdaptiveQualityController  # noqa: E402
+from controllers.detect_behavior import MotionGate  # noqa: E402
+from controllers.detect_intruder_video import IntruderDetector  # noqa: E402
+from controllers.tracker import MultiObjectTracker  # noqa: E402
+from controllers.zones import ZoneSet, load_camera_zones  # noqa: E402
+from models.alertModel import close_alert_events  # noqa: E402
+from models.yoloModel import run_inference  # noqa: E402
+from utils.metrics import (FRAMES, FRAMES_INFERRED, INFERENCE_BATCH, LIVE_CAMERAS, LIVE_FRAME_AGE_SECONDS,  # noqa: E402
+                           LIVE_FRAMES_DROPPED, LIVE_QUALITY_LEVEL, observe_stage, registry)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FPS = 25.0  # Quand la source n'annonce pas de FPS exploitable
+
+# Rappel par frame traitée : (caméra, numéro de frame, frame annotée, détections, alertes)
+ResultCallback = Callable[[str, int, np.ndarray, List[Dict[str, Any]], List[Dict[str, Any]]], None]
+
+
+def parse_source(spec: str) -> Tuple[Optional[str], Union[int, str]]:
+    """
+    `nom=source` ou `source`. Un entier est un index de périphérique ; tout le reste (URL rtsp://,
+    http://, chemin de fichier) est ouvert tel quel par OpenCV.
+    """
+    name, separator, source = spec.partition("=")
+    if not separator or "://" in name:  # `=` dans la requête d'une URL sans nom
+        name, source = "", spec
+    source = source.strip()
+    return (name.strip() or None), (int(source) if source.isdigit() else source)
+
+
+class LatestFrameCapture:
+    """
+    📷 Thread de capture d'une source : lit en continu et ne conserve que la dernière frame.
+    - Une frame non consommée est remplacée par la suivante (comptée dans `frames_dropped`).
+    - Source perdue (flux réseau, périphérique) : reconnexion avec une attente croissante,
+      jusqu'à `max_reconnect_delay` secondes. L'attente n'est remise à zéro qu'après la lecture d'une
+      frame : une source qui s'ouvre mais ne livre rien ne se reconnecte pas en boucle.
+    - `retry_first_open=False` : abandon si la source ne livre aucune frame à la première ouverture ;
+      `max_retries` : abandon après autant d'échecs consécutifs (par défaut, jamais). Après un abandon,
+      `failed` est vrai et `on_frame` est appelé pour réveiller le consommateur.
+    - Fichier : relu en boucle au rythme de son FPS (simule une caméra pour les tests).
+    """
+
+    def __init__(self, camera_id: str, source: Union[int, str], on_frame: Callable[[], None] = lambda: None,
+                 reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0, retry_first_open: bool = True,
+                 max_retries: Optional[int] = None):
+        self.camera_id = camera_id
+        self.source = source
+        self.is_file = isinstance(source, str) and os.path.isfile(source)
+        self.on_frame = on_frame
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.retry_first_open = retry_first_open
+        self.max_retries = max_retries
+        self.fps = DEFAULT_FPS
+        self.connected = False
+        self.failed = False
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.reconnects = 0
+
+        self._frame: Optional[np.ndarray] = None
+        self._frame_number = 0
+        self._captured_at = 0.0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._dropped_counter = LIVE_FRAMES_DROPPED.labels(camera=camera_id)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"capture-{self.camera_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def take(self) -> Optional[Tuple[int, np.ndarray, float]]:
+        """Dernière frame pas encore consommée : (numéro, frame, instant de capture), ou None."""
+        with self._lock:
+            if self._frame is None:
+                return None
+            frame, self._frame = self._frame, None
+            return self._frame_number, frame, self._captured_at
+
+    # ------------------------------------------------------------- interne
+    def _open(self) -> Optional[cv2.VideoCapture]:
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        if not self.is_file:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Pas de tampon côté pilote : on veut la frame la plus récente
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if 0 < fps < 240 else DEFAULT_FPS
+        return cap
+
+    def _give_up(self, failures: int) -> bool:
+        if self.retry_first_open or self.frames_read > 0:
+            if self.max_retries is None or failures <= self.max_retries:
+                return False
+        logger.error(f"❌ Caméra {self.camera_id}: abandon après {failures} tentative(s) sans frame")
+        self.failed = True
+        self.on_frame()
+        return True
+
+    def _run(self):
+        cap = None
+        delay = self.reconnect_delay
+        failures = 0  # Tentatives consécutives sans frame lue
+        next_frame_at = time.monotonic()
+        rewound = False
+        while not self._stopping.is_set():
+            if cap is None:
+                cap = self._open()
+                if cap is None:
+                    failures += 1
+                    if self._give_up(failures):
+                        break
+                    logger.warning(f"⚠️ Caméra {self.camera_id} indisponible, nouvelle tentative dans {delay:.0f}s")
+                    self._stopping.wait(delay)
+                    delay = min(delay * 2, self.max_reconnect_delay)
+                    continue
+                self.connected = True
+                next_frame_at = time.monotonic()
+                logger.info(f"📷 Caméra {self.camera_id} connectée ({self.fps:.0f} fps)")
+
+            ret, frame = cap.read()
+            if not ret:
+                if self.is_file and not rewound:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Lecture en boucle
+                    rewound = True
+                    continue
+                cap.release()
+                cap = None
+                self.connected = False
+                failures += 1
+                if self._give_up(failures):
+                    break
+                self.reconnects += 1
+                logger.warning(f"⚠️ Caméra {self.camera_id}: flux interrompu, reconnexion dans {delay:.0f}s")
+                self._stopping.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+            rewound = False
+            delay = self.reconnect_delay  # Frames reçues : la prochaine coupure repart de l'attente minimale
+            failures = 0
+
+            if self.is_file:
+                next_frame_at += 1.0 / self.fps
+                wait = next_frame_at - time.monotonic()
+                if wait > 0:
+                    self._stopping.wait(wait)
+                elif wait < -1.0:
+                    next_frame_at = time.monotonic()  # Retard trop important : pas de rattrapage en rafale
+            self._publish(frame)
+
+        if cap is not None:
+            cap.release()
+        self.connected = False
+
+    def _publish(self, frame: np.ndarray):
+        with self._lock:
+            if self._frame is not None:
+                self.frames_dropped += 1
+                self._dropped_counter.inc()
+            self._frame = frame
+            self._frame_number += 1
+            self._captured_at = time.monotonic()
+            self.frames_read += 1
+        self.on_frame()
+
+
+@dataclass
+class _PendingFrame:
+    camera_id: str
+    frame_number: int
+    frame: np.ndarray
+    captured_at: float
+    detections: Optional[np.ndarray] = None  # None : à inférer
+    reused: bool = False  # Détections reprises de la dernière inférence : pas d'alerte
+    imgsz: Optional[int] = None  # Taille d'entrée imposée par le contrôle de qualité
+    regions: Optional[list] = None  # Découpes à analyser (zones en mouvement, zones de détection)
+
+
+class MultiCameraService:
+    """
+    🛰️ Service de détection en direct : N caméras, un modèle, une boucle d'inférence batchée.
+    - Un paquet contient au plus une frame (la plus récente) par caméra et au plus `max_batch`
+      frames à inférer.
+    - Équité : le parcours des caméras reprend après la dernière servie (tourniquet), chaque caméra
+      passe à son tour même quand elles sont plus nombreuses que `max_batch`.
+    - Dès qu'une frame est prête, l'ordonnanceur attend au plus `max_wait` secondes que d'autres
+      caméras complètent le paquet : débit du modèle contre latence de la première frame.
+    - Suivi, annotation et alertes par caméra (mêmes règles que l'analyse vidéo, `video_path`
+      = "camera:<nom>") dans un thread de post-traitement : l'inférence suivante n'attend pas.
+    - `target_latency` (secondes) ou `target_fps` : qualité adaptée par caméra (voir
+      `AdaptiveQualityController`) ; les frames d'un paquet sont regroupées par taille d'entrée.
+    - `region_inference` : seules les zones en mouvement sont analysées, à la résolution native
+      (voir `RegionInference`) ; la détection de mouvement est alors activée.
+    - `zones` : zones de détection par caméra (`ZoneSet`) ; le modèle ne voit que leurs boîtes
+      englobantes et seules les détections dans une zone comptent.
+    """
+
+    def __init__(self, sources: Dict[str, Union[int, str]], model=None, model_name: Optional[str] = None,
+                 max_batch: int = 16, max_wait: float = 0.01, motion_gating: bool = False,
+                 motion_min_area: int = 800, on_result: Optional[ResultCallback] = None,
+                 detector: Optional[IntruderDetector] = None, target_latency: Optional[float] = None,
+                 target_fps: Optional[float] = None, region_inference: bool = False,
+                 zones: Optional[Dict[str, ZoneSet]] = None):
+        if not sources:
+            raise ValueError("Au moins une source est nécessaire")
+        self.detector = detector or IntruderDetector(model=model, model_name=model_name,
+                                                     motion_min_area=motion_min_area)
+        self.max_batch = max(int(max_batch), 1)
+        self.max_wait = max(float(max_wait), 0.0)
+        self.on_result = on_result
+
+        self._frame_ready = threading.Event()
+        self.captures = {camera_id: LatestFrameCapture(camera_id, source, on_frame=self._frame_ready.set)
+                         for camera_id, source in sources.items()}
+        self._order = list(self.captures)
+        self._cursor = 0
+        self._trackers = {camera_id: MultiObjectTracker(max_age=self.detector.track_max_age)
+                          for camera_id in self.captures}
+        self._gates = {camera_id: self.detector._create_motion_gate() for camera_id in self.captures} \
+            if motion_gating or region_inference else {}
+        self.region_inference = region_inference
+        self._zones = {camera_id: zone_set for camera_id, zone_set in (zones or {}).items()
+                       if camera_id in self.captures}
+        for camera_id in set(zones or {}) - set(self.captures):
+            logger.warning(f"⚠️ Zones ignorées pour une caméra inconnue: {camera_id}")
+        self._region_inference = self.detector._create_region_inference() \
+            if region_inference or self._zones else None
+        self._controllers = {camera_id: AdaptiveQualityController(target_latency=target_latency,
+                                                                  target_fps=target_fps)
+                             for camera_id in self.captures} \
+            if target_latency is not None or target_fps is not None else {}
+        for camera_id, controller in self._controllers.items():
+            controller.apply_motion_sensitivity(self._gates.get(camera_id))
+            LIVE_QUALITY_LEVEL.labels(camera=camera_id).set(controller.level_index)
+        empty = np.empty((0, 6), dtype=np.float32)
+        self._last_detections = {camera_id: empty for camera_id in self.captures}
+        self._state = {camera_id: {"frames_processed": 0, "detections": 0, "latency_ms": None,
+                                   "processing_fps": 0.0, "last_processed_at": None, "frame_interval": None}
+                       for camera_id in self.captures}
+
+        self._results: queue.Queue = queue.Queue(maxsize=2)  # Paquets inférés en attente de post-traitement
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.batches = 0
+        self.frames_inferred = 0
+
+    # ------------------------------------------------------------------ API
+    def start(self):
+        LIVE_CAMERAS.labels(state="connected").set_function(
+            lambda: sum(capture.connected for capture in self.captures.values()))
+        LIVE_CAMERAS.labels(state="disconnected").set_function(
+            lambda: sum(not capture.connected for capture in self.captures.values()))
+        self._threads = [threading.Thread(target=self._postprocess_loop, name="live-postprocess", daemon=True),
+                         threading.Thread(target=self._schedule_loop, name="live-scheduler", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        for capture in self.captures.values():
+            capture.start()
+        logger.info(f"🛰️ Détection en direct démarrée sur {len(self.captures)} caméras "
+                    f"(paquets de {self.max_batch} frames max)")
+
+    def stop(self, timeout: float = 10.0):
+        self._stopping.set()
+        self._frame_ready.set()
+        for capture in self.captures.values():
+            capture.stop(timeout)
+        for thread in self._threads:
+            thread.join(timeout)
+        for camera_id in self.captures:
+            close_alert_events(f"camera:{camera_id}")
+        logger.info("🛑 Détection en direct arrêtée.")
+
+    def run(self, duration: Optional[float] = None, report_interval: float = 10.0):
+        """Bloquant : démarre le service, journalise les statistiques, s'arrête après `duration` ou Ctrl+C."""
+        self.start()
+        deadline = time.monotonic() + duration if duration else None
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                remaining = deadline - time.monotonic() if deadline else report_interval
+                if self._stopping.wait(max(min(report_interval, remaining), 0)):
+                    break
+                self._log_stats()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        cameras = {}
+        for camera_id, capture in self.captures.items():
+            cameras[camera_id] = {"connected": capture.connected, "capture_fps": round(capture.fps, 1),
+                                  "frames_read": capture.frames_read, "frames_dropped": capture.frames_dropped,
+                                  "reconnects": capture.reconnects,
+                                  **{key: value for key, value in self._state[camera_id].items()
+                                     if key not in ("last_processed_at", "frame_interval")}}
+            if camera_id in self._controllers:
+                cameras[camera_id]["quality"] = self._controllers[camera_id].stats()
+        return {"cameras": cameras, "batches": self.batches, "frames_inferred": self.frames_inferred,
+                "average_batch": round(self.frames_inferred / self.batches, 2) if self.batches else 0.0,
+                "region_inference": self._region_inference.stats() if self._region_inference is not None else None}
+
+    # ------------------------------------------------------------- interne
+    def _gather(self, batch: List[_PendingFrame]) -> int:
+        """Ajoute au paquet la frame fraîche des caméras pas encore servies, en tourniquet."""
+        served = {item.camera_id for item in batch}
+        to_infer = sum(item.detections is None for item in batch)
+        count = len(self._order)
+        start = self._cursor
+        for offset in range(count):
+            if to_infer >= self.max_batch:
+                break
+            index = (start + offset) % count
+            camera_id = self._order[index]
+            if camera_id in served:
+                continue
+            taken = self.captures[camera_id].take()
+            if taken is None:
+                continue
+            frame_number, frame, captured_at = taken
+            item = _PendingFrame(camera_id, frame_number, frame, captured_at)
+            gate = self._gates.get(camera_id)
+            decision = gate.decide(frame) if gate is not None else MotionGate.INFER
+            controller = self._controllers.get(camera_id)
+            if decision == MotionGate.INFER and controller is not None:
+                if controller.should_infer():
+                    item.imgsz = controller.level.imgsz
+                else:
+                    decision = MotionGate.REUSE  # Pas d'inférence du niveau de qualité courant
+            if decision == MotionGate.INFER:
+                to_infer += 1
+                # Inférence forcée : frame entière (ou zones entières), pour voir aussi les objets immobiles
+                motion_regions = gate.regions if self.region_inference and gate is not None and not gate.forced \
+                    else None
+                zone_set = self._zones.get(camera_id)
+                item.regions = zone_set.crop_regions(frame.shape, motion_regions) if zone_set is not None \
+                    else motion_regions
+            elif decision == MotionGate.REUSE:
+                item.detections = self._last_detections[camera_id]
+                item.reused = True
+            else:
+                item.detections = self._last_detections[camera_id][:0]
+            batch.append(item)
+            served.add(camera_id)
+            self._cursor = (index + 1) % count
+        return to_infer
+
+    def _collect_batch(self) -> List[_PendingFrame]:
+        batch: List[_PendingFrame] = []
+        deadline = None
+        while not self._stopping.is_set():
+            self._frame_ready.clear()  # Avant le parcours : une frame publiée pendant celui-ci réveillera l'attente
+            to_infer = self._gather(batch)
+            if to_infer >= self.max_batch or len(batch) == len(self._order):
+                break
+            if not batch:
+                self._frame_ready.wait(0.5)
+                continue
+            if deadline is None:
+                deadline = time.monotonic() + self.max_wait
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._frame_ready.wait(remaining)
+        return batch
+
+    def _schedule_loop(self):
+        inference_batch = INFERENCE_BATCH.labels(source="live")
+        inferred_counter = FRAMES_INFERRED.labels(source="live")
+        while not self._stopping.is_set():
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            groups: Dict[Optional[int], List[_PendingFrame]] = {}
+            for item in batch:
+                if item.detections is None:
+                    groups.setdefault(item.imgsz, []).append(item)
+            for imgsz, to_infer in groups.items():
+                kwargs = {"imgsz": imgsz} if imgsz is not None else {}
+                start = time.perf_counter()
+                try:
+                    frames = [item.frame for item in to_infer]
+                    if self._region_inference is not None:
+                        outputs = self._region_inference.infer(frames, [item.regions for item in to_infer],
+                                                               self.detector.model, source="live", **kwargs)
+                    else:
+                        outputs = run_inference(frames, model=self.detector.model, **kwargs)
+                except Exception as e:
+                    logger.exception(f"❌ Erreur d'inférence ({len(to_infer)} frames ignorées): {e}")
+                    outputs = []
+                observe_stage("live", "inference", (time.perf_counter() - start) / len(to_infer))
+                inference_batch.observe(len(to_infer))
+                inferred_counter.inc(len(outputs))
+                self.batches += 1
+                self.frames_inferred += len(outputs)
+                for item, detections in zip(to_infer, outputs):
+                    item.detections = detections
+                    self._last_detections[item.camera_id] = detections
+            batch = [item for item in batch if item.detections is not None]
+            if batch:
+                self._results.put(batch)
+        self._results.put(None)
+
+    def _postprocess_loop(self):
+        frames_counter = FRAMES.labels(source="live")
+        while True:
+            batch = self._results.get()
+            if batch is None:
+                return
+            for item in batch:
+                try:
+                    self._postprocess(item)
+                except Exception as e:  # Une caméra ne doit pas arrêter les autres
+                    logger.exception(f"❌ Caméra {item.camera_id}: erreur de post-traitement: {e}")
+                frames_counter.inc()
+
+    def _postprocess(self, item: _PendingFrame):
+        state = self._state[item.camera_id]
+        now = time.monotonic()
+        # Vitesses des pistes ramenées au rythme réel de traitement de la caméra (frames sautées incluses)
+        if state["last_processed_at"] is not None:
+            interval = max(now - state["last_processed_at"], 1e-3)
+            previous = state["frame_interval"]
+            state["frame_interval"] = interval if previous is None else 0.8 * previous + 0.2 * interval
+            state["processing_fps"] = round(1.0 / state["frame_interval"], 2)
+        fps = state["processing_fps"] or self.captures[item.camera_id].fps
+        _, detections, alerts = self.detector._process_frame(item.frame, item.detections, item.frame_number,
+                                                             max(fps, 1e-3), f"camera:{item.camera_id}",
+                                                             self._trackers[item.camera_id],
+                                                             metrics_source="live",
+                                                             zones=self._zones.get(item.camera_id),
+                                                             event_time=item.captured_at, alerts=not item.reused)
+        age = time.monotonic() - item.captured_at
+        LIVE_FRAME_AGE_SECONDS.observe(age)
+        controller = self._controllers.get(item.camera_id)
+        if controller is not None and controller.observe(age):
+            controller.apply_motion_sensitivity(self._gates.get(item.camera_id))
+            LIVE_QUALITY_LEVEL.labels(camera=item.camera_id).set(controller.level_index)
+        state["frames_processed"] += 1
+        state["detections"] += len(detections)
+        state["latency_ms"] = round(age * 1000, 1)
+        state["last_processed_at"] = now
+        if self.on_result is not None:
+            self.on_result(item.camera_id, item.frame_number, item.frame, detections, alerts)
+
+    def _log_stats(self):
+        stats = self.stats()
+        logger.info(f"📊 {stats['batches']} paquets, {stats['average_batch']} frames/paquet en moyenne | " +
+                    " | ".join(f"{camera_id}: {camera['processing_fps']} fps, {camera['latency_ms']} ms"
+                               f"{' [' + camera['quality']['quality_level'] + ']' if 'quality' in camera else ''}"
+                               f"{'' if camera['connected'] else ' (déconnectée)'}"
+                               for camera_id, camera in stats["cameras"].items()))
+
+
+def _serve_metrics(port: int):
+    """Expose le registre de métriques (format Prometheus) sur http://0.0.0.0:<port>/metrics."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):  # noqa: N802
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"📈 Métriques exposées sur le port {port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Détection en direct multi-caméras (sans affichage)")
+    parser.add_argument("--source", action="append", required=True,
+                        help="[nom=]URL RTSP/HTTP, index de périphérique ou fichier lu en boucle (répétable)")
+    parser.add_argument("--model", help="Taille ou poids du modèle (YOLO_MODEL par défaut)")
+    parser.add_argument("--max-batch", type=int, default=16, help="Frames max par appel au modèle")
+    parser.add_argument("--max-wait-ms", type=float, default=10.0,
+                        help="Attente max pour compléter un paquet après la première frame prête")
+    parser.add_argument("--motion-gating", action="store_true", help="N'inférer que les frames en mouvement")
+    parser.add_argument("--region-inference", action="store_true",
+                        help="N'analyser que les zones en mouvement, à la résolution native (caméras haute résolution)")
+    parser.add_argument("--zones", help="Fichier JSON des zones de détection par caméra ({\"<nom>\": zones})")
+    parser.add_argument("--target-latency-ms", type=float, help="Qualité adaptative : latence visée par caméra")
+    parser.add_argument("--target-fps", type=float, help="Qualité adaptative : frames traitées/s visées par caméra")
+    parser.add_argument("--duration", type=float, help="Durée en secondes (par défaut jusqu'à Ctrl+C)")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Période du journal de statistiques")
+    parser.add_argument("--metrics-port", type=int, help="Expose /metrics sur ce port")
+    parser.add_argument("--stub-latency-ms", type=float,
+                        help="Tests : modèle factice (benchmarks.stubModel) avec cette latence par image")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    sources = {}
+    for index, spec in enumerate(args.source):
+        name, source = parse_source(spec)
+        sources[name or f"cam{index}"] = source
+
+    model = None
+    if args.stub_latency_ms is not None:
+        from benchmarks.stubModel import StubModel
+        model = StubModel(latency_ms=args.stub_latency_ms)
+    if args.metrics_port:
+        _serve_metrics(args.metrics_port)
+
+    service = MultiCameraService(sources, model=model, model_name=args.model, max_batch=args.max_batch,
+                                 max_wait=args.max_wait_ms / 1000.0, motion_gating=args.motion_gating,
+                                 target_latency=args.target_latency_ms / 1000.0 if args.target_latency_ms else None,
+                                 target_fps=args.target_fps, region_inference=args.region_inference,
+                                 zones=load_camera_zones(args.zones) if args.zones else None)
+    stats = service.run(duration=args.duration, report_interval=args.report_interval)
+    for camera_id, camera in stats["cameras"].items():
+        print(f"{camera_id}: {camera}")
+    print(f"Paquets: {stats['batches']} | Frames inférées: {stats['frames_inferred']} | "
+          f"Taille moyenne: {stats['average_batch']}")
+    if stats["region_inference"]:
+        print(f"Inférence par zones: {stats['region_inference']}")
+
+
+if __name__ == "__main__":
+    main()
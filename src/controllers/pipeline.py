@@ -0,0 +1,225 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence
+
+_END = object()  # Marque la fin du flux entre deux étages
+
+# Observateur de latence : (étage, durée en secondes, nombre de frames de l'élément)
+StageObserver = Callable[[str, float, int], None]
+
+
+@dataclass
+class StageStats:
+    """Mesures d'un étage : temps de travail, temps d'attente et profondeur de la file en sortie."""
+    name: str
+    items: int = 0
+    frames: int = 0
+    busy_time: float = 0.0
+    wait_time: float = 0.0
+    queue_depth_total: int = 0
+    queue_depth_max: int = 0
+
+    def record_queue_depth(self, depth: int):
+        self.queue_depth_total += depth
+        self.queue_depth_max = max(self.queue_depth_max, depth)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "frames": self.frames,
+            "busy_time": round(self.busy_time, 4),
+            "wait_time": round(self.wait_time, 4),
+            "fps": round(self.frames / self.busy_time, 2) if self.busy_time > 0 else None,
+            "queue_depth_avg": round(self.queue_depth_total / self.items, 2) if self.items else 0.0,
+            "queue_depth_max": self.queue_depth_max,
+        }
+
+
+class _Stopped(Exception):
+    pass
+
+
+def _put(q: queue.Queue, item, stop: threading.Event):
+    while True:
+        if stop.is_set():
+            raise _Stopped()
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    while True:
+        if stop.is_set():
+            raise _Stopped()
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+
+
+def run_pipeline(source: Iterable,
+                 transform: Callable[[Any], Any],
+                 sink: Callable[[Any], None],
+                 threaded: bool = True,
+                 queue_size: int = 4,
+                 frame_count: Callable[[Any], int] = lambda item: 1,
+                 stage_observer: Optional[StageObserver] = None) -> Dict[str, StageStats]:
+    """
+    🔀 Exécute `source -> transform -> sink` (décodage -> inférence -> annotation/encodage).
+    - En mode `threaded`, la source et le sink tournent dans leurs propres threads, reliés à
+      `transform` (thread appelant) par des files bornées à `queue_size` éléments : l'ordre est
+      conservé et la mémoire reste bornée quelle que soit la longueur de la vidéo.
+    - Sinon les trois étages s'enchaînent dans le thread appelant (mêmes mesures).
+    - `stage_observer(étage, durée, frames)` est appelé après chaque élément traité par un étage
+      (latences individuelles, pour les percentiles des benchmarks et des métriques).
+    Retourne les statistiques par étage ("decode", "inference", "encode").
+    """
+    stats = {name: StageStats(name) for name in ("decode", "inference", "encode")}
+    observe = stage_observer or (lambda stage, seconds, frames: None)
+
+    if not threaded:
+        iterator = iter(source)
+        while True:
+            start = time.perf_counter()
+            item = next(iterator, _END)
+            decode_time = time.perf_counter() - start
+            stats["decode"].busy_time += decode_time
+            if item is _END:
+                break
+            frames = frame_count(item)
+            observe("decode", decode_time, frames)
+            start = time.perf_counter()
+            result = transform(item)
+            inference_time = time.perf_counter() - start
+            stats["inference"].busy_time += inference_time
+            observe("inference", inference_time, frames)
+            start = time.perf_counter()
+            sink(result)
+            encode_time = time.perf_counter() - start
+            stats["encode"].busy_time += encode_time
+            observe("encode", encode_time, frames)
+            for stage_stats in stats.values():
+                stage_stats.items += 1
+                stage_stats.frames += frames
+        return stats
+
+    decoded: queue.Queue = queue.Queue(maxsize=max(int(queue_size), 1))
+    inferred: queue.Queue = queue.Queue(maxsize=max(int(queue_size), 1))
+    stop = threading.Event()
+    errors = []
+
+    def decode_stage():
+        decode = stats["decode"]
+        try:
+            iterator = iter(source)
+            while True:
+                start = time.perf_counter()
+                item = next(iterator, _END)
+                elapsed = time.perf_counter() - start
+                decode.busy_time += elapsed
+                if item is _END:
+                    break
+                frames = frame_count(item)
+                decode.items += 1
+                decode.frames += frames
+                observe("decode", elapsed, frames)
+                start = time.perf_counter()
+                _put(decoded, item, stop)
+                decode.wait_time += time.perf_counter() - start
+                decode.record_queue_depth(decoded.qsize())
+            _put(decoded, _END, stop)
+        except _Stopped:
+            pass
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    def encode_stage():
+        encode = stats["encode"]
+        try:
+            while True:
+                start = time.perf_counter()
+                item = _get(inferred, stop)
+                encode.wait_time += time.perf_counter() - start
+                if item is _END:
+                    break
+                start = time.perf_counter()
+                sink(item)
+                elapsed = time.perf_counter() - start
+                frames = frame_count(item)
+                encode.busy_time += elapsed
+                encode.items += 1
+                encode.frames += frames
+                observe("encode", elapsed, frames)
+        except _Stopped:
+            pass
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=decode_stage, name="pipeline-decode", daemon=True),
+               threading.Thread(target=encode_stage, name="pipeline-encode", daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    inference = stats["inference"]
+    try:
+        while True:
+            start = time.perf_counter()
+            item = _get(decoded, stop)
+            inference.wait_time += time.perf_counter() - start
+            if item is _END:
+                break
+            start = time.perf_counter()
+            result = transform(item)
+            elapsed = time.perf_counter() - start
+            frames = frame_count(item)
+            inference.busy_time += elapsed
+            inference.items += 1
+            inference.frames += frames
+            observe("inference", elapsed, frames)
+            start = time.perf_counter()
+            _put(inferred, result, stop)
+            inference.wait_time += time.perf_counter() - start
+            inference.record_queue_depth(inferred.qsize())
+        _put(inferred, _END, stop)
+    except _Stopped:
+        pass
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    return stats
+
+
+def merge_stage_stats(runs: Sequence[Dict[str, Dict[str, Any]]]) -> Dict[str, StageStats]:
+    """
+    Mesures cumulées de plusieurs exécutions (ex. segments d'une analyse parallèle), depuis leurs `to_dict` :
+    temps additionnés (le débit reste celui d'un processus), profondeur de file moyenne pondérée.
+    """
+    merged: Dict[str, StageStats] = {}
+    for run in runs:
+        for name, values in run.items():
+            stats = merged.setdefault(name, StageStats(name))
+            stats.items += values["items"]
+            stats.frames += values["frames"]
+            stats.busy_time += values["busy_time"]
+            stats.wait_time += values["wait_time"]
+            stats.queue_depth_total += round(values["queue_depth_avg"] * values["items"])
+            stats.queue_depth_max = max(stats.queue_depth_max, values["queue_depth_max"])
+    return merged
+
+
+def bottleneck(stats: Dict[str, StageStats]) -> str:
+    """Étage qui a passé le plus de temps à travailler (celui qui limite le débit)."""
+    return max(stats.values(), key=lambda stage_stats: stage_stats.busy_time).name
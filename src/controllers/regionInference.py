@@ -0,0 +1,280 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from controllers.detect_behavior import Region, merge_regions
+from models.yoloModel import run_inference
+from utils.metrics import INFERENCE_PIXELS
+
+logger = logging.getLogger(__name__)
+
+# Tailles d'entrée du modèle pour les découpes (multiples de 32) : une découpe prend la plus petite qui la contient
+CROP_SIZES = (160, 320, 480, 640)
+
+
+def _tile_starts(start: int, end: int, tile: int, step: int) -> List[int]:
+    """Origines des tuiles de longueur `tile` couvrant [start, end), la dernière alignée sur `end`."""
+    if end - start <= tile:
+        return [start]
+    starts = list(range(start, end - tile, step))
+    starts.append(end - tile)
+    return starts
+
+
+def plan_crops(regions: Sequence[Region], frame_shape, tile_size: int = 640, overlap: float = 0.2,
+               min_size: int = 160) -> List[Region]:
+    """
+    Découpes (x1, y1, x2, y2) à faire analyser pour couvrir `regions`, à la résolution native.
+    - Une zone plus petite que `min_size` est agrandie autour de son centre (contexte pour le modèle).
+    - Une zone plus grande que `tile_size` est pavée de tuiles qui se recouvrent de `overlap`, pour
+      qu'un objet coupé par le bord d'une tuile apparaisse entier dans la voisine.
+    """
+    height, width = frame_shape[:2]
+    step = max(int(tile_size * (1 - overlap)), 1)
+    crops = []
+    for x1, y1, x2, y2 in regions:
+        # Agrandissement à min_size, recentré puis ramené dans la frame
+        if x2 - x1 < min_size:
+            x1 = min(max((x1 + x2 - min_size) // 2, 0), max(width - min_size, 0))
+            x2 = min(x1 + min_size, width)
+        if y2 - y1 < min_size:
+            y1 = min(max((y1 + y2 - min_size) // 2, 0), max(height - min_size, 0))
+            y2 = min(y1 + min_size, height)
+        for ty in _tile_starts(y1, y2, tile_size, step):
+            for tx in _tile_starts(x1, x2, tile_size, step):
+                crops.append((tx, ty, min(tx + tile_size, x2), min(ty + tile_size, y2)))
+    return crops
+
+
+def crop_input_size(crop: Region, tile_size: int = 640) -> int:
+    """Plus petite taille d'entrée du modèle qui contient la découpe sans la réduire."""
+    longest = max(crop[2] - crop[0], crop[3] - crop[1])
+    for size in CROP_SIZES:
+        if size >= longest and size <= tile_size:
+            return size
+    return tile_size
+
+
+def merge_detections(detections: np.ndarray, iou_threshold: float = 0.5,
+                     containment_threshold: float = 0.8, truncated: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Dédoublonnage par classe de détections (N, 6) issues de découpes qui se recouvrent.
+    Deux boîtes de la même classe sont fusionnées si elles se recouvrent (IoU > `iou_threshold`), ou si
+    l'une contient presque l'autre (intersection / aire de la plus petite > `containment_threshold`) et
+    que l'une des deux touche une jointure de découpe (`truncated`, voir `truncated_extension`) : c'est le
+    cas d'un objet tronqué au bord d'une découpe et vu entier dans une autre. Deux personnes proches au
+    milieu d'une découpe restent distinctes. La boîte gardée (la plus sûre) est étendue à l'union des
+    deux, pour ne pas conserver la version tronquée.
+    """
+    if len(detections) < 2:
+        return detections
+    truncated = np.zeros(len(detections), dtype=bool) if truncated is None else np.asarray(truncated, dtype=bool)
+    order = np.argsort(-detections[:, 4], kind="stable")
+    detections, truncated = detections[order], truncated[order].copy()
+    boxes = detections[:, :4]
+    x1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    y1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    x2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    y2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    areas = np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+    union = areas[:, None] + areas[None, :] - intersection
+    iou = intersection / np.maximum(union, 1e-9)
+    containment = intersection / np.maximum(np.minimum(areas[:, None], areas[None, :]), 1e-9)
+    at_seam = truncated[:, None] | truncated[None, :]
+    overlapping = ((iou > iou_threshold) | ((containment > containment_threshold) & at_seam)) & \
+        (detections[:, None, 5] == detections[None, :, 5])
+
+    detections = detections.copy()
+    keep = np.ones(len(detections), dtype=bool)
+    for index in range(len(detections)):
+        if keep[index]:
+            merged = overlapping[index] & keep
+            merged[:index + 1] = False  # Seules les boîtes moins sûres sont absorbées
+            if merged.any():
+                group = detections[merged, :4]
+                detections[index, :2] = np.minimum(detections[index, :2], group[:, :2].min(axis=0))
+                detections[index, 2:4] = np.maximum(detections[index, 2:4], group[:, 2:4].max(axis=0))
+                truncated[index] |= truncated[merged].any()
+                keep &= ~merged
+    if not keep.all():
+        # Une boîte agrandie peut maintenant en recouvrir une autre : nouveau passage jusqu'à stabilité
+        return merge_detections(detections[keep], iou_threshold, containment_threshold, truncated[keep])
+    return detections
+
+
+def truncated_extension(detection: np.ndarray, crop: Region, frame_shape, edge: int = 2) -> Optional[Region]:
+    """
+    Si la boîte touche un bord de la découpe qui n'est pas un bord de la frame, l'objet continue
+    probablement au-delà : zone à réanalyser (la boîte prolongée de sa propre taille de ce côté).
+    """
+    height, width = frame_shape[:2]
+    x1, y1, x2, y2 = (float(v) for v in detection[:4])
+    cx1, cy1, cx2, cy2 = crop
+    left = cx1 > 0 and x1 <= cx1 + edge
+    top = cy1 > 0 and y1 <= cy1 + edge
+    right = cx2 < width and x2 >= cx2 - edge
+    bottom = cy2 < height and y2 >= cy2 - edge
+    if not (left or top or right or bottom):
+        return None
+    w, h = x2 - x1, y2 - y1
+    return (int(max(x1 - w * left, 0)), int(max(y1 - h * top, 0)),
+            int(min(x2 + w * right, width)), int(min(y2 + h * bottom, height)))
+
+
+def region_stats(frames_regions: int, frames_full: int, crops: int, pixels_regions: int,
+                 pixels_saved: int) -> Dict[str, Any]:
+    """Statistiques d'inférence par zones (compteurs bruts inclus, pour cumuler plusieurs analyses)."""
+    return {
+        "frames_regions": frames_regions,
+        "frames_full": frames_full,
+        "crops": crops,
+        "crops_per_frame": round(crops / frames_regions, 2) if frames_regions else None,
+        # Pixels des frames entières / pixels réellement analysés, sur les frames traitées par zones
+        "pixel_reduction": round(pixels_saved / pixels_regions, 2) if pixels_regions else None,
+        "pixels_regions": pixels_regions,
+        "pixels_saved": pixels_saved,
+    }
+
+
+def merge_region_stats(stats: Sequence[Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """Statistiques cumulées de plusieurs analyses (ex. segments d'une analyse parallèle) ; None sans zones."""
+    stats = [item for item in stats if item]
+    if not stats:
+        return None
+    return region_stats(*(sum(item[field] for item in stats) for field in
+                          ("frames_regions", "frames_full", "crops", "pixels_regions", "pixels_saved")))
+
+
+class RegionInference:
+    """
+    🔍 Inférence limitée aux zones en mouvement d'une frame haute résolution.
+    - Les zones (voir `MotionDetector.detect_regions`) sont découpées à la résolution native et pavées
+      si besoin (`plan_crops`), puis analysées par paquets, groupées par taille d'entrée du modèle.
+    - Les boîtes sont replacées dans les coordonnées de la frame et dédoublonnées (`merge_detections`).
+    - Une boîte coupée par le bord d'une découpe (zone de mouvement plus petite que l'objet, ex. un
+      objet uniforme dont seuls les contours changent) déclenche au plus `refine_passes` nouvelles
+      analyses sur une découpe agrandie dans sa direction.
+    - Si les découpes couvrent plus de `max_coverage` de la frame (ou sans zones fournies, ex. inférence
+      forcée), la frame entière est analysée comme d'habitude.
+    Un petit objet garde ainsi ses pixels au lieu d'être réduit avec toute la frame 4K à l'entrée du modèle.
+    """
+
+    def __init__(self, tile_size: int = 640, overlap: float = 0.2, min_crop_size: int = 160,
+                 max_coverage: float = 0.5, iou_threshold: float = 0.5, max_batch: int = 16,
+                 refine_passes: int = 2):
+        self.tile_size = int(tile_size)
+        self.overlap = overlap
+        self.min_crop_size = min(int(min_crop_size), self.tile_size)
+        self.max_coverage = max_coverage
+        self.iou_threshold = iou_threshold
+        self.max_batch = max(int(max_batch), 1)  # Découpes par appel au modèle
+        self.refine_passes = max(int(refine_passes), 0)
+        self._lock = threading.Lock()
+        self.frames_regions = 0
+        self.frames_full = 0
+        self.crops = 0
+        self.pixels_regions = 0  # Pixels source des découpes analysées
+        self.pixels_saved = 0  # Pixels source des frames entières qu'elles remplacent
+
+    def config(self) -> Dict[str, Any]:
+        """Réglages qui influent sur les détections (clé du cache de résultats)."""
+        return {"tile_size": self.tile_size, "overlap": self.overlap, "min_crop_size": self.min_crop_size,
+                "max_coverage": self.max_coverage, "iou_threshold": self.iou_threshold,
+                "refine_passes": self.refine_passes, "containment_merge": "seam"}
+
+    def plan(self, regions: Optional[Sequence[Region]], frame_shape) -> Optional[List[Region]]:
+        """Découpes d'une frame, ou None si la frame entière doit être analysée."""
+        if regions is None:
+            return None
+        crops = plan_crops(regions, frame_shape, self.tile_size, self.overlap, self.min_crop_size)
+        frame_pixels = frame_shape[0] * frame_shape[1]
+        covered = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in crops)
+        return crops if covered <= self.max_coverage * frame_pixels else None
+
+    def infer(self, frames: Sequence[np.ndarray], regions: Sequence[Optional[Sequence[Region]]], model,
+              source: str = "video", **kwargs) -> List[np.ndarray]:
+        """
+        Détections (N, 6) de chaque frame, en coordonnées de la frame.
+        `regions[i]` : zones à analyser dans `frames[i]` (None : frame entière ; liste vide : aucune).
+        """
+        results: List[Optional[np.ndarray]] = [None] * len(frames)
+        full_indices = []
+        pending: List[Tuple[int, Region]] = []
+        for index, (frame, frame_regions) in enumerate(zip(frames, regions)):
+            crops = self.plan(frame_regions, frame.shape)
+            if crops is None:
+                full_indices.append(index)
+            else:
+                pending.extend((index, crop) for crop in crops)
+
+        if full_indices:
+            full_frames = [frames[index] for index in full_indices]
+            for index, detections in zip(full_indices, run_inference(full_frames, model=model, **kwargs)):
+                results[index] = detections
+            INFERENCE_PIXELS.labels(source=source, mode="full").inc(sum(f.shape[0] * f.shape[1] for f in full_frames))
+
+        per_frame: Dict[int, List[np.ndarray]] = {}
+        per_frame_truncated: Dict[int, List[np.ndarray]] = {}  # Boîtes qui touchent une jointure de découpe
+        crop_kwargs = {key: value for key, value in kwargs.items() if key != "imgsz"}
+        crop_pixels = 0
+        crop_count = 0
+        for refine_pass in range(self.refine_passes + 1):
+            if not pending:
+                break
+            crop_count += len(pending)
+            crop_pixels += sum((x2 - x1) * (y2 - y1) for _, (x1, y1, x2, y2) in pending)
+            extensions: Dict[int, List[Region]] = {}
+            for index, crop, detections in self._run_crops(frames, pending, model, crop_kwargs):
+                crop_extensions = [truncated_extension(detection, crop, frames[index].shape)
+                                   for detection in detections]
+                per_frame.setdefault(index, []).append(detections)
+                per_frame_truncated.setdefault(index, []).append(
+                    np.array([extension is not None for extension in crop_extensions], dtype=bool))
+                if refine_pass < self.refine_passes:
+                    extensions.setdefault(index, []).extend(
+                        extension for extension in crop_extensions if extension is not None)
+            pending = [(index, crop) for index, frame_extensions in extensions.items()
+                       for crop in plan_crops(merge_regions(frame_extensions), frames[index].shape, self.tile_size,
+                                              self.overlap, self.min_crop_size)]
+
+        region_frames = [index for index in range(len(frames)) if results[index] is None]
+        for index in region_frames:
+            found = per_frame.get(index)
+            results[index] = merge_detections(np.concatenate(found), self.iou_threshold,
+                                              truncated=np.concatenate(per_frame_truncated[index])) if found else \
+                np.empty((0, 6), dtype=np.float32)
+        if region_frames:
+            INFERENCE_PIXELS.labels(source=source, mode="regions").inc(crop_pixels)
+
+        with self._lock:
+            self.frames_full += len(full_indices)
+            self.frames_regions += len(region_frames)
+            self.crops += crop_count
+            self.pixels_regions += crop_pixels
+            self.pixels_saved += sum(frames[index].shape[0] * frames[index].shape[1] for index in region_frames)
+        return results
+
+    def _run_crops(self, frames: Sequence[np.ndarray], crops: List[Tuple[int, Region]], model,
+                   kwargs: Dict[str, Any]):
+        """Analyse les découpes par paquets de même taille d'entrée ; détections en coordonnées de la frame."""
+        by_size: Dict[int, List[Tuple[int, Region]]] = {}
+        for index, crop in crops:
+            by_size.setdefault(crop_input_size(crop, self.tile_size), []).append((index, crop))
+        for size, sized_crops in sorted(by_size.items()):
+            for offset in range(0, len(sized_crops), self.max_batch):
+                chunk = sized_crops[offset:offset + self.max_batch]
+                images = [frames[index][y1:y2, x1:x2] for index, (x1, y1, x2, y2) in chunk]
+                for (index, crop), detections in zip(chunk, run_inference(images, model=model, imgsz=size, **kwargs)):
+                    if len(detections):
+                        detections = detections.copy()
+                        detections[:, [0, 2]] += crop[0]
+                        detections[:, [1, 3]] += crop[1]
+                        yield index, crop, detections
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return region_stats(self.frames_regions, self.frames_full, self.crops, self.pixels_regions,
+                                self.pixels_saved)
@@ -0,0 +1,327 @@
+import atexit
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Any, Callable, Collection, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from controllers.detect_intruder_video import IntruderDetector, detections_path_for
+from controllers.pipeline import bottleneck, merge_stage_stats
+from controllers.regionInference import merge_region_stats
+from controllers.tracker import INVALID_COST, greedy_assignment, iou_matrix
+from controllers.zones import ZoneSet
+import models.yoloModel as yolo_model
+from models.alertModel import close_alert_events, end_alert_frame, save_alert
+from models.detectionStore import DetectionStore
+from models.threatRules import THREAT_RULES
+
+logger = logging.getLogger(__name__)
+
+TRACK_ID_STRIDE = 1_000_000  # Identifiants de piste disjoints entre segments (avant raccordement)
+MIN_SEGMENT_FRAMES = 300  # En dessous, le coût de démarrage d'un worker n'est pas amorti
+TRACK_LINK_IOU = 0.3  # IoU minimale pour raccorder deux pistes de part et d'autre d'une frontière
+
+
+@dataclass
+class Segment:
+    index: int
+    start_frame: int  # Inclus, numéroté à partir de 1
+    end_frame: int  # Inclus
+
+
+def plan_segments(total_frames: int, segment_count: int, min_segment_frames: int = MIN_SEGMENT_FRAMES) -> List[Segment]:
+    """Découpe `total_frames` en segments contigus de tailles égales (au plus `segment_count`)."""
+    segment_count = max(min(segment_count, total_frames // max(min_segment_frames, 1)), 1)
+    size = math.ceil(total_frames / segment_count)
+    return [Segment(index, start, min(start + size - 1, total_frames))
+            for index, start in enumerate(range(1, total_frames + 1, size))]
+
+
+# --------------------------------------------------------------- côté worker
+_worker_detector: Optional[IntruderDetector] = None
+
+
+def _init_worker(detector_options: Dict[str, Any], torch_threads: int):
+    """Un détecteur et un modèle par processus, chargés une seule fois."""
+    global _worker_detector
+    yolo_model.INFERENCE_WORKERS = 0  # Le segment est déjà un processus à part : pas de pool d'inférence imbriqué
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)  # Éviter la sur-souscription des cœurs entre workers
+    except ImportError:
+        pass
+    _worker_detector = IntruderDetector(**detector_options)
+    _worker_detector.model  # noqa: B018 - chargement immédiat du modèle
+
+
+def _run_segment(video_path: str, segment: Segment, overlap: int, clip_path: str,
+                 zones: Optional[ZoneSet]) -> Dict[str, Any]:
+    # Pas d'alertes dans les workers : le processus parent les rejoue sur les détections fusionnées
+    return _worker_detector.analyze_segment(video_path, clip_path, segment.start_frame, segment.end_frame,
+                                            overlap=overlap, first_track_id=segment.index * TRACK_ID_STRIDE + 1,
+                                            zones=zones)
+
+
+# ---------------------------------------------------------- pools de workers
+# Un pool par configuration, gardé d'une vidéo à l'autre : chaque worker ne charge son modèle qu'une fois
+_pools: Dict[str, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(workers: int, detector_options: Dict[str, Any], torch_threads: int) -> Tuple[str, ProcessPoolExecutor]:
+    key = repr((workers, torch_threads, sorted(detector_options.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            # spawn : un fork après le chargement de torch ou de threads peut bloquer les workers
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_worker, initargs=(detector_options, torch_threads))
+            _pools[key] = pool
+        return key, pool
+
+
+def _discard_pool(key: str, pool: ProcessPoolExecutor):
+    """Pool cassé (worker mort) : retiré, le prochain appel en crée un nouveau."""
+    with _pools_lock:
+        if _pools.get(key) is pool:
+            del _pools[key]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown_pools)
+
+
+# ---------------------------------------------------------------- fusion
+def link_tracks(stores: Sequence[DetectionStore], segments: Sequence[Segment], max_gap: int) -> None:
+    """
+    Renumérote en place les pistes des segments en identifiants continus (1, 2, ... par première apparition).
+    Une piste qui commence au plus `max_gap` frames après le début d'un segment reprend l'identifiant de la
+    piste du segment précédent, finie au plus `max_gap` frames avant la frontière, de même classe et dont la
+    dernière boîte la recouvre le plus (IoU >= TRACK_LINK_IOU, affectation gloutonne).
+    """
+    next_id = 1
+    tails = None  # Identifiants, boîtes et classes des fins de piste du segment précédent
+    for store, segment in zip(stores, segments):
+        columns = store.columns
+        track_ids = columns["track_id"]
+        if not len(track_ids):
+            tails = None
+            continue
+        unique, first_rows = np.unique(track_ids, return_index=True)
+        last_rows = len(track_ids) - 1 - np.unique(track_ids[::-1], return_index=True)[1]
+        mapping = np.zeros(len(unique), dtype=np.int64)  # 0 : détection sans piste
+        linked = unique == 0
+
+        heads = np.flatnonzero(~linked & (columns["frame"][first_rows] <= segment.start_frame + max_gap))
+        if tails is not None and len(tails[0]) and len(heads):
+            tail_ids, tail_boxes, tail_classes = tails
+            head_boxes = columns["bbox"][first_rows[heads]].astype(np.float32)
+            iou = iou_matrix(tail_boxes, head_boxes)
+            same_class = tail_classes[:, None] == columns["class_id"][first_rows[heads]][None, :]
+            rows, cols = greedy_assignment(np.where((iou >= TRACK_LINK_IOU) & same_class, 1.0 - iou, INVALID_COST))
+            mapping[heads[cols]] = tail_ids[rows]
+            linked[heads[cols]] = True
+
+        new = np.flatnonzero(~linked)
+        new = new[np.argsort(first_rows[new])]
+        mapping[new] = np.arange(next_id, next_id + len(new))
+        next_id += len(new)
+        columns["track_id"][:] = mapping[np.searchsorted(unique, track_ids)]
+
+        ending = (unique != 0) & (columns["frame"][last_rows] >= segment.end_frame - max_gap)
+        tails = (mapping[ending], columns["bbox"][last_rows[ending]].astype(np.float32),
+                 columns["class_id"][last_rows[ending]])
+
+
+def replay_alerts(store: DetectionStore, video_path: str, fps: int, last_frame: int,
+                  reused_frames: Collection[int] = ()) -> None:
+    """
+    Alertes et évènements de toute la vidéo, enregistrés dans l'ordre des frames comme par une analyse
+    en un seul processus : un objet qui franchit une frontière de segment garde un seul évènement.
+    Les frames de `reused_frames` (détections réutilisées, non inférées) ne déclenchent pas d'alerte.
+    """
+    columns = store.columns
+    levels = THREAT_RULES.level_names(columns["class_id"], columns["speed"], columns["is_running"])
+    records = store.records()
+    bounds = np.searchsorted(columns["frame"], np.arange(1, last_frame + 2)).tolist()
+    try:
+        for frame_number in range(1, last_frame + 1):
+            if frame_number in reused_frames:
+                continue
+            event_time = frame_number / fps
+            for row in range(bounds[frame_number - 1], bounds[frame_number]):
+                detection = records[row]
+                save_alert(detection["object_type"], detection["confidence"], detection["bbox"],
+                           detection["speed"], detection["is_running"], frame=frame_number, video_path=video_path,
+                           track_id=detection["track_id"], zone_id=detection["zone_id"], event_time=event_time,
+                           threat_level=levels[row])
+            end_alert_frame(video_path, event_time)  # Ferme les évènements des objets disparus
+    finally:
+        close_alert_events(video_path)
+
+
+def _remove_files(paths: Sequence[str]):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _concat_clips(clip_paths: List[str], output_path: str, fps: int, size) -> None:
+    """Concatène les clips des segments : copie de flux via ffmpeg si disponible, sinon ré-encodage OpenCV."""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        list_path = output_path + ".segments.txt"
+        with open(list_path, "w", encoding="utf-8") as listing:
+            for clip_path in clip_paths:
+                listing.write(f"file '{os.path.abspath(clip_path)}'\n")
+        completed = subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                                    "-i", list_path, "-c", "copy", output_path])
+        os.remove(list_path)
+        if completed.returncode == 0:
+            return
+        logger.warning("⚠️ Concaténation ffmpeg impossible, ré-encodage avec OpenCV")
+
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    for clip_path in clip_paths:
+        cap = cv2.VideoCapture(clip_path)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            out.write(frame)
+        cap.release()
+    out.release()
+
+
+def analyze_video_sharded(video_path: str,
+                          workers: Optional[int] = None,
+                          overlap: int = 15,
+                          detector_options: Optional[Dict[str, Any]] = None,
+                          progress_callback: Optional[Callable[[int, int], None]] = None,
+                          min_segment_frames: int = MIN_SEGMENT_FRAMES,
+                          zones: Optional[ZoneSet] = None) -> Dict[str, Any]:
+    """
+    🧩 Analyse une longue vidéo en parallèle, par plages de frames, dans un pool de processus.
+    - Le pool (un modèle chargé par worker) est gardé d'une vidéo à l'autre pour les mêmes `detector_options` ;
+      `zones` est transmis à chaque segment.
+    - Chaque worker traite un segment (positionnement par CAP_PROP_POS_FRAMES). Chaque segment commence
+      `overlap` frames plus tôt : ces frames alimentent le suivi sans être signalées, pour que les vitesses
+      soient correctes dès la frontière du segment.
+    - Les détections des segments sont fusionnées en un seul rapport et un seul fichier de détections ;
+      avec `render_video`, leurs clips annotés en une seule vidéo.
+    - Les pistes sont raccordées aux frontières (`link_tracks`), puis les alertes sont rejouées dans l'ordre
+      des frames (`replay_alerts`) : les évènements ne sont pas coupés entre segments.
+    - Le rapport a les champs d'une analyse en un seul processus (mesures des étages et de l'inférence par
+      zones cumulées sur les segments, frames comptées sur la plage propre à chaque segment), plus `segments`.
+    """
+    start_time = datetime.now()
+    detector_options = detector_options or {}
+    detector = IntruderDetector(**detector_options)
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        logger.error(f"Impossible de charger la vidéo: {video_path}")
+        return {"status": "error", "message": "Fichier vidéo inaccessible"}
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = max(int(cap.get(cv2.CAP_PROP_FPS)), 1)
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    cap.release()
+
+    workers = max(int(workers or os.cpu_count() or 1), 1)
+    segments = plan_segments(total_frames, workers, min_segment_frames) if total_frames > 0 else []
+    if len(segments) <= 1:
+        # Vidéo courte ou nombre de frames inconnu : analyse classique dans ce processus
+        return detector.detect_intruder_in_video(video_path, progress_callback=progress_callback, zones=zones)
+
+    output_dir, output_video_path = detector._prepare_output_paths(video_path)
+    clip_paths = [os.path.join(output_dir, f"segment_{segment.index:03d}.mp4") for segment in segments]
+    torch_threads = max((os.cpu_count() or 1) // workers, 1)
+    pool_key, pool = _get_pool(workers, detector_options, torch_threads)
+    logger.info(f"🧩 {len(segments)} segments sur {workers} processus ({torch_threads} threads chacun)")
+
+    reports: Dict[int, Dict[str, Any]] = {}
+    frames_done = 0
+    completed = False
+    futures = {}
+    try:
+        futures = {pool.submit(_run_segment, video_path, segment, overlap, clip_path, zones): segment
+                   for segment, clip_path in zip(segments, clip_paths)}
+        try:
+            for future in as_completed(futures):
+                segment = futures[future]
+                report = future.result()
+                if report.get("status") != "success":
+                    return report
+                reports[segment.index] = report
+                frames_done += segment.end_frame - segment.start_frame + 1
+                if progress_callback is not None:
+                    progress_callback(frames_done, total_frames)
+        except BrokenProcessPool:
+            _discard_pool(pool_key, pool)
+            raise
+
+        ordered = [reports[segment.index] for segment in segments]
+        rendered = ordered[0]["video_path"] is not None
+        if rendered:
+            _concat_clips(clip_paths, output_video_path, fps, size)
+        segment_stores = [DetectionStore.load(report["detections_path"]) for report in ordered]
+        link_tracks(segment_stores, segments, max_gap=detector.track_max_age)
+        store = DetectionStore.concatenate(segment_stores)
+        store.metadata["source_video"] = video_path
+        detections_path = store.save(detections_path_for(output_video_path))
+        reused_frames = {frame for report in ordered for frame in report["reused_frames"]}
+        replay_alerts(store, output_video_path, fps, segments[-1].end_frame, reused_frames)
+        completed = True
+    finally:
+        # Segments encore en cours (échec d'un autre segment) : attendre qu'ils n'écrivent plus rien
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        _remove_files(clip_paths + [detections_path_for(clip_path) for clip_path in clip_paths])
+        if not completed:
+            _remove_files([output_video_path, detections_path_for(output_video_path)])
+            if os.path.isdir(output_dir) and not os.listdir(output_dir):
+                os.rmdir(output_dir)
+
+    stage_stats = merge_stage_stats([report["stage_stats"] for report in ordered])
+    return {
+        "status": "success",
+        "video_path": output_video_path if rendered else None,
+        "source_video_path": video_path,
+        "detections_path": detections_path,
+        "detection_count": len(store),
+        "total_persons_detected": sum(report["total_persons_detected"] for report in ordered),
+        "detections": store.records(),
+        "processing_time": (datetime.now() - start_time).total_seconds(),
+        "batch_size": ordered[0]["batch_size"],
+        "motion_gating": ordered[0]["motion_gating"],
+        "frames_inferred": sum(report["frames_inferred"] for report in ordered),
+        "frames_skipped": sum(report["frames_skipped"] for report in ordered),
+        "region_inference": merge_region_stats([report["region_inference"] for report in ordered]),
+        "zones": zones.ids if zones is not None else None,
+        "pipeline": ordered[0]["pipeline"],
+        "stage_stats": {name: stats.to_dict() for name, stats in stage_stats.items()},
+        "bottleneck": bottleneck(stage_stats),
+        "segments": [{**asdict(segment), "overlap": overlap,
+                      "processing_time": report["processing_time"],
+                      "frames_inferred": report["frames_inferred"]}
+                     for segment, report in zip(segments, ordered)],
+    }
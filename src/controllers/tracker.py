@@ -0,0 +1,161 @@
+import numpy as np
+from typing import Tuple
+
+INVALID_COST = 1e6
+_UNLOADED = object()
+_linear_sum_assignment = _UNLOADED
+
+
+def _assignment_solver():
+    """Affectation optimale (Hongrois) de scipy si disponible, importée au premier usage (import lent)."""
+    global _linear_sum_assignment
+    if _linear_sum_assignment is _UNLOADED:
+        try:
+            from scipy.optimize import linear_sum_assignment
+        except ImportError:  # pragma: no cover - scipy est une dépendance d'ultralytics
+            linear_sum_assignment = None
+        _linear_sum_assignment = linear_sum_assignment
+    return _linear_sum_assignment
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """IoU entre chaque boîte de `boxes_a` (N, 4) et de `boxes_b` (M, 4), au format x1, y1, x2, y2."""
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+
+def _centers(boxes: np.ndarray) -> np.ndarray:
+    return np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2], axis=1)
+
+
+def greedy_assignment(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Affectation gloutonne (coût minimal global à chaque itération), utilisée sans scipy."""
+    cost = cost.copy()
+    rows, cols = [], []
+    for _ in range(min(cost.shape)):
+        flat_index = int(np.argmin(cost))
+        row, col = divmod(flat_index, cost.shape[1])
+        if cost[row, col] >= INVALID_COST:
+            break
+        rows.append(row)
+        cols.append(col)
+        cost[row, :] = INVALID_COST
+        cost[:, col] = INVALID_COST
+    return np.array(rows, dtype=int), np.array(cols, dtype=int)
+
+
+class MultiObjectTracker:
+    """
+    🎯 Suivi multi-objets avec identifiants stables d'une frame à l'autre.
+    - Modèle de mouvement à vitesse constante (vitesse lissée exponentiellement, en px/frame).
+    - Coût d'association vectorisé : 1 - IoU avec la position prédite, avec repli sur la distance
+      entre centres (normalisée par la diagonale de la boîte) pour les objets rapides.
+    - Les associations entre classes différentes sont interdites.
+    - Naissance d'une piste pour chaque détection non associée, mort après `max_age` frames manquées.
+    Toutes les pistes sont stockées dans des tableaux NumPy : pas de double boucle Python.
+    """
+
+    def __init__(self,
+                 iou_threshold: float = 0.3,
+                 max_distance: float = 1.0,
+                 max_age: int = 15,
+                 velocity_smoothing: float = 0.6,
+                 first_id: int = 1):
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance  # En diagonales de boîte
+        self.max_age = max_age
+        self.velocity_smoothing = velocity_smoothing
+        self._next_id = first_id  # Permet des identifiants disjoints entre segments d'une même vidéo
+
+        self.ids = np.empty(0, dtype=np.int64)
+        self.boxes = np.empty((0, 4), dtype=np.float32)  # Dernière boîte observée
+        self.velocities = np.empty((0, 2), dtype=np.float32)
+        self.class_ids = np.empty(0, dtype=np.int64)
+        self.misses = np.empty(0, dtype=np.int64)  # Frames consécutives sans association
+
+    def __len__(self):
+        return len(self.ids)
+
+    def predicted_boxes(self) -> np.ndarray:
+        steps = (self.misses + 1).astype(np.float32)[:, None]
+        shift = self.velocities * steps
+        return self.boxes + np.concatenate([shift, shift], axis=1)
+
+    def _cost_matrix(self, boxes: np.ndarray, class_ids: np.ndarray) -> np.ndarray:
+        predicted = self.predicted_boxes()
+        iou = iou_matrix(predicted, boxes)
+
+        diagonals = np.hypot(predicted[:, 2] - predicted[:, 0], predicted[:, 3] - predicted[:, 1])
+        distances = np.linalg.norm(_centers(predicted)[:, None, :] - _centers(boxes)[None, :, :], axis=2)
+        normalized_distances = distances / np.maximum(diagonals, 1.0)[:, None]
+
+        # IoU suffisante : coût dans [0, 1[ ; sinon repli sur la distance : coût dans [1, 2]
+        cost = np.where(iou >= self.iou_threshold, 1.0 - iou, 1.0 + normalized_distances / self.max_distance)
+        invalid = (iou < self.iou_threshold) & (normalized_distances > self.max_distance)
+        invalid |= self.class_ids[:, None] != class_ids[None, :]
+        cost[invalid] = INVALID_COST
+        return cost
+
+    def update(self, boxes: np.ndarray, class_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Associe les détections (N, 4) de la frame courante aux pistes existantes.
+        Retourne, pour chaque détection, l'identifiant de piste et la vitesse de la piste (px/frame).
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        class_ids = np.asarray(class_ids, dtype=np.int64).reshape(-1)
+        detection_track_ids = np.zeros(len(boxes), dtype=np.int64)
+        detection_speeds = np.zeros(len(boxes), dtype=np.float32)
+
+        track_rows = det_cols = np.empty(0, dtype=int)
+        if len(self.ids) and len(boxes):
+            cost = self._cost_matrix(boxes, class_ids)
+            linear_sum_assignment = _assignment_solver()
+            if linear_sum_assignment is not None:
+                track_rows, det_cols = linear_sum_assignment(cost)
+                valid = cost[track_rows, det_cols] < INVALID_COST
+                track_rows, det_cols = track_rows[valid], det_cols[valid]
+            else:
+                track_rows, det_cols = greedy_assignment(cost)
+
+        # Pistes associées : mise à jour de la vitesse lissée puis de la boîte
+        if len(track_rows):
+            steps = (self.misses[track_rows] + 1).astype(np.float32)[:, None]
+            measured = (_centers(boxes[det_cols]) - _centers(self.boxes[track_rows])) / steps
+            alpha = self.velocity_smoothing
+            self.velocities[track_rows] = alpha * measured + (1 - alpha) * self.velocities[track_rows]
+            self.boxes[track_rows] = boxes[det_cols]
+            self.misses[track_rows] = 0
+            detection_track_ids[det_cols] = self.ids[track_rows]
+            detection_speeds[det_cols] = np.linalg.norm(self.velocities[track_rows], axis=1)
+
+        # Pistes non associées : vieillissement puis suppression
+        unmatched_tracks = np.ones(len(self.ids), dtype=bool)
+        unmatched_tracks[track_rows] = False
+        self.misses[unmatched_tracks] += 1
+        alive = self.misses <= self.max_age
+        self.ids, self.boxes = self.ids[alive], self.boxes[alive]
+        self.velocities, self.class_ids, self.misses = self.velocities[alive], self.class_ids[alive], self.misses[alive]
+
+        # Détections non associées : naissance de nouvelles pistes
+        unmatched_detections = np.ones(len(boxes), dtype=bool)
+        unmatched_detections[det_cols] = False
+        new_count = int(unmatched_detections.sum())
+        if new_count:
+            new_ids = np.arange(self._next_id, self._next_id + new_count, dtype=np.int64)
+            self._next_id += new_count
+            detection_track_ids[unmatched_detections] = new_ids
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.boxes = np.concatenate([self.boxes, boxes[unmatched_detections]])
+            self.velocities = np.concatenate([self.velocities, np.zeros((new_count, 2), dtype=np.float32)])
+            self.class_ids = np.concatenate([self.class_ids, class_ids[unmatched_detections]])
+            self.misses = np.concatenate([self.misses, np.zeros(new_count, dtype=np.int64)])
+
+        return detection_track_ids, detection_speeds
@@ -0,0 +1,183 @@
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Levée quand tous les workers sont occupés et que la file d'attente est pleine."""
+
+
+class JobCancelled(Exception):
+    """Levée dans le worker (à la progression suivante) quand un job est annulé par `cancel`."""
+
+
+@dataclass
+class JobReservation:
+    """Place prise dans la file avant la réception d'une vidéo ; consommée par `submit`, sinon rendue par `release`."""
+    active: bool = True
+
+
+@dataclass
+class VideoJob:
+    job_id: str
+    video_path: str
+    status: str = "queued"  # queued -> running -> done | error | cancelled
+    frames_processed: int = 0
+    total_frames: int = 0
+    created_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+
+    def to_status(self) -> Dict[str, Any]:
+        progress = self.frames_processed / self.total_frames if self.total_frames else 0.0
+        if self.status == "done":
+            progress = 1.0
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "frames_processed": self.frames_processed,
+            "total_frames": self.total_frames,
+            "progress": round(min(progress, 1.0), 4),
+            "created_at": self.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "started_at": self.started_at.strftime("%Y-%m-%d %H:%M:%S") if self.started_at else None,
+            "finished_at": self.finished_at.strftime("%Y-%m-%d %H:%M:%S") if self.finished_at else None,
+            "error": self.error,
+        }
+
+
+class VideoJobQueue:
+    """
+    📥 File de jobs d'analyse vidéo traitée par un pool borné de workers.
+    - `max_workers` vidéos sont analysées en parallèle, `max_pending` autres peuvent attendre.
+    - Au-delà, `submit` lève `QueueFullError` (contre-pression côté API).
+    - `reserve` prend une place avant l'upload : un serveur saturé refuse la vidéo sans la recevoir,
+      et la vidéo reçue a sa place garantie.
+    - Seuls les `max_finished` derniers jobs terminés sont conservés en mémoire.
+    """
+
+    def __init__(self, handler: Callable[..., Dict[str, Any]],
+                 max_workers: int = 2, max_pending: int = 8, max_finished: int = 200):
+        self.handler = handler
+        self.max_workers = max(int(max_workers), 1)
+        self.max_pending = max(int(max_pending), 0)
+        self.max_finished = max(int(max_finished), 1)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="video-job")
+        self._jobs: "OrderedDict[str, VideoJob]" = OrderedDict()
+        self._active = 0  # Jobs en attente ou en cours, et places réservées
+        self._reserved = 0  # Places réservées par des uploads en cours
+        self._lock = threading.Lock()
+
+    def is_saturated(self) -> bool:
+        with self._lock:
+            return self._active >= self.max_workers + self.max_pending
+
+    def reserve(self) -> JobReservation:
+        """Réserve une place pour une vidéo pas encore reçue ; lève `QueueFullError` si la file est saturée."""
+        with self._lock:
+            if self._active >= self.max_workers + self.max_pending:
+                raise QueueFullError("File d'analyse saturée, réessayez plus tard")
+            self._active += 1
+            self._reserved += 1
+        return JobReservation()
+
+    def release(self, reservation: Optional[JobReservation]):
+        """Rend une place réservée et non utilisée (upload refusé, résultat en cache...) ; sans effet sinon."""
+        with self._lock:
+            if reservation is not None and reservation.active:
+                reservation.active = False
+                self._active -= 1
+                self._reserved -= 1
+
+    def submit(self, video_path: str, reservation: Optional[JobReservation] = None,
+               handler: Optional[Callable[..., Dict[str, Any]]] = None, **options) -> VideoJob:
+        """
+        Place une vidéo en file (dans la place `reservation` si fournie) ; `options` est transmis au handler.
+        `handler` : traitement de ce job à la place de celui de la file (ex. rendu d'une vidéo annotée).
+        """
+        with self._lock:
+            if reservation is not None and reservation.active:
+                reservation.active = False  # Place déjà comptée dans `_active`
+                self._reserved -= 1
+            elif self._active >= self.max_workers + self.max_pending:
+                raise QueueFullError("File d'analyse saturée, réessayez plus tard")
+            else:
+                self._active += 1
+            job = VideoJob(job_id=uuid.uuid4().hex, video_path=video_path)
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job, handler or self.handler, options)
+        logger.info(f"📥 Job {job.job_id} mis en file ({video_path})")
+        return job
+
+    def add_finished(self, video_path: str, result: Dict[str, Any]) -> VideoJob:
+        """Enregistre un job déjà terminé (résultat servi par le cache) : mêmes URLs de statut et de résultat."""
+        now = datetime.now()
+        job = VideoJob(job_id=uuid.uuid4().hex, video_path=video_path, status="done",
+                       started_at=now, finished_at=now, result=result)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._evict_finished()
+        return job
+
+    def cancel(self, job: VideoJob):
+        """Demande l'arrêt d'un job : il s'arrête à sa prochaine progression (ou avant de démarrer)."""
+        job.cancel_requested = True
+
+    def get(self, job_id: str) -> Optional[VideoJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.status == "running")
+            return {"running": running, "queued": self._active - self._reserved - running,
+                    "reserved": self._reserved, "max_workers": self.max_workers, "max_pending": self.max_pending}
+
+    def _run(self, job: VideoJob, handler: Callable[..., Dict[str, Any]], options: Dict[str, Any]):
+        job.status = "running"
+        job.started_at = datetime.now()
+
+        def on_progress(frames_processed: int, total_frames: int):
+            if job.cancel_requested:
+                raise JobCancelled("Job annulé")
+            job.frames_processed = frames_processed
+            job.total_frames = total_frames
+
+        try:
+            if job.cancel_requested:
+                raise JobCancelled("Job annulé")
+            job.result = handler(job.video_path, on_progress, **options)
+            if job.result.get("status") == "error":
+                job.status = "error"
+                job.error = job.result.get("message")
+            else:
+                job.status = "done"
+        except Exception as e:
+            if not job.cancel_requested:
+                logger.exception(f"🚨 Échec du job {job.job_id}: {e}")
+            job.status = "error"
+            job.error = str(e)
+        finally:
+            if job.cancel_requested and job.status != "done":
+                # Y compris un échec de lecture du fichier supprimé après l'annulation
+                job.status = "cancelled"
+                job.error = "Job annulé"
+            job.finished_at = datetime.now()
+            with self._lock:
+                self._active -= 1
+                self._evict_finished()
+            logger.info(f"✅ Job {job.job_id} terminé ({job.status})")
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ("done", "error", "cancelled")]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job_id]
@@ -0,0 +1,182 @@
+import json
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+from controllers.detect_behavior import Region, merge_regions
+
+Polygon = Tuple[Tuple[float, float], ...]
+
+MAX_ZONES = 255  # Identifiants de zone stockés sur un octet dans le masque
+
+
+@dataclass(frozen=True)
+class Zone:
+    zone_id: str
+    polygon: Polygon  # Sommets (x, y) en pixels, ou en fractions de la frame si toutes les valeurs sont <= 1
+
+
+def _parse_polygon(points: Any, label: str) -> Polygon:
+    try:
+        polygon = tuple((float(x), float(y)) for x, y in points)
+    except (TypeError, ValueError):
+        raise ValueError(f"{label}: polygone attendu sous la forme [[x, y], ...]")
+    if len(polygon) < 3:
+        raise ValueError(f"{label}: un polygone a au moins 3 sommets")
+    if any(x < 0 or y < 0 for x, y in polygon):
+        raise ValueError(f"{label}: coordonnées négatives")
+    return polygon
+
+
+@dataclass
+class _CompiledZones:
+    labels: np.ndarray  # (H, W) uint8 : 0 hors zone, sinon indice de zone + 1
+    crops: List[Region]  # Boîtes englobantes des zones (fusionnées), exclusions déduites
+
+
+class ZoneSet:
+    """
+    🗺️ Zones de détection d'une caméra ou d'une analyse : polygones inclus, polygones exclus.
+    - Compilées une fois par taille de frame en un masque d'étiquettes (un octet par pixel) ; les
+      zones se chevauchant sont attribuées dans l'ordre de déclaration, les exclusions l'emportent.
+    - Une détection compte si son point d'appui (milieu du bas de la boîte : les pieds d'une
+      personne) est dans une zone ; le test est une lecture vectorisée du masque.
+    - Les boîtes englobantes des zones servent de découpes d'inférence (voir `RegionInference`).
+    """
+
+    def __init__(self, zones: Sequence[Zone], exclusions: Sequence[Polygon] = ()):
+        if not zones:
+            raise ValueError("Au moins une zone est nécessaire")
+        if len(zones) > MAX_ZONES:
+            raise ValueError(f"{MAX_ZONES} zones au plus")
+        ids = [zone.zone_id for zone in zones]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Identifiants de zone en double")
+        self.zones = tuple(zones)
+        self.exclusions = tuple(exclusions)
+        self._compiled: Dict[Tuple[int, int], _CompiledZones] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_spec(cls, spec: Union[str, Dict[str, Any], List[Any], None]) -> Optional["ZoneSet"]:
+        """
+        Zones depuis leur description JSON (chaîne ou objet déjà décodé) ; None si `spec` est vide.
+        `{"zones": [{"id": "parking", "polygon": [[x, y], ...]}, ...], "exclude": [[[x, y], ...], ...]}`
+        ou directement la liste des zones. Lève ValueError si la description est invalide.
+        """
+        if spec in (None, "", [], {}):
+            return None
+        if isinstance(spec, str):
+            try:
+                spec = json.loads(spec)
+            except ValueError:
+                raise ValueError("Zones: JSON invalide")
+        if isinstance(spec, list):
+            spec = {"zones": spec}
+        if not isinstance(spec, dict) or not isinstance(spec.get("zones"), list):
+            raise ValueError("Zones: objet {\"zones\": [...]} attendu")
+        zones = []
+        for index, item in enumerate(spec["zones"]):
+            if not isinstance(item, dict):
+                raise ValueError(f"Zone {index}: objet {{\"id\", \"polygon\"}} attendu")
+            zone_id = str(item.get("id", f"zone{index + 1}"))
+            zones.append(Zone(zone_id, _parse_polygon(item.get("polygon"), f"Zone {zone_id}")))
+        exclusions = [_parse_polygon(points, f"Exclusion {index}") for index, points in enumerate(spec.get("exclude", []))]
+        return cls(zones, exclusions)
+
+    def config(self) -> Dict[str, Any]:
+        """Description canonique (clé du cache de résultats, rapports)."""
+        return {"zones": [{"id": zone.zone_id, "polygon": [list(point) for point in zone.polygon]}
+                          for zone in self.zones],
+                "exclude": [[list(point) for point in polygon] for polygon in self.exclusions]}
+
+    @property
+    def ids(self) -> List[str]:
+        return [zone.zone_id for zone in self.zones]
+
+    # ------------------------------------------------------------------ masques
+    @staticmethod
+    def _to_pixels(polygon: Polygon, width: int, height: int) -> np.ndarray:
+        points = np.asarray(polygon, dtype=np.float64)
+        if points.max() <= 1.0:
+            points = points * (width, height)  # Coordonnées relatives
+        return np.round(points).astype(np.int32)
+
+    def compile(self, frame_shape) -> _CompiledZones:
+        height, width = frame_shape[:2]
+        compiled = self._compiled.get((height, width))
+        if compiled is not None:
+            return compiled
+        labels = np.zeros((height, width), dtype=np.uint8)
+        for index in reversed(range(len(self.zones))):  # La première zone déclarée l'emporte
+            cv2.fillPoly(labels, [self._to_pixels(self.zones[index].polygon, width, height)], index + 1)
+        for polygon in self.exclusions:
+            cv2.fillPoly(labels, [self._to_pixels(polygon, width, height)], 0)
+        crops = []
+        for index in range(len(self.zones)):
+            x, y, w, h = cv2.boundingRect((labels == index + 1).astype(np.uint8))
+            if w and h:
+                crops.append((x, y, x + w, y + h))
+        compiled = _CompiledZones(labels, merge_regions(crops))
+        with self._lock:
+            self._compiled[(height, width)] = compiled
+        return compiled
+
+    def crop_regions(self, frame_shape, motion_regions: Optional[Sequence[Region]] = None) -> List[Region]:
+        """
+        Découpes à analyser : les boîtes des zones, ou seulement leur intersection avec les zones en
+        mouvement si `motion_regions` est donné (liste vide : rien à analyser).
+        """
+        crops = self.compile(frame_shape).crops
+        if motion_regions is None:
+            return list(crops)
+        clipped = []
+        for zx1, zy1, zx2, zy2 in crops:
+            for mx1, my1, mx2, my2 in motion_regions:
+                x1, y1, x2, y2 = max(zx1, mx1), max(zy1, my1), min(zx2, mx2), min(zy2, my2)
+                if x1 < x2 and y1 < y2:
+                    clipped.append((x1, y1, x2, y2))
+        return merge_regions(clipped)
+
+    def assign(self, detections: np.ndarray, frame_shape) -> Tuple[np.ndarray, List[str]]:
+        """Garde les détections (N, 6) dont le point d'appui est dans une zone ; retourne aussi leur zone."""
+        if not len(detections):
+            return detections, []
+        labels = self.compile(frame_shape).labels
+        height, width = labels.shape
+        xs = np.clip(((detections[:, 0] + detections[:, 2]) / 2).astype(np.int64), 0, width - 1)
+        ys = np.clip(detections[:, 3].astype(np.int64) - 1, 0, height - 1)
+        found = labels[ys, xs]
+        inside = found > 0
+        return detections[inside], [self.zones[label - 1].zone_id for label in found[inside].tolist()]
+
+    def draw(self, frame: np.ndarray):
+        """Contours des zones (jaune) et des exclusions (gris) sur la frame annotée."""
+        height, width = frame.shape[:2]
+        for zone in self.zones:
+            points = self._to_pixels(zone.polygon, width, height)
+            cv2.polylines(frame, [points], True, (0, 255, 255), 1)
+            cv2.putText(frame, zone.zone_id, tuple(int(v) for v in points[0]), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                        (0, 255, 255), 1)
+        for polygon in self.exclusions:
+            cv2.polylines(frame, [self._to_pixels(polygon, width, height)], True, (128, 128, 128), 1)
+
+    def __getstate__(self):
+        # Transmis aux processus d'analyse par segments : les masques sont recompilés sur place
+        return {"zones": self.zones, "exclusions": self.exclusions}
+
+    def __setstate__(self, state):
+        self.__init__(state["zones"], state["exclusions"])
+
+
+def load_camera_zones(path: str) -> Dict[str, ZoneSet]:
+    """Fichier JSON `{"<caméra>": <zones>, ...}` (format de `ZoneSet.from_spec`) -> zones par caméra."""
+    with open(path, encoding="utf-8") as zones_file:
+        spec = json.load(zones_file)
+    if not isinstance(spec, dict):
+        raise ValueError("Zones par caméra: objet {\"<caméra>\": zones} attendu")
+    zones = {camera_id: ZoneSet.from_spec(camera_spec) for camera_id, camera_spec in spec.items()}
+    return {camera_id: zone_set for camera_id, zone_set in zones.items() if zone_set is not None}
@@ -0,0 +1,161 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from models.threatRules import THREAT_ORDER  # Un évènement garde le niveau le plus élevé observé
+from utils.metrics import ALERT_EVENTS
+
+
+@dataclass
+class _Event:
+    document: Dict[str, Any]
+    started_at: float  # Temps de l'évènement (secondes, même base que `now`)
+    last_seen: float
+    last_written: float
+    closed_at: Optional[float] = None
+
+
+class AlertEventAggregator:
+    """
+    🧾 Regroupe les alertes d'un même objet en un évènement (un document MongoDB au lieu d'un par frame).
+    - Clé d'un objet : (source, piste) quand le suivi fournit un identifiant, sinon (source, classe, zone).
+    - Ouverture : document écrit immédiatement (révision 1). Tant que l'objet reste visible, le document
+      est mis à jour en mémoire (confiance max, vitesse de pointe, niveau de menace le plus haut,
+      première/dernière frame) et réécrit au plus toutes les `heartbeat_interval` secondes, ou tout de
+      suite si la menace s'aggrave.
+    - Fermeture : après `close_after` secondes sans l'objet (`sweep`) ou en fin d'analyse (`close_source`).
+    - Refroidissement : un objet qui réapparaît moins de `cooldown` secondes après la fermeture
+      rouvre le même évènement.
+    Les méthodes retournent les documents à écrire (révisions complètes, `_id` stable) : l'écriture
+    reste à l'appelant (voir `save_alert`).
+    """
+
+    def __init__(self, close_after: float = 2.0, heartbeat_interval: float = 10.0, cooldown: float = 30.0):
+        self.close_after = close_after
+        self.heartbeat_interval = heartbeat_interval
+        self.cooldown = cooldown
+        self._events: Dict[Tuple, _Event] = {}
+        self._by_source: Dict[Any, set] = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reopened = 0
+        self.observed = 0
+
+    @staticmethod
+    def event_key(alert: Dict[str, Any]) -> Tuple:
+        source = alert.get("video_path")
+        if alert.get("track_id"):
+            return source, "track", alert["track_id"]
+        return source, alert.get("object_type"), alert.get("zone_id")
+
+    # ------------------------------------------------------------------ API
+    def observe(self, alert: Dict[str, Any], now: Optional[float] = None) -> Tuple[ObjectId, List[Dict[str, Any]]]:
+        """Ajoute une alerte à l'évènement de son objet ; retourne l'identifiant de l'évènement et les écritures."""
+        now = time.monotonic() if now is None else now
+        key = self.event_key(alert)
+        writes = []
+        with self._lock:
+            self.observed += 1
+            event = self._events.get(key)
+            if event is not None and event.closed_at is not None:
+                if now - event.closed_at <= self.cooldown:
+                    event.closed_at = None  # Refroidissement : même évènement
+                    event.document["status"] = "open"
+                    self.reopened += 1
+                else:
+                    self._forget(key)
+                    event = None
+
+            if event is None:
+                event = self._open(key, alert, now)
+                writes.append(self._revision(event, now))
+                return event.document["_id"], writes
+
+            document = event.document
+            escalated = THREAT_ORDER.get(alert["threat_level"], 0) > THREAT_ORDER.get(document["threat_level"], 0)
+            if escalated:
+                document["threat_level"] = alert["threat_level"]
+            document["confidence"] = max(document["confidence"], alert["confidence"])
+            document["speed"] = max(document["speed"], alert["speed"])
+            document["is_running"] = document["is_running"] or alert["is_running"]
+            document["bbox"] = alert["bbox"]  # Dernière position connue
+            document["last_frame"] = alert["frame"]
+            document["last_seen"] = alert["timestamp"]
+            document["detections"] += 1
+            event.last_seen = now
+            if escalated or now - event.last_written >= self.heartbeat_interval:
+                writes.append(self._revision(event, now))
+            return document["_id"], writes
+
+    def sweep(self, source: Any, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Ferme les évènements de `source` sans nouvelle alerte depuis `close_after` ; oublie les refroidis."""
+        now = time.monotonic() if now is None else now
+        writes = []
+        with self._lock:
+            for key in list(self._by_source.get(source, ())):
+                event = self._events[key]
+                if event.closed_at is None:
+                    if now - event.last_seen > self.close_after:
+                        writes.append(self._close(event, now))
+                elif now - event.closed_at > self.cooldown:
+                    self._forget(key)
+        return writes
+
+    def close_source(self, source: Any) -> List[Dict[str, Any]]:
+        """Fin d'une analyse : ferme et oublie tous les évènements de `source`."""
+        writes = []
+        with self._lock:
+            for key in list(self._by_source.get(source, ())):
+                event = self._events[key]
+                if event.closed_at is None:
+                    writes.append(self._close(event, event.last_seen))
+                self._forget(key)
+        return writes
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            open_events = sum(event.closed_at is None for event in self._events.values())
+            return {"open": open_events, "cooling_down": len(self._events) - open_events, "opened": self.opened,
+                    "reopened": self.reopened, "alerts_observed": self.observed}
+
+    # ------------------------------------------------------------- interne
+    def _open(self, key: Tuple, alert: Dict[str, Any], now: float) -> _Event:
+        document = {
+            "_id": ObjectId(),
+            **alert,
+            "last_seen": alert["timestamp"],
+            "last_frame": alert["frame"],
+            "detections": 1,
+            "status": "open",
+            "duration_s": 0.0,
+            "revision": 0,
+        }
+        event = _Event(document, started_at=now, last_seen=now, last_written=now)
+        self._events[key] = event
+        self._by_source.setdefault(key[0], set()).add(key)
+        self.opened += 1
+        ALERT_EVENTS.labels(threat_level=alert["threat_level"]).inc()
+        return event
+
+    def _revision(self, event: _Event, now: float) -> Dict[str, Any]:
+        document = event.document
+        document["revision"] += 1
+        document["duration_s"] = round(event.last_seen - event.started_at, 3)
+        event.last_written = now
+        return dict(document)  # Copie : le document continue d'évoluer en mémoire
+
+    def _close(self, event: _Event, now: float) -> Dict[str, Any]:
+        event.closed_at = now
+        event.document["status"] = "closed"
+        return self._revision(event, now)
+
+    def _forget(self, key: Tuple):
+        self._events.pop(key, None)
+        keys = self._by_source.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_source[key[0]]
@@ -1,38 +1,66 @@
-from datetime import datetime
-from models.database import alerts_collection  # 📂 Importation de la connexion MongoDB
+import os
+import time
+from datetime import datetime, timezone
+from models.alertEvents import AlertEventAggregator
+from models.alertWriter import alert_writer  # 📦 Écriture groupée et asynchrone dans MongoDB
+from models.threatRules import THREAT_RULES
+from utils.metrics import ALERTS, ALERT_SUBMIT_SECONDS
 
-def save_alert(object_type, confidence, bbox, speed, is_running, frame, video_path):
-    """📌 Enregistre une alerte dans MongoDB"""
-    if alerts_collection is None:
-        print("⚠️ Alerte non enregistrée (MongoDB non connecté)")
-        return None
-    
+# 🧾 Un document par évènement (objet suivi) plutôt qu'un par détection ; ALERT_EVENTS=0 : une alerte par détection
+ALERT_EVENTS_ENABLED = os.getenv("ALERT_EVENTS", "1") == "1"
+alert_events = AlertEventAggregator(close_after=float(os.getenv("ALERT_EVENT_CLOSE_AFTER_S", 2.0)),
+                                    heartbeat_interval=float(os.getenv("ALERT_EVENT_HEARTBEAT_S", 10.0)),
+                                    cooldown=float(os.getenv("ALERT_EVENT_COOLDOWN_S", 30.0)))
+
+def save_alert(object_type, confidence, bbox, speed, is_running, frame, video_path, track_id=None, zone_id=None,
+               event_time=None, threat_level=None):
+    """
+    📌 Enregistre une alerte dans MongoDB
+    - L'alerte est confiée à `alert_writer` (insert_many groupés, spool local si MongoDB est indisponible) :
+      l'appel ne fait aucun aller-retour réseau.
+    - Mode évènements (par défaut) : l'alerte met à jour l'évènement de son objet (`alert_events`), seules
+      l'ouverture, les mises à jour périodiques et la fermeture sont écrites ; `event_id` est ajouté à l'alerte.
+      `event_time` : instant de la détection en secondes (temps de la vidéo, ou horloge monotone en direct).
+    - `threat_level` : niveau déjà calculé pour toute la frame (`THREAT_RULES.levels`) ; sinon `get_threat_level`.
+    """
+    start = time.perf_counter()
     alert = {
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "timestamp": datetime.now(timezone.utc),  # Date BSON : tri et filtres par période indexés
         "object_type": object_type,
         "confidence": round(confidence, 2),  
         "bbox": bbox,
         "speed": round(speed, 2),  
         "is_running": bool(is_running),  
-        "threat_level": get_threat_level(object_type, speed, is_running),
+        "threat_level": threat_level or get_threat_level(object_type, speed, is_running),
         "frame": frame,
-        "video_path": video_path  # 🔥 Ajout du chemin de la vidéo analysée
+        "video_path": video_path,  # 🔥 Ajout du chemin de la vidéo analysée
+        "track_id": track_id,  # Identifiant de l'objet suivi dans la vidéo
+        "zone_id": zone_id  # Zone de détection concernée (None si l'analyse n'a pas de zones)
     }
 
-    try:
-        alerts_collection.insert_one(alert)  # Enregistrement dans MongoDB
-        print(f"🚨 ALERTE ENREGISTRÉE: {alert}")
-        return alert
-    except Exception as e:
-        print(f"❌ ERREUR MongoDB: {e}")
-        return None
+    if ALERT_EVENTS_ENABLED:
+        event_id, writes = alert_events.observe(alert, event_time)
+        for document in writes:
+            alert_writer.submit(document)
+        alert["event_id"] = str(event_id)
+    else:
+        alert_writer.submit(alert)
+    ALERTS.labels(threat_level=alert["threat_level"]).inc()
+    ALERT_SUBMIT_SECONDS.observe(time.perf_counter() - start)
+    return alert
+
+def end_alert_frame(video_path, event_time=None):
+    """Fin d'une frame de `video_path` : ferme les évènements dont l'objet n'est plus vu."""
+    if ALERT_EVENTS_ENABLED:
+        for document in alert_events.sweep(video_path, event_time):
+            alert_writer.submit(document)
+
+def close_alert_events(video_path):
+    """Fin d'une analyse (ou arrêt d'une caméra) : ferme tous les évènements de `video_path`."""
+    if ALERT_EVENTS_ENABLED:
+        for document in alert_events.close_source(video_path):
+            alert_writer.submit(document)
 
 def get_threat_level(object_type, speed, is_running):
-    """⚠️ Détermine le niveau de menace"""
-    if object_type in ["Couteau", "Pistolet"]:
-        return "ÉLEVÉ"
-    if object_type in ["Voiture", "Moto", "Camion"] and speed > 5.0:
-        return "MOYEN"
-    if is_running:
-        return "FAIBLE"
-    return "AUCUNE"
+    """⚠️ Détermine le niveau de menace (règles de la table `THREAT_RULES`, voir models.threatRules)"""
+    return THREAT_RULES.threat_level(object_type, speed, is_running)
@@ -0,0 +1,158 @@
+import base64
+import binascii
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DESCENDING
+
+from models.database import get_alerts_collection
+
+# 📄 Pagination par curseur (keyset) des alertes.
+# Les pages sont triées par (timestamp, _id) décroissants ; le curseur encode la clé de la dernière
+# alerte renvoyée et la page suivante reprend juste après elle grâce aux index de `ALERT_INDEXES`.
+# Le coût d'une page ne dépend donc pas de sa position, contrairement à skip().
+
+MAX_PAGE_SIZE = 500
+ALERT_FIELDS = ("timestamp", "object_type", "confidence", "bbox", "speed", "is_running", "threat_level",
+                "frame", "video_path", "track_id", "zone_id")
+# Champs volumineux omis par défaut (`fields=all` pour tout recevoir)
+DEFAULT_EXCLUDED_FIELDS = ("bbox", "frame")
+SORT = [("timestamp", DESCENDING), ("_id", DESCENDING)]
+LEGACY_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class InvalidQueryError(ValueError):
+    """Paramètre de requête invalide (curseur, date, champ inconnu)."""
+
+
+class MigrationRequiredError(Exception):
+    """
+    Pagination refusée : d'anciennes alertes ont un timestamp texte, que le curseur (comparaison de dates)
+    ne peut pas atteindre. Lancer la conversion avec MIGRATE_ALERT_TIMESTAMPS=1 (voir models.database).
+    """
+
+
+_legacy_timestamps_absent = False  # Devient vrai une fois pour toutes : les nouvelles alertes ont des dates
+
+
+def check_legacy_timestamps():
+    """Lève MigrationRequiredError tant qu'il reste des alertes à timestamp texte (lecture servie par l'index)."""
+    global _legacy_timestamps_absent
+    if _legacy_timestamps_absent:
+        return
+    if get_alerts_collection().find_one({"timestamp": {"$type": "string"}}, {"_id": 1}) is not None:
+        raise MigrationRequiredError("Des alertes ont encore un timestamp texte : pagination indisponible tant "
+                                     "que la migration (MIGRATE_ALERT_TIMESTAMPS=1) n'a pas été exécutée")
+    _legacy_timestamps_absent = True
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Les dates lues dans MongoDB sont naïves (UTC) ; les dates fournies sans fuseau sont supposées UTC."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def parse_datetime(value: str) -> datetime:
+    try:
+        return _as_utc(datetime.fromisoformat(value.replace("Z", "+00:00")))
+    except ValueError:
+        raise InvalidQueryError(f"Date invalide (ISO 8601 attendu) : {value}")
+
+
+def encode_cursor(alert: Dict[str, Any]) -> str:
+    timestamp = alert["timestamp"]
+    if isinstance(timestamp, str):
+        # Alerte antérieure aux dates typées (voir MIGRATE_ALERT_TIMESTAMPS dans models.database)
+        timestamp = datetime.strptime(timestamp, LEGACY_TIMESTAMP_FORMAT)
+    key = {"t": _as_utc(timestamp).isoformat(), "i": str(alert["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return parse_datetime(key["t"]), ObjectId(key["i"])
+    except (binascii.Error, ValueError, KeyError, TypeError, InvalidId):
+        raise InvalidQueryError("Curseur invalide")
+
+
+def build_projection(fields: Optional[str]) -> Optional[Dict[str, int]]:
+    """`None` / "" : tout sauf les champs volumineux ; "all" : tout ; "a,b" : ces champs (+ timestamp)."""
+    if fields == "all":
+        return None
+    if not fields:
+        return {field: 0 for field in DEFAULT_EXCLUDED_FIELDS}
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = sorted(set(requested) - set(ALERT_FIELDS))
+    if unknown:
+        raise InvalidQueryError(f"Champs inconnus : {', '.join(unknown)}")
+    projection = {field: 1 for field in requested}
+    projection["timestamp"] = 1  # Nécessaire au curseur
+    return projection
+
+
+def build_query(object_type: Optional[str] = None, threat_level: Optional[str] = None,
+                since: Optional[datetime] = None, until: Optional[datetime] = None,
+                after: Optional[Tuple[datetime, ObjectId]] = None, zone_id: Optional[str] = None) -> Dict[str, Any]:
+    query: Dict[str, Any] = {}
+    if object_type:
+        query["object_type"] = object_type
+    if threat_level:
+        query["threat_level"] = threat_level
+    if zone_id:
+        query["zone_id"] = zone_id
+    time_range = {}
+    if since is not None:
+        time_range["$gte"] = since
+    if until is not None:
+        time_range["$lt"] = until
+    if time_range:
+        query["timestamp"] = time_range
+    if after is not None:
+        timestamp, alert_id = after
+        # Strictement après la dernière alerte de la page précédente dans l'ordre (timestamp, _id) décroissant
+        query = {"$and": [query, {"$or": [{"timestamp": {"$lt": timestamp}},
+                                          {"timestamp": timestamp, "_id": {"$lt": alert_id}}]}]}
+    return query
+
+
+def serialize_alert(alert: Dict[str, Any]) -> Dict[str, Any]:
+    """Document MongoDB -> JSON : `_id` en chaîne, dates en ISO 8601 (UTC)."""
+    alert["_id"] = str(alert["_id"])
+    if isinstance(alert.get("timestamp"), datetime):
+        alert["timestamp"] = _as_utc(alert["timestamp"]).isoformat()
+    return alert
+
+
+def find_alerts(limit: int = 20, cursor: Optional[str] = None, object_type: Optional[str] = None,
+                threat_level: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+                fields: Optional[str] = None, zone_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    🔎 Une page d'alertes, de la plus récente à la plus ancienne.
+    Retourne les alertes sérialisées et `next_cursor` (None sur la dernière page).
+    Avec `cursor`, lève MigrationRequiredError tant que des alertes ont un timestamp texte.
+    """
+    limit = min(max(int(limit), 1), MAX_PAGE_SIZE)
+    if cursor:
+        check_legacy_timestamps()
+    query = build_query(object_type, threat_level,
+                        parse_datetime(since) if since else None,
+                        parse_datetime(until) if until else None,
+                        decode_cursor(cursor) if cursor else None,
+                        zone_id=zone_id)
+    # Une alerte de plus que demandé : indique s'il reste une page sans compter la collection
+    alerts: List[Dict[str, Any]] = list(get_alerts_collection()
+                                        .find(query, build_projection(fields))
+                                        .sort(SORT)
+                                        .limit(limit + 1))
+    has_more = len(alerts) > limit
+    alerts = alerts[:limit]
+    next_cursor = encode_cursor(alerts[-1]) if has_more else None
+    return {"alerts": [serialize_alert(alert) for alert in alerts], "next_cursor": next_cursor}
+
+
+def recent_alerts(limit: int = 5) -> List[Dict[str, Any]]:
+    """Dernières alertes (sans les champs volumineux), servies par l'index (timestamp, _id)."""
+    return find_alerts(limit=limit)["alerts"]
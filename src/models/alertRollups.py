@@ -0,0 +1,223 @@
+"""
+📊 Agrégats d'alertes pré-calculés (collection "alert_rollups").
+
+Un document par (granularité, début de période, vidéo) :
+    {"granularity": "minute", "bucket": date, "video_path": "...", "count": 12, "running": 3,
+     "threat_level": {"FAIBLE": 3, "AUCUNE": 9}, "object_type": {"Personne": 12}}
+
+Ils sont tenus à jour par `AlertWriter` après chaque écriture réussie (upserts `$inc`, un par
+document touché dans le paquet) : les séries temporelles et classements du tableau de bord se
+lisent dans quelques centaines de documents au lieu de parcourir les alertes brutes.
+Un évènement d'alerte (voir models.alertEvents) est compté une fois, quand son document est créé :
+le writer ne transmet que les documents créés, pas les révisions suivantes ni les doublons rejoués.
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import ReplaceOne, UpdateOne, errors
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from models.database import ROLLUP_INDEXES, get_alerts_collection, get_rollups_collection  # noqa: E402
+from utils.metrics import ROLLUP_WRITE_FAILURES  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1)}
+MAX_BUCKETS = 2000  # Borne la taille d'une réponse de résumé
+REBUILD_BATCH_SIZE = 5000
+STAGING_COLLECTION = "alert_rollups_rebuild"  # Agrégats recalculés, avant leur substitution
+ROLLUP_KEY = ("granularity", "bucket", "video_path")
+ROLLUP_FIELDS = {"timestamp": 1, "video_path": 1, "threat_level": 1, "object_type": 1, "is_running": 1}
+
+_rebuild_lock = threading.Lock()
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    timestamp = _as_utc(timestamp)
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(second=0, microsecond=0)
+
+
+def rollup_updates(alerts: Iterable[Dict[str, Any]]) -> List[UpdateOne]:
+    """Pré-agrège un paquet d'alertes : un seul upsert `$inc` par document d'agrégat touché."""
+    increments: Dict[tuple, Counter] = defaultdict(Counter)
+    for alert in alerts:
+        timestamp = alert.get("timestamp")
+        if not isinstance(timestamp, datetime):
+            continue  # Timestamp texte d'une ancienne alerte (voir MIGRATE_ALERT_TIMESTAMPS)
+        for granularity in GRANULARITIES:
+            counters = increments[(granularity, bucket_start(timestamp, granularity), alert.get("video_path"))]
+            counters["count"] += 1
+            counters[f"threat_level.{alert.get('threat_level')}"] += 1
+            counters[f"object_type.{alert.get('object_type')}"] += 1
+            if alert.get("is_running"):
+                counters["running"] += 1
+
+    return [UpdateOne({"granularity": granularity, "bucket": bucket, "video_path": video_path},
+                      {"$inc": dict(counters)}, upsert=True)
+            for (granularity, bucket, video_path), counters in increments.items()]
+
+
+def update_rollups(alerts: List[Dict[str, Any]]):
+    """Appelé par le writer après l'écriture des alertes brutes ; un échec n'affecte pas ces dernières."""
+    updates = rollup_updates(alerts)
+    if not updates:
+        return
+    try:
+        get_rollups_collection().bulk_write(updates, ordered=False)
+    except errors.PyMongoError as e:
+        # Les alertes brutes sont écrites : `rebuild_rollups` permet de rattraper l'écart
+        ROLLUP_WRITE_FAILURES.inc()
+        logger.error(f"❌ Mise à jour des agrégats impossible ({len(alerts)} alertes): {e}")
+
+
+def rebuild_rollups(since: Optional[datetime] = None, until: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    🔁 Recalcule les agrégats à partir des alertes brutes, sur des heures entières.
+    - `until` est ramené au début de l'heure courante au plus tard : les périodes alimentées en continu
+      par le writer ne sont pas touchées.
+    - Le calcul se fait dans une collection de travail (STAGING_COLLECTION) ; chaque agrégat recalculé
+      remplace ensuite le sien, puis les agrégats de la période absents du recalcul sont supprimés.
+      Un échec pendant le calcul laisse les agrégats existants intacts (jamais de période vidée).
+    - Les alertes d'une période déjà écoulée écrites pendant la reconstruction (rejeu du spool après
+      une panne MongoDB) peuvent être comptées deux fois ou pas du tout : relancer la reconstruction
+      de la période une fois le spool vidé.
+    """
+    if not _rebuild_lock.acquire(blocking=False):
+        raise RuntimeError("Reconstruction des agrégats déjà en cours")
+    try:
+        current_hour = bucket_start(datetime.now(timezone.utc), "hour")
+        until = min(bucket_start(until, "hour"), current_hour) if until else current_hour
+        time_range = {"$lt": until}
+        if since is not None:
+            since = bucket_start(since, "hour")
+            time_range["$gte"] = since
+
+        rollups = get_rollups_collection()
+        staging = rollups.database[STAGING_COLLECTION]
+        staging.drop()  # Reste éventuel d'une reconstruction interrompue
+        staging.create_index(ROLLUP_INDEXES[0][0], unique=True)
+
+        alerts_seen = 0
+        batch = []
+        for alert in get_alerts_collection().find({"timestamp": time_range}, ROLLUP_FIELDS).batch_size(
+                REBUILD_BATCH_SIZE):
+            batch.append(alert)
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                staging.bulk_write(rollup_updates(batch), ordered=False)
+                alerts_seen += len(batch)
+                batch = []
+        if batch:
+            staging.bulk_write(rollup_updates(batch), ordered=False)
+            alerts_seen += len(batch)
+
+        # Substitution : `rebuilt_at` distingue les agrégats recalculés de ceux qui n'ont plus d'alertes
+        rebuilt_at = datetime.now(timezone.utc)
+        replaced = 0
+        replacements = []
+        for rollup in staging.find({}, {"_id": 0}):
+            replacements.append(ReplaceOne({field: rollup.get(field) for field in ROLLUP_KEY},
+                                           {**rollup, "rebuilt_at": rebuilt_at}, upsert=True))
+            if len(replacements) >= REBUILD_BATCH_SIZE:
+                rollups.bulk_write(replacements, ordered=False)
+                replaced += len(replacements)
+                replacements = []
+        if replacements:
+            rollups.bulk_write(replacements, ordered=False)
+            replaced += len(replacements)
+        deleted = rollups.delete_many({"bucket": time_range, "rebuilt_at": {"$ne": rebuilt_at}}).deleted_count
+
+        logger.info(f"🔁 Agrégats reconstruits: {alerts_seen} alertes, {replaced} agrégats écrits, "
+                    f"{deleted} agrégats obsolètes supprimés")
+        return {"alerts": alerts_seen, "rollups": replaced, "deleted_rollups": deleted,
+                "since": since.isoformat() if since else None, "until": until.isoformat()}
+    finally:
+        try:
+            get_rollups_collection().database[STAGING_COLLECTION].drop()
+        except errors.PyMongoError:
+            pass  # Supprimée au début de la prochaine reconstruction
+        _rebuild_lock.release()
+
+
+def is_rebuilding() -> bool:
+    return _rebuild_lock.locked()
+
+
+def _merge(target: Dict[str, int], source: Optional[Dict[str, int]]):
+    for key, value in (source or {}).items():
+        target[key] = target.get(key, 0) + value
+
+
+def _top(counts: Dict[str, int], top: int) -> List[Dict[str, Any]]:
+    ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{"key": key, "count": count} for key, count in ranked]
+
+
+def summarize(granularity: str = "minute", since: Optional[datetime] = None, until: Optional[datetime] = None,
+              video_path: Optional[str] = None, top: int = 10) -> Dict[str, Any]:
+    """
+    📈 Série temporelle et classements sur une période, lus uniquement dans les agrégats.
+    Par défaut : les 60 dernières minutes (`minute`) ou les 24 dernières heures (`hour`).
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularité inconnue : {granularity} (minute ou hour)")
+    step = GRANULARITIES[granularity]
+    until = _as_utc(until) if until else datetime.now(timezone.utc)
+    since = _as_utc(since) if since else until - step * (60 if granularity == "minute" else 24)
+    since = bucket_start(since, granularity)
+    if (until - since) / step > MAX_BUCKETS:
+        raise ValueError(f"Période trop longue : {MAX_BUCKETS} périodes « {granularity} » au maximum")
+
+    query: Dict[str, Any] = {"granularity": granularity, "bucket": {"$gte": since, "$lt": until}}
+    if video_path:
+        query["video_path"] = video_path
+
+    series: Dict[datetime, Dict[str, Any]] = {}
+    totals = {"count": 0, "running": 0, "threat_level": {}, "object_type": {}}
+    per_video: Dict[str, int] = {}
+    for rollup in get_rollups_collection().find(query, {"_id": 0, "granularity": 0}):
+        bucket = series.setdefault(rollup["bucket"], {"count": 0, "running": 0, "threat_level": {}, "object_type": {}})
+        for entry in (bucket, totals):
+            entry["count"] += rollup.get("count", 0)
+            entry["running"] += rollup.get("running", 0)
+            _merge(entry["threat_level"], rollup.get("threat_level"))
+            _merge(entry["object_type"], rollup.get("object_type"))
+        video = rollup.get("video_path") or ""
+        per_video[video] = per_video.get(video, 0) + rollup.get("count", 0)
+
+    return {
+        "granularity": granularity,
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "series": [{"bucket": _as_utc(bucket).isoformat(), **values} for bucket, values in sorted(series.items())],
+        "totals": totals,
+        "top_videos": _top(per_video, top),
+        "top_object_types": _top(totals["object_type"], top),
+        "top_threat_levels": _top(totals["threat_level"], top),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruction des agrégats d'alertes")
+    parser.add_argument("--since", help="Début (ISO 8601), par défaut toutes les alertes")
+    parser.add_argument("--until", help="Fin (ISO 8601), au plus tard le début de l'heure courante")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    print(rebuild_rollups(datetime.fromisoformat(args.since) if args.since else None,
+                          datetime.fromisoformat(args.until) if args.until else None))
+
+
+if __name__ == "__main__":
+    main()
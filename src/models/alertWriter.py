@@ -0,0 +1,275 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+from bson import ObjectId
+from pymongo import ReplaceOne, errors
+
+from models.database import get_alerts_collection, is_connected, mark_unavailable
+from models.alertRollups import update_rollups
+from utils.metrics import ALERTS_SPOOLED, ALERTS_WRITTEN, MONGO_WRITE_FAILURES, MONGO_WRITE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SPOOL_PATH = os.path.join("uploads", "alert_spool.jsonl")
+
+
+DUPLICATE_KEY = 11000
+
+
+def _encode_value(value):
+    """Sérialisation JSON du spool : les dates restent des dates au rejeu (format étendu MongoDB)."""
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}  # Le `_id` est conservé : un rejeu ne peut pas dupliquer une alerte
+    return str(value)
+
+
+def _decode_object(obj):
+    if len(obj) == 1 and "$date" in obj:
+        return datetime.fromisoformat(obj["$date"])
+    if len(obj) == 1 and "$oid" in obj:
+        return ObjectId(obj["$oid"])
+    return obj
+
+
+def _with_ids(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copies des alertes avec un `_id` fixé avant la première tentative (et gardé dans le spool)."""
+    return [alert if "_id" in alert else {**alert, "_id": ObjectId()} for alert in batch]
+
+
+def _latest_revisions(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Dernière révision de chaque évènement du paquet (numéro de révision le plus haut)."""
+    latest: Dict[Any, Dict[str, Any]] = {}
+    for document in documents:
+        current = latest.get(document["_id"])
+        if current is None or document["revision"] >= current["revision"]:
+            latest[document["_id"]] = document
+    return list(latest.values())
+
+
+def _upsert(document: Dict[str, Any]) -> ReplaceOne:
+    """
+    Révision conditionnelle : elle ne remplace que des révisions plus anciennes. Si le document existe
+    déjà dans une révision égale ou plus récente (spool rejoué après la reprise), le filtre ne trouve rien
+    et l'upsert échoue sur la clé `_id` (DUPLICATE_KEY) : la révision est simplement ignorée.
+    """
+    return ReplaceOne({"_id": document["_id"], "revision": {"$lt": document["revision"]}}, document, upsert=True)
+
+
+def _bulk_skipping_duplicates(write: Callable[[], Any]) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Exécute une écriture groupée non ordonnée ; les erreurs de clé en double (document déjà écrit, ou
+    révision plus récente déjà en base) ne sont pas des échecs. Retourne (résultat, détails) :
+    `details["skipped"]` contient les indices ignorés, `details["upserted"]` ceux qui ont créé un document.
+    """
+    try:
+        result = write()
+    except errors.BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in write_errors):
+            raise
+        return None, {"skipped": {error["index"] for error in write_errors},
+                      "upserted": {entry["index"] for entry in e.details.get("upserted", [])}}
+    upserted = getattr(result, "upserted_ids", None) or {}
+    return result, {"skipped": set(), "upserted": set(upserted)}
+
+
+class _FlushRequest:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class AlertWriter:
+    """
+    📦 Écriture groupée des alertes dans MongoDB depuis un thread dédié.
+    - Les alertes sont mises en file (bornée à `max_queue`) sans bloquer la boucle d'inférence.
+    - Le thread écrit avec `insert_many` dès que `batch_size` alertes sont prêtes ou toutes les
+      `flush_interval` secondes. Les révisions d'un évènement (documents avec `revision`, voir
+      `AlertEventAggregator`) ne remplacent qu'une révision plus ancienne du même document.
+    - Si MongoDB est indisponible (ou la file pleine), les alertes sont ajoutées à un spool local
+      (JSON lines) qui est rejoué à la reconnexion, avant le paquet courant. Chaque alerte reçoit son
+      `_id` avant la première tentative : un rejeu n'insère pas deux fois une alerte déjà écrite, et une
+      révision rejouée n'écrase pas une révision plus récente (ex. la fermeture de l'évènement).
+    - `on_written(documents)` est appelé après chaque écriture réussie avec les seuls documents créés
+      (alertes insérées, évènements à leur première écriture) : mise à jour des agrégats.
+    """
+
+    def __init__(self,
+                 collection_getter: Callable[[], Any],
+                 availability_check: Callable[[], bool],
+                 on_failure: Callable[[], None] = lambda: None,
+                 on_written: Callable[[List[Dict[str, Any]]], None] = lambda batch: None,
+                 batch_size: int = 200,
+                 flush_interval: float = 1.0,
+                 max_queue: int = 10000,
+                 spool_path: str = SPOOL_PATH):
+        self.collection_getter = collection_getter
+        self.availability_check = availability_check
+        self.on_failure = on_failure
+        self.on_written = on_written
+        self.batch_size = max(int(batch_size), 1)
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._spool_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+
+        self.written = 0
+        self.spooled = 0
+
+    # ------------------------------------------------------------------ API
+    def submit(self, alert: Dict[str, Any]) -> bool:
+        """Met une alerte en file. Retourne False si elle a dû être envoyée au spool (file pleine)."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(alert)
+            return True
+        except queue.Full:
+            self._spool([alert])
+            return False
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Attend que les alertes déjà soumises soient écrites (ou mises au spool)."""
+        if self._thread is None:
+            return True
+        request = _FlushRequest()
+        try:
+            self._queue.put(request, timeout=timeout)
+        except queue.Full:
+            return False
+        return request.done.wait(timeout)
+
+    def close(self, timeout: float = 10.0):
+        if self._thread is None:
+            return
+        self.flush(timeout)
+        self._stopping = True
+        self._thread.join(timeout)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    # ------------------------------------------------------------- interne
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="alert-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        batch: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while not self._stopping or batch:
+            timeout = max(deadline - time.monotonic(), 0.0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, _FlushRequest):
+                self._write(batch)
+                batch = []
+                item.done.set()
+                continue
+            if item is not None:
+                batch.append(item)
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._write(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+                if self._stopping and self._queue.empty():
+                    break
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        # Le spool (plus ancien) d'abord : les révisions s'y suivent dans l'ordre de soumission
+        if os.path.exists(self.spool_path) and self.availability_check():
+            self._replay_spool()
+        if batch:
+            batch = _with_ids(batch)
+            if not self._insert(batch):
+                self._spool(batch)
+
+    def _insert(self, batch: List[Dict[str, Any]]) -> bool:
+        if not self.availability_check():
+            return False
+        start = time.perf_counter()
+        created: List[Dict[str, Any]] = []
+        try:
+            collection = self.collection_getter()
+            inserts = [alert for alert in batch if "revision" not in alert]
+            if inserts:
+                _, details = _bulk_skipping_duplicates(lambda: collection.insert_many(inserts, ordered=False))
+                created += [alert for index, alert in enumerate(inserts) if index not in details["skipped"]]
+            revisions = _latest_revisions([alert for alert in batch if "revision" in alert])
+            if revisions:
+                _, details = _bulk_skipping_duplicates(
+                    lambda: collection.bulk_write([_upsert(document) for document in revisions], ordered=False))
+                created += [revisions[index] for index in sorted(details["upserted"])]
+            self.written += len(batch)
+            ALERTS_WRITTEN.inc(len(batch))
+        except errors.PyMongoError as e:
+            logger.error(f"❌ ERREUR MongoDB ({len(batch)} alertes mises au spool): {e}")
+            MONGO_WRITE_FAILURES.inc()
+            self.on_failure()
+            return False
+        finally:
+            MONGO_WRITE_SECONDS.observe(time.perf_counter() - start)
+        try:
+            if created:
+                self.on_written(created)
+        except Exception as e:  # Le thread d'écriture ne doit jamais s'arrêter
+            logger.exception(f"❌ Erreur après l'écriture de {len(batch)} alertes: {e}")
+        return True
+
+    def _spool(self, alerts: List[Dict[str, Any]]):
+        with self._spool_lock:
+            os.makedirs(os.path.dirname(self.spool_path) or ".", exist_ok=True)
+            with open(self.spool_path, "a", encoding="utf-8") as spool:
+                for alert in alerts:
+                    spool.write(json.dumps(alert, default=_encode_value) + "\n")
+        self.spooled += len(alerts)
+        ALERTS_SPOOLED.inc(len(alerts))
+
+    def _replay_spool(self):
+        """Rejoue le spool par paquets ; ce qui n'a pas pu être écrit y retourne."""
+        replay_path = self.spool_path + ".replay"
+        with self._spool_lock:
+            # Un fichier .replay restant d'un arrêt brutal est rejoué avant le spool courant
+            if os.path.exists(self.spool_path) and not os.path.exists(replay_path):
+                os.replace(self.spool_path, replay_path)
+        if not os.path.exists(replay_path):
+            return
+
+        with open(replay_path, encoding="utf-8") as spool:
+            alerts = [json.loads(line, object_hook=_decode_object) for line in spool if line.strip()]
+
+        replayed = len(alerts)
+        for start in range(0, len(alerts), self.batch_size):
+            if not self._insert(alerts[start:start + self.batch_size]):
+                self._spool(alerts[start:])
+                replayed = start
+                break
+        os.remove(replay_path)
+        if replayed:
+            logger.info(f"♻️ {replayed} alertes du spool rejouées dans MongoDB")
+
+
+# Writer partagé par toute l'application (le thread ne démarre qu'à la première alerte)
+alert_writer = AlertWriter(get_alerts_collection, is_connected, on_failure=mark_unavailable,
+                           on_written=update_rollups)
+atexit.register(alert_writer.close)
@@ -1,18 +1,144 @@
-from pymongo import MongoClient, errors
+from pymongo import ASCENDING, DESCENDING, MongoClient, errors
 from dotenv import load_dotenv
+import logging
 import os
+import threading
+import time
 
 load_dotenv()  # Charger les variables d'environnement depuis le fichier .env
 
 # 🔗 URI de connexion à MongoDB (⚠️ Modifie selon ton setup)
 MONGO_URI = os.getenv("MONGO_URI")
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", 2000))
+RECHECK_INTERVAL = 30  # Secondes entre deux vérifications de la connexion
+# Anciennes alertes dont le timestamp est une chaîne "%Y-%m-%d %H:%M:%S" (heure locale du serveur)
+MIGRATE_ALERT_TIMESTAMPS = os.getenv("MIGRATE_ALERT_TIMESTAMPS", "0") == "1"
+LEGACY_TIMESTAMP_TIMEZONE = os.getenv("LEGACY_TIMESTAMP_TIMEZONE", "UTC")
 
-try:
-    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)  # Timeout 5 sec
-    db = client["siade"]  # 📂 Base de données "siade"
-    alerts_collection = db["alerts"]  # 📌 Collection "alerts"
-    client.server_info()  # Vérifier la connexion
-    print("✅ Connexion réussie à MongoDB")
-except errors.ServerSelectionTimeoutError:
-    print("❌ ERREUR: Impossible de se connecter à MongoDB. Vérifie ton URI ou connexion réseau.")
-    alerts_collection = None  # Si MongoDB est indisponible
+# 🗂️ Index des alertes : chaque filtre de /alerts suivi du tri (timestamp, _id) décroissant,
+# pour que la pagination par curseur lise exactement une page d'entrées d'index
+ALERT_INDEXES = [
+    [("timestamp", DESCENDING), ("_id", DESCENDING)],
+    [("object_type", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+    [("threat_level", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+    [("zone_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+]
+# 📊 Agrégats d'alertes par minute / heure et par vidéo (voir models.alertRollups)
+ROLLUP_INDEXES = [
+    ([("granularity", ASCENDING), ("bucket", ASCENDING), ("video_path", ASCENDING)], {"unique": True}),
+    ([("granularity", ASCENDING), ("video_path", ASCENDING), ("bucket", ASCENDING)], {}),
+]
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+_indexes_thread = None
+_available = None  # None = connexion pas encore vérifiée
+_last_check = 0.0
+
+
+def get_db():
+    """
+    📂 Base de données "siade". Le client est créé au premier appel, sans se connecter ; ce premier
+    appel lance aussi la création des index en arrière-plan (rien ne se passe à l'import).
+    """
+    global _client, _indexes_thread
+    start_indexes = False
+    with _client_lock:
+        if _client is None:
+            # connect=False : aucune opération réseau avant la première requête
+            _client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=MONGO_TIMEOUT_MS, connect=False)
+            start_indexes = _indexes_thread is None
+    if start_indexes:
+        _indexes_thread = ensure_indexes_async()
+    return _client["siade"]
+
+
+def get_alerts_collection():
+    """📌 Collection "alerts" (la connexion réelle a lieu à la première requête)."""
+    return get_db()["alerts"]
+
+
+def get_rollups_collection():
+    """📊 Collection "alert_rollups" : compteurs d'alertes pré-agrégés."""
+    return get_db()["alert_rollups"]
+
+
+def get_result_cache_collection():
+    """🗃️ Collection "result_cache" : miroir de l'index du cache de résultats."""
+    return get_db()["result_cache"]
+
+
+def is_connected(force=False):
+    """
+    Vérifie que MongoDB répond. Le résultat est mis en cache `RECHECK_INTERVAL` secondes
+    pour ne pas bloquer les appelants à chaque fois que le serveur est indisponible.
+    """
+    global _available, _last_check
+    now = time.monotonic()
+    if not force and _available is not None and now - _last_check < RECHECK_INTERVAL:
+        return _available
+
+    try:
+        get_db().client.admin.command("ping")
+        if _available is not True:
+            print("✅ Connexion réussie à MongoDB")
+        _available = True
+    except errors.PyMongoError:
+        if _available is not False:
+            print("❌ ERREUR: Impossible de se connecter à MongoDB. Vérifie ton URI ou connexion réseau.")
+        _available = False
+    _last_check = now
+    return _available
+
+
+def ensure_indexes():
+    """Crée les index des alertes et de leurs agrégats (sans effet s'ils existent déjà)."""
+    collection = get_alerts_collection()
+    for keys in ALERT_INDEXES:
+        collection.create_index(keys, background=True)
+    rollups = get_rollups_collection()
+    for keys, options in ROLLUP_INDEXES:
+        rollups.create_index(keys, background=True, **options)
+    get_result_cache_collection().create_index([("last_access", ASCENDING)], background=True)
+    if MIGRATE_ALERT_TIMESTAMPS:
+        migrate_legacy_timestamps()
+
+
+def migrate_legacy_timestamps():
+    """Convertit côté serveur les timestamps stockés en chaîne en vraies dates (MongoDB >= 4.2)."""
+    result = get_alerts_collection().update_many(
+        {"timestamp": {"$type": "string"}},
+        [{"$set": {"timestamp": {"$dateFromString": {"dateString": "$timestamp", "format": "%Y-%m-%d %H:%M:%S",
+                                                    "timezone": LEGACY_TIMESTAMP_TIMEZONE}}}}])
+    if result.modified_count:
+        logger.info(f"🕒 {result.modified_count} timestamps d'alertes convertis en dates")
+
+
+def ensure_indexes_async():
+    """
+    Lance la création des index dans un thread : le démarrage de l'API n'attend pas MongoDB.
+    Si le serveur est indisponible, nouvelle tentative toutes les `RECHECK_INTERVAL` secondes.
+    """
+    def build():
+        while True:
+            if is_connected():
+                try:
+                    ensure_indexes()
+                    logger.info("🗂️ Index des alertes prêts")
+                    return
+                except errors.PyMongoError as e:
+                    logger.error(f"❌ Création des index impossible: {e}")
+            time.sleep(RECHECK_INTERVAL)
+
+    thread = threading.Thread(target=build, name="mongo-indexes", daemon=True)
+    thread.start()
+    return thread
+
+
+def mark_unavailable():
+    """Signale un échec d'écriture : la prochaine vérification sera différée."""
+    global _available, _last_check
+    _available = False
+    _last_check = time.monotonic()
@@ -0,0 +1,133 @@
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# 🗄️ Détections d'une analyse vidéo en colonnes NumPy, enregistrées dans un fichier .npz compressé.
+# Une ligne par détection signalée ; les lignes sont dans l'ordre des frames, ce qui permet de retrouver
+# les détections d'un intervalle par recherche dichotomique (rendu de clips, extraits autour d'une alerte).
+
+COLUMNS = {
+    "frame": np.int32,
+    "time": np.float64,
+    "bbox": np.int32,  # (N, 4) : x1, y1, x2, y2
+    "confidence": np.float32,
+    "class_id": np.int16,
+    "speed": np.float32,
+    "is_running": np.bool_,
+    "track_id": np.int64,
+    "zone": np.int16,  # Indice dans metadata["zone_ids"], -1 hors zone
+}
+NO_ZONE = -1
+
+
+def _empty_column(name: str) -> np.ndarray:
+    return np.empty((0, 4) if name == "bbox" else (0,), dtype=COLUMNS[name])
+
+
+class DetectionStore:
+    """
+    Colonnes de détections d'une vidéo et métadonnées de l'analyse (fps, taille, classes, zones).
+    - Écriture : `append` une fois par frame (tableaux de la frame), `save` en fin d'analyse.
+    - Lecture : `load`, puis `frame_range` / `records` ; `concatenate` fusionne des segments.
+    """
+
+    def __init__(self, metadata: Optional[Dict[str, Any]] = None,
+                 columns: Optional[Dict[str, np.ndarray]] = None):
+        self.metadata = dict(metadata or {})
+        self.metadata.setdefault("zone_ids", [])
+        self._zone_index = {zone_id: index for index, zone_id in enumerate(self.metadata["zone_ids"])}
+        self._chunks: Dict[str, List[np.ndarray]] = {name: [] for name in COLUMNS}
+        self._columns: Optional[Dict[str, np.ndarray]] = None
+        if columns is not None:
+            for name in COLUMNS:
+                self._chunks[name].append(np.asarray(columns[name], dtype=COLUMNS[name]))
+
+    def append(self, frame_number: int, time_s: float, bboxes: np.ndarray, confidences: np.ndarray,
+               class_ids: np.ndarray, speeds: np.ndarray, running: np.ndarray, track_ids: np.ndarray,
+               zone_ids: Sequence[Optional[str]]):
+        """Détections d'une frame (tableaux de même longueur, boîtes (N, 4))."""
+        count = len(bboxes)
+        if not count:
+            return
+        chunk = {
+            "frame": np.full(count, frame_number),
+            "time": np.full(count, time_s),
+            "bbox": bboxes,
+            "confidence": confidences,
+            "class_id": class_ids,
+            "speed": speeds,
+            "is_running": running,
+            "track_id": track_ids,
+            "zone": [self._zone_index.get(zone_id, NO_ZONE) for zone_id in zone_ids],
+        }
+        for name, values in chunk.items():
+            self._chunks[name].append(np.asarray(values, dtype=COLUMNS[name]))
+        self._columns = None
+
+    @property
+    def columns(self) -> Dict[str, np.ndarray]:
+        if self._columns is None:
+            self._columns = {name: np.concatenate(chunks) if chunks else _empty_column(name)
+                             for name, chunks in self._chunks.items()}
+            self._chunks = {name: [column] for name, column in self._columns.items()}
+        return self._columns
+
+    def __len__(self) -> int:
+        return len(self.columns["frame"])
+
+    # ------------------------------------------------------------ fichiers
+    def save(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temporary = path + ".tmp.npz"
+        np.savez_compressed(temporary, metadata=np.array(json.dumps(self.metadata, default=str)), **self.columns)
+        os.replace(temporary, path)  # Jamais de fichier à moitié écrit
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "DetectionStore":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(json.loads(str(data["metadata"])), {name: data[name] for name in COLUMNS})
+
+    @classmethod
+    def concatenate(cls, stores: Sequence["DetectionStore"]) -> "DetectionStore":
+        """Fusion de segments consécutifs (métadonnées du premier, indices de zone réalignés)."""
+        merged = cls(stores[0].metadata if stores else None)
+        for store in stores:
+            columns = dict(store.columns)
+            if store.metadata["zone_ids"] != merged.metadata["zone_ids"]:
+                mapping = np.array([merged._zone_index.get(zone_id, NO_ZONE)
+                                    for zone_id in store.metadata["zone_ids"]] + [NO_ZONE], dtype=np.int16)
+                columns["zone"] = mapping[columns["zone"]]  # -1 -> dernier élément : NO_ZONE
+            for name in COLUMNS:
+                merged._chunks[name].append(columns[name])
+        return merged
+
+    # ------------------------------------------------------------- lecture
+    def frame_range(self, first_frame: int, last_frame: Optional[int] = None) -> slice:
+        """Lignes des frames `first_frame` à `last_frame` incluses."""
+        frames = self.columns["frame"]
+        start = int(np.searchsorted(frames, first_frame, side="left"))
+        stop = len(frames) if last_frame is None else int(np.searchsorted(frames, last_frame, side="right"))
+        return slice(start, stop)
+
+    def records(self, rows: slice = slice(None)) -> List[Dict[str, Any]]:
+        """Détections sous forme de dictionnaires (format `Detection` des rapports)."""
+        columns = {name: column[rows] for name, column in self.columns.items()}
+        classes = {int(class_id): name for class_id, name in self.metadata.get("classes", {}).items()}
+        zone_ids = self.metadata["zone_ids"]
+        return [
+            {"frame": frame, "time": time_s, "bbox": bbox, "confidence": confidence, "is_running": is_running,
+             "speed": speed, "object_type": classes.get(class_id, str(class_id)), "track_id": track_id,
+             "zone_id": zone_ids[zone] if zone != NO_ZONE else None}
+            for frame, time_s, bbox, confidence, class_id, speed, is_running, track_id, zone in zip(
+                columns["frame"].tolist(), columns["time"].tolist(), columns["bbox"].tolist(),
+                columns["confidence"].tolist(), columns["class_id"].tolist(), columns["speed"].tolist(),
+                columns["is_running"].tolist(), columns["track_id"].tolist(), columns["zone"].tolist())
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        columns = self.columns
+        return {"detections": len(self), "frames_with_detections": int(len(np.unique(columns["frame"]))),
+                "tracks": int(len(np.unique(columns["track_id"])))}
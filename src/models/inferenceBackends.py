@@ -0,0 +1,223 @@
+import abc
+import math
+import os
+import shutil
+import threading
+from typing import List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+# ⚙️ Moteurs d'inférence CPU : le modèle YOLO est exporté une fois (ONNX, ONNX INT8 ou OpenVINO), mis en
+# cache sur disque, puis exécuté sans PyTorch. Pré- et post-traitement reproduisent ceux d'ultralytics
+# (letterbox 114 rectangulaire pour un lot d'images de même forme, NMS par classe, remise à l'échelle) :
+# la sortie est le même tableau (N, 6) par image.
+
+BACKENDS = ("torch", "onnx", "onnx-int8", "openvino")
+DEFAULT_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+STRIDE = 32
+MAX_WH = 7680  # Décalage par classe des boîtes pour une NMS par classe en un seul appel (comme ultralytics)
+MAX_NMS = 30000  # Candidats gardés avant la NMS
+# Valeurs par défaut du prédicteur ultralytics
+DEFAULT_IMGSZ, DEFAULT_CONF, DEFAULT_IOU, DEFAULT_MAX_DET = 640, 0.25, 0.7, 300
+
+_export_lock = threading.Lock()
+
+
+def resolve_backend(backend: Optional[str] = None) -> str:
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Moteur d'inférence inconnu : {backend} (attendu : {', '.join(BACKENDS)})")
+    return backend
+
+
+def default_threads() -> Optional[int]:
+    """Threads d'inférence (INFERENCE_THREADS) ; None : choix du moteur (tous les cœurs)."""
+    return int(os.getenv("INFERENCE_THREADS", 0)) or None
+
+
+# ------------------------------------------------------------------ export
+def _artifact_path(weights_path: str, backend: str, export_dir: str) -> str:
+    stem = os.path.splitext(os.path.basename(weights_path))[0]
+    if backend == "onnx":
+        return os.path.join(export_dir, f"{stem}.onnx")
+    if backend == "onnx-int8":
+        return os.path.join(export_dir, f"{stem}-int8.onnx")
+    return os.path.join(export_dir, f"{stem}_openvino_model", f"{stem}.xml")
+
+
+def _is_fresh(artifact: str, weights_path: str) -> bool:
+    return os.path.exists(artifact) and os.path.getmtime(artifact) >= os.path.getmtime(weights_path)
+
+
+def export_model(weights_path: str, backend: str, export_dir: str) -> str:
+    """
+    📤 Exporte les poids PyTorch vers `backend` et retourne le chemin de l'artefact.
+    L'export n'a lieu qu'une fois : l'artefact est réutilisé tant qu'il est plus récent que les poids.
+    Les entrées sont dynamiques (taille de paquet et d'image), comme avec le modèle PyTorch.
+    """
+    artifact = _artifact_path(weights_path, backend, export_dir)
+    with _export_lock:
+        if _is_fresh(artifact, weights_path):
+            return artifact
+        os.makedirs(export_dir, exist_ok=True)
+        if backend == "onnx-int8":
+            # Quantification dynamique des poids (sans jeu de calibration) depuis l'export ONNX float32
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            source = _artifact_path(weights_path, "onnx", export_dir)
+            if not _is_fresh(source, weights_path):
+                _export_with_ultralytics(weights_path, "onnx", source)
+            quantize_dynamic(source, artifact, weight_type=QuantType.QUInt8)
+        else:
+            _export_with_ultralytics(weights_path, backend, artifact)
+        print(f"✅ Modèle exporté ({backend}) : {artifact}")
+    return artifact
+
+
+def _export_with_ultralytics(weights_path: str, backend: str, artifact: str):
+    from ultralytics import YOLO
+
+    exported = YOLO(weights_path).export(format=backend, dynamic=True, imgsz=DEFAULT_IMGSZ, device="cpu")
+    # ultralytics écrit à côté des poids : déplacer vers le dossier d'export
+    destination = artifact if backend == "onnx" else os.path.dirname(artifact)
+    if os.path.abspath(str(exported)) != os.path.abspath(destination):
+        if os.path.isdir(destination):
+            shutil.rmtree(destination)
+        shutil.move(str(exported), destination)
+
+
+# ------------------------------------------------------------- exécution
+def letterbox(image: np.ndarray, size: int, auto: bool = False) -> np.ndarray:
+    """
+    Redimensionne en gardant les proportions puis complète à `size` x `size` (gris 114, centré).
+    `auto` : complète seulement jusqu'au multiple de STRIDE suivant (rectangle minimal, comme `LetterBox(auto=True)`
+    d'ultralytics pour un lot d'images de même forme).
+    """
+    height, width = image.shape[:2]
+    ratio = min(size / height, size / width)
+    new_width, new_height = int(round(width * ratio)), int(round(height * ratio))
+    if (new_width, new_height) != (width, height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    dw, dh = size - new_width, size - new_height
+    if auto:
+        dw, dh = dw % STRIDE, dh % STRIDE
+    dw, dh = dw / 2, dh / 2
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    return cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+
+def _scale_boxes(boxes: np.ndarray, input_shape, shape) -> np.ndarray:
+    """Boîtes de l'image letterbox (`input_shape` : hauteur, largeur) vers l'image d'origine."""
+    height, width = shape[:2]
+    input_height, input_width = input_shape[:2]
+    gain = min(input_height / height, input_width / width)
+    pad_x = round((input_width - width * gain) / 2 - 0.1)
+    pad_y = round((input_height - height * gain) / 2 - 0.1)
+    boxes[:, [0, 2]] = np.clip((boxes[:, [0, 2]] - pad_x) / gain, 0, width)
+    boxes[:, [1, 3]] = np.clip((boxes[:, [1, 3]] - pad_y) / gain, 0, height)
+    return boxes
+
+
+def non_max_suppression(prediction: np.ndarray, conf: float, iou: float, classes: Optional[Sequence[int]] = None,
+                        agnostic: bool = False, max_det: int = DEFAULT_MAX_DET) -> np.ndarray:
+    """Sortie brute d'une image (4 + classes, ancres) -> détections (N, 6) x1, y1, x2, y2, confiance, classe."""
+    candidates = prediction.T
+    scores = candidates[:, 4:]
+    class_ids = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(scores)), class_ids]
+    keep = confidences > conf
+    if classes is not None:
+        keep &= np.isin(class_ids, classes)
+    boxes, confidences, class_ids = candidates[keep, :4], confidences[keep], class_ids[keep]
+    if not len(boxes):
+        return np.empty((0, 6), dtype=np.float32)
+    if len(boxes) > MAX_NMS:
+        top = np.argsort(-confidences)[:MAX_NMS]
+        boxes, confidences, class_ids = boxes[top], confidences[top], class_ids[top]
+
+    xyxy = np.empty_like(boxes)  # Centre, largeur, hauteur -> coins
+    xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2
+    xyxy[:, 2:] = boxes[:, :2] + boxes[:, 2:] / 2
+    offsets = 0 if agnostic else class_ids[:, None].astype(np.float32) * MAX_WH
+    shifted = xyxy + offsets
+    rects = np.concatenate([shifted[:, :2], shifted[:, 2:] - shifted[:, :2]], axis=1)
+    kept = np.asarray(cv2.dnn.NMSBoxes(rects.tolist(), confidences.tolist(), conf, iou), dtype=np.int64).reshape(-1)
+    kept = kept[:max_det]  # Indices triés par confiance décroissante
+    return np.concatenate([xyxy[kept], confidences[kept, None], class_ids[kept, None]], axis=1).astype(np.float32)
+
+
+class ExportedModel(abc.ABC):
+    """
+    🧠 Modèle exporté, utilisable à la place du modèle YOLO PyTorch par `run_inference`.
+    Accepte les mêmes options que le prédicteur (`imgsz`, `conf`, `iou`, `classes`, `max_det`,
+    `agnostic_nms`) ; les autres sont ignorées.
+    """
+    backend = ""
+
+    def __init__(self, path: str, threads: Optional[int] = None):
+        self.path = path
+        self.threads = threads
+        self.overrides = {}
+
+    @abc.abstractmethod
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        """(B, 3, H, W) float32 -> sortie brute (B, 4 + classes, ancres)."""
+
+    def predict_arrays(self, frames: Sequence[np.ndarray], imgsz: int = DEFAULT_IMGSZ, conf: float = DEFAULT_CONF,
+                       iou: float = DEFAULT_IOU, classes: Optional[Sequence[int]] = None,
+                       max_det: int = DEFAULT_MAX_DET, agnostic_nms: bool = False, **_) -> List[np.ndarray]:
+        if not len(frames):
+            return []
+        size = max(int(math.ceil(int(imgsz) / STRIDE)) * STRIDE, STRIDE)  # Multiple du pas du réseau
+        auto = len({frame.shape for frame in frames}) == 1  # Sinon entrée carrée commune à tout le lot
+        batch = cv2.dnn.blobFromImages([letterbox(frame, size, auto) for frame in frames], 1 / 255.0, swapRB=True)
+        outputs = self._forward(batch)
+        results = []
+        for frame, prediction in zip(frames, outputs):
+            detections = non_max_suppression(prediction, conf, iou, classes, agnostic_nms, max_det)
+            detections[:, :4] = _scale_boxes(detections[:, :4], batch.shape[2:], frame.shape)
+            results.append(detections)
+        return results
+
+
+class OnnxModel(ExportedModel):
+    backend = "onnx"
+
+    def __init__(self, path: str, threads: Optional[int] = None):
+        super().__init__(path, threads)
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self._input_name: batch})[0]
+
+
+class OpenVinoModel(ExportedModel):
+    backend = "openvino"
+
+    def __init__(self, path: str, threads: Optional[int] = None):
+        super().__init__(path, threads)
+        import openvino
+
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = threads
+        self.compiled = openvino.Core().compile_model(path, "CPU", config)
+        self._output = self.compiled.output(0)
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        return self.compiled(batch)[self._output]
+
+
+def load_exported_model(path: str, backend: str, threads: Optional[int] = None) -> ExportedModel:
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxModel(path, threads)
+    return OpenVinoModel(path, threads)
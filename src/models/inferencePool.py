@@ -0,0 +1,333 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.metrics import QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+# 🏭 Pool de processus d'inférence : chaque worker charge sa propre copie du modèle, avec un nombre de
+# threads fixé, et les appels concurrents (requêtes Flask, jobs vidéo, caméras) se répartissent sur les
+# cœurs au lieu de s'attendre sur le verrou d'un modèle unique.
+# Les frames passent par une mémoire partagée découpée en emplacements (un anneau par worker) : le
+# processus appelant y copie les pixels, le worker les lit sans copie ; seules les détections reviennent,
+# en un seul tableau (N, 6) par lot. Chaque worker a ses propres tubes : un worker tué ne peut pas
+# bloquer une file partagée avec les autres.
+
+SLOTS_PER_WORKER = int(os.getenv("INFERENCE_POOL_SLOTS", 4))  # Lots en vol par worker
+SLOT_BYTES = int(os.getenv("INFERENCE_POOL_SLOT_MB", 32)) * 1024 * 1024  # ~5 frames 1080p par emplacement
+ALIGNMENT = 64  # Alignement de chaque frame dans un emplacement
+WORKER_POLL_S = 1.0  # Intervalle de vérification de l'état des workers
+ACQUIRE_TIMEOUT_S = float(os.getenv("INFERENCE_POOL_TIMEOUT_S", 60))  # Attente max d'un emplacement libre
+
+
+def _aligned(size: int) -> int:
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+# --------------------------------------------------------------- côté worker
+def _worker_main(shm_name: str, slot_bytes: int, requests: Connection, results: Connection,
+                 model_factory: Callable[[], Any], threads: int):
+    """Boucle d'un worker : charge le modèle une fois, puis infère les lots reçus jusqu'au signal d'arrêt."""
+    import cv2
+
+    import models.yoloModel as yolo_model
+
+    yolo_model.INFERENCE_WORKERS = 0  # Le worker exécute son modèle lui-même (pas de pool imbriqué)
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    try:
+        model = model_factory()
+        shm = shared_memory.SharedMemory(name=shm_name)
+    except Exception as e:
+        results.send(("failed", None, f"{type(e).__name__}: {e}"))
+        return
+    results.send(("ready", None, None))
+
+    while True:
+        try:
+            task = requests.recv()
+        except EOFError:
+            break  # Pool fermé sans signal d'arrêt
+        if task is None:
+            break
+        task_id, slot, layout, kwargs = task
+        try:
+            if slot is None:
+                frames = layout  # Frame trop grande pour un emplacement : reçue directement
+            else:
+                base = slot * slot_bytes
+                frames = [np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=base + offset)
+                          for offset, shape, dtype in layout]
+            outputs = yolo_model.run_inference(frames, model=model, **kwargs)
+            counts = [len(detections) for detections in outputs]
+            data = (np.concatenate([np.asarray(detections, dtype=np.float32).reshape(-1, 6) for detections in outputs])
+                    if outputs else np.empty((0, 6), dtype=np.float32))
+            del frames, outputs
+            results.send((task_id, counts, data))
+        except Exception as e:
+            results.send((task_id, None, f"{type(e).__name__}: {e}"))
+    try:
+        shm.close()
+    except BufferError:
+        pass  # Une vue sur la mémoire partagée est encore retenue (ex. dernier lot du prédicteur)
+
+
+# ---------------------------------------------------------- côté appelant
+@dataclass
+class _Worker:
+    index: int
+    shm: shared_memory.SharedMemory
+    process: Optional[multiprocessing.Process] = None
+    requests: Optional[Connection] = None  # Lots vers le worker (écriture sous `send_lock`)
+    results: Optional[Connection] = None  # Détections du worker (lues par le thread de réception)
+    send_lock: threading.Lock = field(default_factory=threading.Lock)
+    ready: bool = False
+    free_slots: Deque[int] = field(default_factory=deque)
+
+
+@dataclass
+class _Task:
+    future: Future
+    worker: int
+    slot: Optional[int]
+
+
+class InferencePool:
+    """
+    Workers d'inférence (processus « spawn »), utilisables à la place d'un modèle par `run_inference`.
+    - `model_factory` : appelable sans argument (picklable) qui charge le modèle dans le worker.
+    - `threads` : threads de calcul de chaque worker (par défaut : les cœurs répartis entre workers).
+    - Un lot trop gros pour un emplacement est découpé ; ses morceaux partent sur des workers différents.
+    - Un worker arrêté (crash, OOM) est relancé ; les lots qu'il traitait échouent (RuntimeError).
+    - Sans emplacement libre pendant `acquire_timeout` secondes (workers bloqués ou en relance), l'envoi
+      d'un lot lève TimeoutError au lieu d'attendre indéfiniment.
+    """
+
+    def __init__(self, model_factory: Callable[[], Any], workers: int, threads: Optional[int] = None,
+                 slots: int = SLOTS_PER_WORKER, slot_bytes: int = SLOT_BYTES, name: str = "inference",
+                 acquire_timeout: float = ACQUIRE_TIMEOUT_S):
+        self.model_factory = model_factory
+        self.acquire_timeout = acquire_timeout
+        self.threads = threads or max((os.cpu_count() or 1) // max(workers, 1), 1)
+        self.slots = max(int(slots), 1)
+        self.slot_bytes = _aligned(int(slot_bytes))
+        self.name = name
+        self._context = multiprocessing.get_context("spawn")  # Un fork après le chargement de torch peut bloquer
+        self._condition = threading.Condition()
+        self._tasks: Dict[int, _Task] = {}
+        self._next_task_id = 0
+        self._closed = False
+        self._collector: Optional[threading.Thread] = None
+        self._workers = [_Worker(index, shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes),
+                                 free_slots=deque(range(self.slots)))
+                         for index in range(max(int(workers), 1))]
+        for worker in self._workers:
+            self._start_worker(worker)
+        self._wait_ready()
+        self._collector = threading.Thread(target=self._collect, name=f"{name}-pool", daemon=True)
+        self._collector.start()
+        QUEUE_DEPTH.labels(queue=f"{name}_pool").set_function(self.pending)
+        logger.info(f"🏭 Pool d'inférence « {name} » : {len(self._workers)} workers, {self.threads} threads chacun")
+
+    # ------------------------------------------------------------ workers
+    def _start_worker(self, worker: _Worker):
+        """Démarre (ou relance) le processus d'un worker, avec des tubes neufs."""
+        requests_reader, requests_writer = self._context.Pipe(duplex=False)
+        results_reader, results_writer = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_worker_main, name=f"{self.name}-worker-{worker.index}", daemon=True,
+            args=(worker.shm.name, self.slot_bytes, requests_reader, results_writer,
+                  self.model_factory, self.threads))
+        process.start()
+        requests_reader.close()  # Côtés du worker : fermés ici pour voir EOF s'il s'arrête
+        results_writer.close()
+        with worker.send_lock:
+            for connection in (worker.requests, worker.results):
+                if connection is not None:
+                    connection.close()
+            worker.process, worker.requests, worker.results = process, requests_writer, results_reader
+        worker.ready = False
+
+    def _wait_ready(self):
+        """Attend le chargement du modèle dans chaque worker ; lève RuntimeError si l'un d'eux échoue."""
+        waiting = {worker.results: worker for worker in self._workers}
+        while waiting:
+            for connection in wait(list(waiting), timeout=WORKER_POLL_S):
+                worker = waiting.pop(connection)
+                try:
+                    kind, _, error = connection.recv()
+                except (EOFError, OSError):
+                    kind, error = "failed", f"processus arrêté (code {worker.process.exitcode})"
+                if kind == "failed":
+                    self.close()
+                    raise RuntimeError(f"Chargement du modèle impossible dans le worker {worker.index} : {error}")
+                worker.ready = True
+
+    def _restart(self, worker: _Worker):
+        """Relance un worker arrêté : ses lots en cours échouent et leurs emplacements sont rendus."""
+        with self._condition:
+            if self._closed:
+                return
+            if worker.process.is_alive():
+                worker.process.kill()  # Tube fermé mais processus encore là : état inconnu
+            worker.process.join()
+            logger.error(f"💥 Worker d'inférence {worker.index} arrêté (code {worker.process.exitcode}), relance")
+            lost = [task_id for task_id, task in self._tasks.items() if task.worker == worker.index]
+            for task_id in lost:
+                task = self._tasks.pop(task_id)
+                if task.slot is not None:
+                    worker.free_slots.append(task.slot)
+                task.future.set_exception(RuntimeError(f"Worker d'inférence {worker.index} arrêté pendant l'inférence"))
+            self._start_worker(worker)
+
+    def _collect(self):
+        """Thread de réception : libère les emplacements et résout les futures des lots terminés."""
+        last_check = time.monotonic()
+        while not self._closed:
+            connections = {worker.results: worker for worker in self._workers}
+            for connection in wait(list(connections), timeout=WORKER_POLL_S):
+                worker = connections[connection]
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    self._restart(worker)
+                    continue
+                self._handle(worker, message)
+            if time.monotonic() - last_check >= WORKER_POLL_S:
+                last_check = time.monotonic()
+                for worker in self._workers:
+                    if not worker.process.is_alive():
+                        self._restart(worker)
+
+    def _handle(self, worker: _Worker, message: Tuple[Any, Any, Any]):
+        task_id, counts, data = message
+        if task_id in ("ready", "failed"):
+            with self._condition:
+                worker.ready = task_id == "ready"
+                self._condition.notify_all()
+            if task_id == "failed":
+                logger.error(f"❌ Relance du worker d'inférence {worker.index} impossible : {data}")
+            return
+        with self._condition:
+            task = self._tasks.pop(task_id, None)
+            if task is not None and task.slot is not None:
+                worker.free_slots.append(task.slot)
+            self._condition.notify_all()
+        if task is None:
+            return  # Lot déjà déclaré en échec
+        if counts is None:
+            task.future.set_exception(RuntimeError(f"Erreur d'inférence dans le worker {worker.index} : {data}"))
+        else:
+            task.future.set_result(np.split(data, np.cumsum(counts)[:-1]) if counts else [])
+
+    # ------------------------------------------------------------- appels
+    def pending(self) -> int:
+        """Lots envoyés aux workers et pas encore terminés."""
+        return len(self._tasks)
+
+    def _acquire(self, size: int) -> Tuple[_Worker, Optional[int]]:
+        """Worker le moins chargé et un de ses emplacements libres (attend au plus `acquire_timeout` secondes)."""
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Pool d'inférence fermé")
+                candidates = [worker for worker in self._workers if worker.ready and worker.free_slots]
+                if candidates:
+                    worker = max(candidates, key=lambda candidate: len(candidate.free_slots))
+                    # Frame plus grande qu'un emplacement : envoyée directement dans le tube du worker
+                    return worker, worker.free_slots.popleft() if size <= self.slot_bytes else None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Pool d'inférence « {self.name} » : aucun emplacement libre "
+                                       f"après {self.acquire_timeout:g}s ({self.pending()} lots en cours)")
+                self._condition.wait(min(WORKER_POLL_S, remaining))
+
+    def submit(self, frames: Sequence[np.ndarray], **kwargs) -> Future:
+        """Envoie un lot tenant dans un emplacement ; la future donne un tableau (N, 6) par frame."""
+        frames = [np.asarray(frame) for frame in frames]
+        worker, slot = self._acquire(sum(_aligned(frame.nbytes) for frame in frames))
+        if slot is None:
+            layout: Any = frames
+        else:
+            base, offset, layout = slot * self.slot_bytes, 0, []
+            for frame in frames:
+                view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=worker.shm.buf, offset=base + offset)
+                np.copyto(view, frame)
+                layout.append((offset, frame.shape, frame.dtype.str))
+                offset += _aligned(frame.nbytes)
+        future: Future = Future()
+        with self._condition:
+            task_id = self._next_task_id
+            self._next_task_id += 1
+            self._tasks[task_id] = _Task(future, worker.index, slot)
+        try:
+            with worker.send_lock:
+                worker.requests.send((task_id, slot, layout, kwargs))
+        except OSError as e:
+            # Worker arrêté entre-temps : le thread de réception le relance et rend l'emplacement
+            raise RuntimeError(f"Worker d'inférence {worker.index} indisponible") from e
+        return future
+
+    def _chunks(self, frames: Sequence[np.ndarray]) -> List[List[np.ndarray]]:
+        """Découpe un lot en morceaux qui tiennent chacun dans un emplacement."""
+        chunks, chunk, size = [], [], 0
+        for frame in frames:
+            frame_size = _aligned(np.asarray(frame).nbytes)
+            if chunk and size + frame_size > self.slot_bytes:
+                chunks.append(chunk)
+                chunk, size = [], 0
+            chunk.append(frame)
+            size += frame_size
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def predict(self, frames: Sequence[np.ndarray], **kwargs) -> List[np.ndarray]:
+        """Équivalent de `run_inference` : un tableau (N, 6) par frame, dans l'ordre."""
+        futures = [self.submit(chunk, **kwargs) for chunk in self._chunks(frames)]
+        return [detections for future in futures for detections in future.result()]
+
+    def close(self, timeout: float = 10.0):
+        """Arrête les workers et libère la mémoire partagée."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        for worker in self._workers:
+            try:
+                with worker.send_lock:
+                    worker.requests.send(None)
+            except OSError:
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        if self._collector is not None:
+            self._collector.join()
+        with self._condition:
+            tasks, self._tasks = list(self._tasks.values()), {}
+        for task in tasks:
+            task.future.set_exception(RuntimeError("Pool d'inférence fermé"))
+        for worker in self._workers:
+            worker.requests.close()
+            worker.results.close()
+            worker.shm.close()
+            worker.shm.unlink()
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+from pymongo import errors
+
+from models.database import get_result_cache_collection, is_connected
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join("uploads", "cache")
+CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_MB", 2048)) * 1024 * 1024
+CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 5000))
+CACHE_FORMAT_VERSION = 2  # À incrémenter si le format des rapports change
+# Champs propres à une requête, jamais mis en cache
+REQUEST_FIELDS = ("file_path", "recent_alerts", "profile_path", "job_id", "cached")
+
+
+def cache_key(content_hash: str, kind: str, config: Dict[str, Any]) -> str:
+    """Clé d'un résultat : empreinte du contenu + type d'analyse + modèle et réglages qui influent sur le rapport."""
+    fingerprint = json.dumps({"version": CACHE_FORMAT_VERSION, "config": config}, sort_keys=True, default=str)
+    return f"{kind}_{hashlib.sha256((content_hash + fingerprint).encode()).hexdigest()[:40]}"
+
+
+def _directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def _link_or_copy(source: str, destination: str):
+    try:
+        os.link(source, destination)  # Pas de copie sur le même volume
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+class ResultCache:
+    """
+    🗃️ Cache des rapports d'analyse et de leurs sorties annotées, indexé par empreinte du contenu.
+    - Sur disque : un dossier par clé (`report.json` + fichiers annotés), éviction LRU au-delà de
+      `max_bytes` ou de `max_entries`.
+    - Dans MongoDB (collection "result_cache") : miroir des métadonnées (taille, dernier accès), borné
+      en octets et en entrées et évincé de la même façon ; il permet à plusieurs instances partageant
+      le volume de se retrouver.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES,
+                 max_entries: int = CACHE_MAX_ENTRIES,
+                 collection_getter: Callable[[], Any] = get_result_cache_collection,
+                 availability_check: Callable[[], bool] = is_connected):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max(int(max_entries), 1)
+        self.collection_getter = collection_getter
+        self.availability_check = availability_check
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # clé -> taille, du moins au plus récent
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()  # Publication des entrées (renommage du dossier complet)
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        """Reconstitue l'index LRU depuis le disque (ordre : date de dernier accès)."""
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for key in os.listdir(self.directory):
+            report_path = os.path.join(self.directory, key, "report.json")
+            if ".tmp" not in key and os.path.exists(report_path):
+                entries.append((os.path.getmtime(report_path), key, _directory_size(os.path.join(self.directory, key))))
+            else:
+                shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)  # Écriture interrompue
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    # ------------------------------------------------------------------ API
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            known = key in self._entries
+        if not known and not self._known_in_mirror(key):
+            self._count(hit=False)
+            return None
+
+        report = self._read_report(key)
+        if report is None:
+            self._forget(key)
+            self._count(hit=False)
+            return None
+
+        os.utime(os.path.join(self.directory, key, "report.json"))  # Dernier accès, conservé entre deux démarrages
+        with self._lock:
+            if key not in self._entries:
+                size = _directory_size(os.path.join(self.directory, key))
+                self._entries[key] = size
+                self._total_bytes += size
+            self._entries.move_to_end(key)
+            self.hits += 1
+        self._mirror_touch(key)
+        report.pop("_artifacts", None)
+        return report
+
+    def put(self, key: str, report: Dict[str, Any], artifacts: Dict[str, Optional[str]]) -> Dict[str, Any]:
+        """
+        Met en cache `report` et ses fichiers `artifacts` (champ du rapport -> chemin).
+        Les chemins du rapport sont réécrits vers les copies du cache, qui survivent aux sorties d'origine.
+        Si une entrée valide existe déjà pour `key` (même contenu analysé en parallèle, ou par une autre
+        instance), elle est conservée et c'est son rapport qui est retourné.
+        """
+        entry_dir = os.path.join(self.directory, key)
+        staging_dir = entry_dir + f".tmp{os.getpid()}_{threading.get_ident()}"
+        os.makedirs(staging_dir, exist_ok=True)
+        cached = {field: value for field, value in report.items() if field not in REQUEST_FIELDS}
+        cached_artifacts = {}
+        for field, path in artifacts.items():
+            if path and os.path.exists(path):
+                target = os.path.join(entry_dir, os.path.basename(path))
+                _link_or_copy(path, os.path.join(staging_dir, os.path.basename(path)))
+                cached[field] = cached_artifacts[field] = target
+        cached["_artifacts"] = cached_artifacts
+        with open(os.path.join(staging_dir, "report.json"), "w", encoding="utf-8") as report_file:
+            json.dump(cached, report_file, default=str)
+
+        with self._publish_lock:
+            try:
+                os.rename(staging_dir, entry_dir)  # Publication atomique ; échoue si l'entrée existe déjà
+            except OSError:
+                existing = self._read_report(key)
+                if existing is not None:
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+                    cached = existing
+                else:  # Entrée incomplète ou invalide : remplacée
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                    os.rename(staging_dir, entry_dir)
+            size = _directory_size(entry_dir)
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            evicted = self._select_evictions()
+        for evicted_key in evicted:
+            shutil.rmtree(os.path.join(self.directory, evicted_key), ignore_errors=True)
+        self._mirror_put(key, size, evicted)
+        if evicted:
+            logger.info(f"🗃️ Cache: {len(evicted)} résultats évincés ({self._total_bytes / 1e6:.0f} Mo utilisés)")
+        cached.pop("_artifacts")
+        return cached
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._total_bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+    # ------------------------------------------------------------- interne
+    def _read_report(self, key: str) -> Optional[Dict[str, Any]]:
+        """Rapport de l'entrée `key` (avec `_artifacts`), ou None s'il est illisible ou s'il manque un fichier."""
+        try:
+            with open(os.path.join(self.directory, key, "report.json"), encoding="utf-8") as report_file:
+                report = json.load(report_file)
+        except (OSError, ValueError):
+            return None
+        if any(path and not os.path.exists(path) for path in report.get("_artifacts", {}).values()):
+            return None
+        return report
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _select_evictions(self):
+        evicted = []
+        while len(self._entries) > 1 and (self._total_bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            key, size = self._entries.popitem(last=False)  # Le moins récemment utilisé
+            self._total_bytes -= size
+            evicted.append(key)
+        return evicted
+
+    def _forget(self, key: str):
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+        shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+        self._mirror_delete([key])
+
+    def _known_in_mirror(self, key: str) -> bool:
+        """Entrée créée par une autre instance sur le même volume."""
+        if not self.availability_check():
+            return False
+        try:
+            return self.collection_getter().find_one({"_id": key}, {"_id": 1}) is not None
+        except errors.PyMongoError:
+            return False
+
+    def _mirror_touch(self, key: str):
+        if not self.availability_check():
+            return
+        try:
+            self.collection_getter().update_one({"_id": key}, {"$set": {"last_access": datetime.now(timezone.utc)}})
+        except errors.PyMongoError as e:
+            logger.warning(f"⚠️ Miroir du cache indisponible: {e}")
+
+    def _mirror_put(self, key: str, size: int, evicted):
+        if not self.availability_check():
+            return
+        try:
+            collection = self.collection_getter()
+            now = datetime.now(timezone.utc)
+            collection.update_one({"_id": key}, {"$set": {"size": size, "last_access": now},
+                                                 "$setOnInsert": {"created_at": now}}, upsert=True)
+            if evicted:
+                collection.delete_many({"_id": {"$in": evicted}})
+            # Borne du miroir : les entrées les moins récemment utilisées au-delà de max_entries ou max_bytes
+            entries = collection.estimated_document_count()
+            total = next(collection.aggregate([{"$group": {"_id": None, "bytes": {"$sum": "$size"}}}]), {})
+            total_bytes = total.get("bytes", 0)
+            if entries > self.max_entries or total_bytes > self.max_bytes:
+                stale = []
+                for doc in collection.find({"_id": {"$ne": key}}, {"size": 1}).sort("last_access", 1):
+                    if entries <= self.max_entries and total_bytes <= self.max_bytes:
+                        break
+                    stale.append(doc["_id"])
+                    entries -= 1
+                    total_bytes -= doc.get("size", 0)
+                collection.delete_many({"_id": {"$in": stale}})
+        except errors.PyMongoError as e:
+            logger.warning(f"⚠️ Miroir du cache indisponible: {e}")
+
+    def _mirror_delete(self, keys):
+        if not self.availability_check():
+            return
+        try:
+            self.collection_getter().delete_many({"_id": {"$in": list(keys)}})
+        except errors.PyMongoError:
+            pass
+
+
+_result_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Cache partagé, créé au premier usage (parcours du dossier de cache)."""
+    global _result_cache
+    with _cache_lock:
+        if _result_cache is None:
+            start = time.perf_counter()
+            _result_cache = ResultCache()
+            logger.info(f"🗃️ Cache de résultats chargé ({len(_result_cache._entries)} entrées, "
+                        f"{time.perf_counter() - start:.2f}s)")
+    return _result_cache
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# 🚨 Classes surveillées et règles de niveau de menace, en une seule table pour toutes les entrées
+# (analyse vidéo, image, détection en direct, alertes). La table est compilée en tableaux NumPy indexés
+# par identifiant de classe : filtrage, seuils de confiance et niveaux se calculent sur tout le tableau
+# de détections d'une frame, sans boucle Python par objet.
+
+THREAT_LEVELS = ("AUCUNE", "FAIBLE", "MOYEN", "ÉLEVÉ")  # Du moins au plus grave
+THREAT_ORDER = {level: index for index, level in enumerate(THREAT_LEVELS)}
+PERSON_CLASS_ID = 0
+THREAT_RULES_FILE = os.getenv("THREAT_RULES_FILE")  # Table JSON remplaçant la table par défaut
+
+
+@dataclass(frozen=True)
+class ClassRule:
+    class_id: int
+    name: str
+    level: str = "AUCUNE"  # Niveau de toute détection de la classe (ex. armes)
+    min_confidence: float = 0.0  # Confiance minimale propre à la classe
+    speed_threshold: Optional[float] = None  # Au-delà (m/s) : `speed_level`
+    speed_level: str = "MOYEN"
+    in_video: bool = True  # Surveillée aussi par l'analyse de vidéos (sinon : détection en direct seulement)
+
+
+# 🚨 CLASSES D'OBJETS DANGEREUX (Personnes + Armes + Véhicules)
+# Identifiants des poids COCO d'origine : les classes d'un modèle personnalisé (ex. 70 « Arme »,
+# 71 « Batte », qui sont « grille-pain » et « évier » dans COCO) se déclarent dans THREAT_RULES_FILE.
+DEFAULT_RULES = (
+    ClassRule(0, "Personne"),
+    ClassRule(1, "Vélo", in_video=False),
+    ClassRule(2, "Voiture", speed_threshold=5.0, in_video=False),
+    ClassRule(3, "Moto", speed_threshold=5.0, in_video=False),
+    ClassRule(5, "Camion", speed_threshold=5.0, in_video=False),
+    ClassRule(6, "Bus", in_video=False),
+    ClassRule(7, "Train", in_video=False),
+    ClassRule(8, "Avion", in_video=False),
+    ClassRule(49, "Couteau", level="ÉLEVÉ"),  # Si modèle personnalisé
+    ClassRule(67, "Pistolet", level="ÉLEVÉ"),  # Si modèle personnalisé
+)
+
+
+def _level_index(level: str, label: str) -> int:
+    if level not in THREAT_ORDER:
+        raise ValueError(f"{label}: niveau inconnu {level!r} (attendu : {', '.join(THREAT_LEVELS)})")
+    return THREAT_ORDER[level]
+
+
+class ThreatRules:
+    """
+    Table des classes surveillées, compilée en tableaux de correspondance (un élément par identifiant).
+    - `select` : détections (N, 6) des classes surveillées au-dessus de leur seuil, boîtes bornées à l'image ;
+      l'analyse de vidéos s'y limite aux classes `video_class_ids` (`in_video`).
+    - `levels` : niveau de menace de chaque détection (niveau de la classe, vitesse, course) ;
+      `threat_level` : même règle pour une seule détection, désignée par son libellé.
+    """
+
+    def __init__(self, rules: Sequence[ClassRule], running_level: str = "FAIBLE"):
+        ids = [rule.class_id for rule in rules]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Règles de menace : identifiants de classe en double")
+        if any(class_id < 0 for class_id in ids):
+            raise ValueError("Règles de menace : identifiants de classe négatifs")
+        self.rules = tuple(rules)
+        self.running_level = running_level
+        self.names: Dict[int, str] = {rule.class_id: rule.name for rule in self.rules}
+        self._ids_by_name = {rule.name: rule.class_id for rule in self.rules}
+        self.class_ids = np.array(sorted(self.names), dtype=np.int64)
+        self.video_names: Dict[int, str] = {rule.class_id: rule.name for rule in self.rules if rule.in_video}
+        self.video_class_ids = np.array(sorted(self.video_names), dtype=np.int64)
+
+        size = max(ids, default=-1) + 1
+        self._monitored = np.zeros(size, dtype=bool)
+        self._min_confidence = np.zeros(size, dtype=np.float32)
+        self._level = np.zeros(size, dtype=np.int8)
+        self._speed_threshold = np.full(size, np.inf, dtype=np.float32)
+        self._speed_level = np.zeros(size, dtype=np.int8)
+        for rule in self.rules:
+            label = f"Classe {rule.class_id} ({rule.name})"
+            self._monitored[rule.class_id] = True
+            self._min_confidence[rule.class_id] = rule.min_confidence
+            self._level[rule.class_id] = _level_index(rule.level, label)
+            if rule.speed_threshold is not None:
+                self._speed_threshold[rule.class_id] = rule.speed_threshold
+            self._speed_level[rule.class_id] = _level_index(rule.speed_level, label)
+        self._running_level = _level_index(running_level, "Course")
+        self._names = np.array([self.names.get(class_id, str(class_id)) for class_id in range(size)], dtype=object)
+
+    @classmethod
+    def from_spec(cls, spec: Union[str, Dict[str, Any], List[Any]]) -> "ThreatRules":
+        """
+        Table depuis sa description JSON (chaîne ou objet déjà décodé) :
+        `{"classes": [{"class_id": 0, "name": "Personne", "level": "AUCUNE", "min_confidence": 0.4,
+        "speed_threshold": 5.0, "speed_level": "MOYEN", "in_video": true}, ...], "running_level": "FAIBLE"}`
+        ou directement la liste des classes. Lève ValueError si la description est invalide.
+        """
+        if isinstance(spec, str):
+            try:
+                spec = json.loads(spec)
+            except ValueError:
+                raise ValueError("Règles de menace : JSON invalide")
+        if isinstance(spec, list):
+            spec = {"classes": spec}
+        if not isinstance(spec, dict) or not isinstance(spec.get("classes"), list):
+            raise ValueError("Règles de menace : objet {\"classes\": [...]} attendu")
+        rules = []
+        for index, item in enumerate(spec["classes"]):
+            try:
+                rules.append(ClassRule(**item))
+            except TypeError:
+                raise ValueError(f"Règle {index}: objet {{\"class_id\", \"name\", ...}} attendu")
+        return cls(rules, spec.get("running_level", "FAIBLE"))
+
+    def to_spec(self) -> Dict[str, Any]:
+        return {"classes": [asdict(rule) for rule in self.rules], "running_level": self.running_level}
+
+    def digest(self) -> str:
+        """Empreinte de la table (clés du cache de résultats : un changement de règles invalide les rapports)."""
+        return hashlib.sha256(json.dumps(self.to_spec(), sort_keys=True).encode()).hexdigest()[:16]
+
+    # ------------------------------------------------------------- calcul
+    def _lookup_ids(self, class_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Identifiants utilisables comme indices (0 hors table) et masque des classes surveillées."""
+        class_ids = np.asarray(class_ids, dtype=np.int64)
+        known = (class_ids >= 0) & (class_ids < len(self._monitored))
+        indices = np.where(known, class_ids, 0)
+        return indices, known & self._monitored[indices]
+
+    def select(self, detections: np.ndarray, min_confidence: float = 0.0,
+               image_shape: Optional[Tuple[int, ...]] = None,
+               class_ids: Optional[Sequence[int]] = None) -> np.ndarray:
+        """
+        Détections (N, 6) des classes surveillées (ou de `class_ids` parmi elles) dont la confiance atteint
+        le seuil de leur classe et `min_confidence` ; avec `image_shape`, boîtes bornées à l'image.
+        """
+        detections = np.asarray(detections, dtype=np.float32).reshape(-1, 6)
+        indices, keep = self._lookup_ids(detections[:, 5].astype(np.int64))
+        keep &= detections[:, 4] >= np.maximum(self._min_confidence[indices], min_confidence)
+        if class_ids is not None:
+            keep &= np.isin(indices, class_ids)
+        selected = detections[keep]
+        if image_shape is not None and len(selected):
+            height, width = image_shape[:2]
+            selected[:, [0, 2]] = np.clip(selected[:, [0, 2]], 0, width)
+            selected[:, [1, 3]] = np.clip(selected[:, [1, 3]], 0, height)
+        return selected
+
+    def levels(self, class_ids: np.ndarray, speeds: np.ndarray, running: np.ndarray) -> np.ndarray:
+        """Indice dans THREAT_LEVELS du niveau de chaque détection : le plus grave des règles qui s'appliquent."""
+        indices, monitored = self._lookup_ids(class_ids)
+        levels = np.where(monitored, self._level[indices], 0)
+        fast = monitored & (np.asarray(speeds, dtype=np.float32) > self._speed_threshold[indices])
+        levels = np.maximum(levels, np.where(fast, self._speed_level[indices], 0))
+        return np.maximum(levels, np.where(np.asarray(running, dtype=bool), self._running_level, 0)).astype(np.int8)
+
+    def level_names(self, class_ids: np.ndarray, speeds: np.ndarray, running: np.ndarray) -> List[str]:
+        return [THREAT_LEVELS[level] for level in self.levels(class_ids, speeds, running).tolist()]
+
+    def class_names(self, class_ids: np.ndarray) -> List[str]:
+        indices, monitored = self._lookup_ids(class_ids)
+        return [name if known else str(class_id) for name, known, class_id in
+                zip(self._names[indices].tolist(), monitored.tolist(), np.asarray(class_ids).tolist())]
+
+    def threat_level(self, object_type: str, speed: float, is_running: bool) -> str:
+        """Niveau d'une détection désignée par le libellé de sa classe (alertes enregistrées une à une)."""
+        class_id = self._ids_by_name.get(object_type, -1)
+        return THREAT_LEVELS[int(self.levels(np.array([class_id]), np.array([speed]), np.array([is_running]))[0])]
+
+
+def load_threat_rules(path: Optional[str] = THREAT_RULES_FILE) -> ThreatRules:
+    """Table du fichier JSON `path` (format de `ThreatRules.from_spec`), sinon la table par défaut."""
+    if not path:
+        return ThreatRules(DEFAULT_RULES)
+    with open(path, encoding="utf-8") as rules_file:
+        return ThreatRules.from_spec(json.load(rules_file))
+
+
+THREAT_RULES = load_threat_rules()
+DANGEROUS_CLASSES = THREAT_RULES.names  # Identifiant de classe -> libellé
@@ -1,49 +1,185 @@
-""" from ultralytics import YOLO
+import atexit
+import functools
 import os
-import torch
+import threading
+import numpy as np
 
-# Définir le chemin du modèle
-MODEL_PATH = os.path.join("models", "yolov8n.pt")
+from models.inferenceBackends import ExportedModel, default_threads, export_model, load_exported_model, resolve_backend
+from models.inferencePool import InferencePool
 
-# Vérifier si CUDA est disponible
-device = "cuda" if torch.cuda.is_available() else "cpu"
+# 📦 Registre des modèles YOLO : rien n'est chargé à l'import.
+# Les modèles sont chargés au premier usage et partagés par les routes, l'analyse
+# d'image, l'analyse vidéo et la détection en temps réel.
 
-# Charger le modèle YOLOv8 avec gestion de type
-try:
-    model = YOLO(MODEL_PATH).to(device)  # NE PAS utiliser `.half()`
-    print(f"✅ Modèle YOLOv8 chargé avec succès sur {device.upper()} (dtype=float32) !")
-except Exception as e:
-    print(f"❌ Erreur lors du chargement du modèle : {e}")
- """
+# Définir le chemin des modèles
+MODEL_DIR = "models"
+EXPORT_DIR = os.path.join(MODEL_DIR, "exports")  # Modèles exportés (ONNX, OpenVINO), réutilisés d'un lancement à l'autre
+DEFAULT_MODEL_NAME = os.getenv("YOLO_MODEL", "yolov8x.pt")  # n, s, m, l ou x (ou nom de fichier)
+MODEL_URL = "https://github.com/ultralytics/assets/releases/download/v8.0.0/{name}"
+PRECISIONS = ("fp32", "fp16")
+# > 0 : le modèle est répliqué dans autant de processus (voir models.inferencePool) et `run_inference`
+# y envoie les frames ; 0 : modèle chargé dans ce processus
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 0))
 
-from ultralytics import YOLO
-import os
-import torch
+_models = {}  # (poids, device, précision, moteur) -> modèle
+_locks = {}  # id(modèle) -> verrou d'inférence
+_registry_lock = threading.Lock()
+_build_locks = {}  # (poids, device, précision, moteur) -> verrou de chargement du modèle ou de démarrage du pool
 
-# Définir le chemin du modèle
-MODEL_DIR = "models"
-MODEL_NAME = "yolov8x.pt"
-MODEL_PATH = os.path.join(MODEL_DIR, MODEL_NAME)
-
-# Vérifier si CUDA est disponible
-device = "cuda" if torch.cuda.is_available() else "cpu"
-
-# Télécharger le modèle s'il n'existe pas encore
-if not os.path.exists(MODEL_PATH):
-    os.makedirs(MODEL_DIR, exist_ok=True)
-    try:
-        torch.hub.download_url_to_file(
-            "https://github.com/ultralytics/assets/releases/download/v8.0.0/yolov8x.pt", 
-            MODEL_PATH
-        )
-        print(f"✅ {MODEL_NAME} téléchargé avec succès !")
-    except Exception as e:
-        print(f"❌ Erreur lors du téléchargement du modèle : {e}")
-
-# Charger le modèle YOLOv8 avec gestion de type
-try:
-    model = YOLO(MODEL_PATH).to(device)  # NE PAS utiliser `.half()`
-    print(f"✅ Modèle {MODEL_NAME} chargé avec succès sur {device.upper()} (dtype=float32) !")
-except Exception as e:
-    print(f"❌ Erreur lors du chargement du modèle : {e}")
-  
\ No newline at end of file
+
+def resolve_model_name(name=None):
+    """Accepte une taille ("n", "s", "m", "l", "x") ou un nom de fichier de poids."""
+    name = name or DEFAULT_MODEL_NAME
+    if name in ("n", "s", "m", "l", "x"):
+        return f"yolov8{name}.pt"
+    return name
+
+
+def default_device():
+    import torch  # Import différé : torch est lent à importer
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def _ensure_weights(model_name):
+    """Télécharge les poids officiels s'ils ne sont pas encore présents dans MODEL_DIR."""
+    model_path = model_name if os.path.dirname(model_name) else os.path.join(MODEL_DIR, model_name)
+    if not os.path.exists(model_path):
+        import torch
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+        try:
+            torch.hub.download_url_to_file(MODEL_URL.format(name=os.path.basename(model_name)), model_path)
+            print(f"✅ {model_name} téléchargé avec succès !")
+        except Exception as e:
+            print(f"❌ Erreur lors du téléchargement du modèle : {e}")
+    return model_path
+
+
+def get_model(name=None, device=None, precision="fp32", warmup=False, backend=None, threads=None):
+    """
+    🧠 Retourne le modèle YOLO demandé, chargé une seule fois par (poids, device, précision, moteur).
+    - `precision="fp16"` n'est accepté que sur CUDA (sur CPU le modèle reste en float32).
+    - `warmup=True` exécute une inférence à vide au chargement pour amortir l'initialisation.
+    - `backend` (INFERENCE_BACKEND) : "torch", ou un moteur CPU ("onnx", "onnx-int8", "openvino") ; le modèle
+      est alors exporté une fois dans EXPORT_DIR (voir models.inferenceBackends).
+    - `threads` (INFERENCE_THREADS) : threads de calcul du moteur (par défaut : tous les cœurs).
+    - Avec INFERENCE_WORKERS > 0, retourne un pool de processus qui chargent chacun ce modèle avec
+      `threads` threads (par défaut : les cœurs répartis entre workers).
+    """
+    model_name = resolve_model_name(name)
+    backend = resolve_backend(backend)
+    threads = threads or default_threads()
+    if backend != "torch":
+        device = device or "cpu"
+        if device != "cpu" or precision != "fp32":
+            raise ValueError(f"Le moteur {backend} s'exécute sur CPU en fp32 (device={device}, precision={precision})")
+    device = device or default_device()
+    if precision not in PRECISIONS:
+        raise ValueError(f"Précision inconnue : {precision} (attendu : {', '.join(PRECISIONS)})")
+    if precision == "fp16" and not device.startswith("cuda"):
+        raise ValueError("La précision fp16 nécessite un GPU CUDA")
+
+    key = (model_name, device, precision, backend)
+    if INFERENCE_WORKERS > 0:
+        return _get_pool(key, threads)
+    # Chargement (et export d'un moteur CPU, parfois plusieurs minutes) sous le verrou propre à ce modèle :
+    # le verrou du registre n'est pris que pour lire et publier l'entrée
+    with _registry_lock:
+        model = _models.get(key)
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+    loaded = False
+    if model is None:
+        with build_lock:
+            with _registry_lock:
+                model = _models.get(key)
+            if model is None:
+                model = _load_model(key, threads)
+                with _registry_lock:
+                    _models[key] = model
+                    _locks[id(model)] = threading.Lock()
+                loaded = True
+
+    if warmup and loaded:
+        run_inference([np.zeros((640, 640, 3), dtype=np.uint8)], model=model)
+    return model
+
+
+def _load_model(key, threads):
+    """Charge le modèle `key` : exporté pour un moteur CPU, sinon modèle ultralytics."""
+    model_name, device, precision, backend = key
+    if backend != "torch":
+        artifact = export_model(_ensure_weights(model_name), backend, EXPORT_DIR)
+        model = load_exported_model(artifact, backend, threads)
+        print(f"✅ Modèle {model_name} chargé avec succès ({backend}, {threads or 'tous les'} threads) !")
+        return model
+
+    from ultralytics import YOLO
+
+    if threads and device == "cpu":
+        import torch
+        torch.set_num_threads(threads)
+
+    # NE PAS utiliser `.half()` : la demi-précision passe par l'option `half` du prédicteur
+    model = YOLO(_ensure_weights(model_name))
+    model.overrides["device"] = device
+    model.overrides["half"] = precision == "fp16"
+    print(f"✅ Modèle {model_name} chargé avec succès sur {device.upper()} ({precision}) !")
+    return model
+
+
+def _get_pool(key, threads=None):
+    """
+    Pool de workers d'inférence du modèle `key`, démarré une seule fois. Le démarrage (chargement du modèle
+    dans chaque worker) se fait sous le verrou propre à ce modèle, hors du verrou du registre : les autres
+    modèles et `run_inference` ne l'attendent pas.
+    """
+    with _registry_lock:
+        pool = _models.get(key)
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+    if pool is not None:
+        return pool
+    with build_lock:
+        with _registry_lock:
+            pool = _models.get(key)
+        if pool is not None:
+            return pool  # Démarré par un autre thread pendant l'attente
+        model_name, device, precision, backend = key
+        # Poids téléchargés (et modèle exporté) une seule fois, ici, avant le démarrage des workers ;
+        # ceux-ci chargent le modèle par ce même registre, préchauffé, sans pool imbriqué
+        weights_path = _ensure_weights(model_name)
+        if backend != "torch":
+            export_model(weights_path, backend, EXPORT_DIR)
+        threads = threads or max((os.cpu_count() or 1) // INFERENCE_WORKERS, 1)
+        factory = functools.partial(get_model, model_name, device, precision, True, backend, threads)
+        pool = InferencePool(factory, INFERENCE_WORKERS, threads=threads)
+        atexit.register(pool.close)
+        with _registry_lock:
+            _models[key] = pool
+    print(f"✅ Modèle {model_name} chargé dans {INFERENCE_WORKERS} workers d'inférence ({backend}) !")
+    return pool
+
+
+def boxes_to_array(result):
+    """Détections d'un résultat YOLO sous forme de tableau (N, 6) : x1, y1, x2, y2, confiance, classe."""
+    if result.boxes is None:
+        return np.empty((0, 6), dtype=np.float32)
+    return result.boxes.data.cpu().numpy()
+
+
+def run_inference(frames, model=None, **kwargs):
+    """
+    Exécute le modèle sur une liste d'images en un seul appel et retourne un tableau (N, 6) par image.
+    🔒 Le prédicteur YOLO n'est pas thread-safe : un seul appel à la fois par modèle.
+    Un pool de workers (INFERENCE_WORKERS) traite des appels concurrents en parallèle, sans verrou.
+    """
+    model = model if model is not None else get_model()
+    if isinstance(model, InferencePool):
+        return model.predict(frames, **kwargs)
+    lock = _locks.get(id(model))
+    if lock is None:
+        with _registry_lock:
+            lock = _locks.setdefault(id(model), threading.Lock())
+    with lock:
+        if isinstance(model, ExportedModel):
+            return model.predict_arrays(frames, **kwargs)
+        results = model(frames, verbose=False, **kwargs)
+    return [boxes_to_array(result) for result in results]
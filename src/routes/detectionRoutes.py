@@ -1,9 +1,35 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, send_file, url_for
+from controllers.clipRenderer import RenderError, clip_path_for, render_clip
 from controllers.detect_intruder_video import IntruderDetector
+from controllers.detectionController import detect_intruder, detect_intruders_batch
+from controllers.videoJobs import VideoJobQueue, QueueFullError
+from controllers.detectionStream import DetectionStream, StreamClosed
+from controllers.shardedVideo import analyze_video_sharded
+from controllers.zones import ZoneSet
+import hashlib
+import io
 import os
+import threading
+import time
 import uuid
 import logging
-from models.database import alerts_collection  # ✅ Import unique
+from datetime import datetime
+from models.database import is_connected
+from models.alertQueries import (find_alerts, recent_alerts as find_recent_alerts, InvalidQueryError,
+                                 MigrationRequiredError, parse_datetime)
+from models.alertRollups import summarize, rebuild_rollups, is_rebuilding
+from models.alertWriter import alert_writer
+from models.detectionStore import DetectionStore
+from models.resultCache import cache_key, get_result_cache
+from models.inferenceBackends import resolve_backend
+from models.threatRules import THREAT_RULES
+from models.yoloModel import resolve_model_name
+from utils.metrics import registry, QUEUE_DEPTH, VIDEO_JOBS
+from utils.profiling import run_profiled
+from utils.uploads import (HEAD_BYTES, IMAGE_CONTAINERS, PROBE_BYTES, VIDEO_CONTAINERS, GrowingVideoCapture,
+                           StreamingUpload, UploadRejected, is_progressive, iter_request_file, probe_image,
+                           probe_video, read_image_archive, sniff_container)
+from werkzeug.exceptions import ClientDisconnected, RequestEntityTooLarge
 
 # Configuration du logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -12,71 +38,724 @@ logger = logging.getLogger(__name__)
 detection_api = Blueprint("detection_api", __name__)
 UPLOAD_FOLDER = "uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+MAX_VIDEO_UPLOAD_BYTES = int(os.getenv("MAX_VIDEO_UPLOAD_MB", 2048)) * 1024 * 1024
+MAX_IMAGE_UPLOAD_BYTES = int(os.getenv("MAX_IMAGE_UPLOAD_MB", 25)) * 1024 * 1024
+MAX_BATCH_IMAGES = int(os.getenv("MAX_BATCH_IMAGES", 500))  # Images par requête /detect_images
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv("MAX_BATCH_UPLOAD_MB", 512)) * 1024 * 1024
+
+# ⚙️ Pool d'analyse vidéo (configurable via l'environnement)
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", 2))
+VIDEO_QUEUE_SIZE = int(os.getenv("VIDEO_QUEUE_SIZE", 8))
+VIDEO_SHARD_WORKERS = int(os.getenv("VIDEO_SHARD_WORKERS", 1))  # > 1 : vidéos longues découpées en segments
+ENABLE_PROFILING = os.getenv("ENABLE_PROFILING", "0") == "1"  # Autorise `?profile=1` (profil cProfile par job)
+
+# Réglages du détecteur ; REGION_INFERENCE=1 : inférence sur les zones en mouvement (caméras fixes haute résolution)
+# RENDER_ANNOTATED_VIDEO=1 : vidéo annotée encodée pendant l'analyse (sinon rendue à la demande, /jobs/<id>/video)
+DETECTOR_OPTIONS = {"region_inference": os.getenv("REGION_INFERENCE", "0") == "1",
+                    "render_video": os.getenv("RENDER_ANNOTATED_VIDEO", "0") == "1"}
+CLIP_PADDING_S = float(os.getenv("CLIP_PADDING_S", 5.0))  # Marge par défaut d'un extrait autour d'un instant
+
+# Détecteur partagé par tous les jobs (le modèle n'est chargé qu'une fois)
+detector = IntruderDetector(**DETECTOR_OPTIONS)
+
+
+def _analyze_video(filepath, progress_callback, stream=None, profile=False, result_key=None, upload=None,
+                   zones=None):
+    """
+    Analyse exécutée par un worker du pool.
+    - Avec `stream` (DetectionStream), les détections sont poussées frame par frame au client
+      au lieu d'être accumulées dans le rapport final ; le rapport mis en cache les contient (relues
+      depuis `detections_path`), et les alertes sont écrites avant l'événement final.
+    - Avec `profile`, l'analyse est profilée (cProfile) et le chemin du profil ajouté au résultat.
+    - Avec `result_key`, le rapport complet, les détections et la vidéo source (ou annotée) sont mis en cache.
+    - Avec `upload` (StreamingUpload encore en cours), les frames sont lues au fur et à mesure de la
+      réception ; la clé de cache est calculée à la fin, quand l'empreinte du contenu est connue.
+    - Avec `zones` (ZoneSet), seules les détections dans ces zones sont analysées et signalées.
+    """
+    if profile:
+        result, profile_path = run_profiled(os.path.splitext(os.path.basename(filepath))[0], _analyze_video,
+                                            filepath, progress_callback, stream, result_key=result_key,
+                                            upload=upload, zones=zones)
+        result["profile_path"] = profile_path
+        logger.info(f"🔬 Profil enregistré: {profile_path}")
+        return result
+    capture = GrowingVideoCapture(upload) if upload is not None and not upload.complete else None
+    if stream is not None:
+        return _analyze_video_streamed(filepath, progress_callback, stream, capture, zones, result_key, upload)
+    if capture is not None:
+        result = detector.detect_intruder_in_video(filepath, progress_callback=progress_callback, capture=capture,
+                                                   zones=zones)
+    elif VIDEO_SHARD_WORKERS > 1:
+        result = analyze_video_sharded(filepath, workers=VIDEO_SHARD_WORKERS,
+                                       detector_options=DETECTOR_OPTIONS, zones=zones,
+                                       progress_callback=progress_callback)
+    else:
+        result = detector.detect_intruder_in_video(filepath, progress_callback=progress_callback, zones=zones)
+    if result.get("status") != "success":
+        return result
+    result = _store_result(result, _upload_result_key(result_key, upload, zones))
+
+    # Vérifier les alertes stockées dans MongoDB (après écriture des alertes de cette vidéo)
+    recent_alerts = find_recent_alerts(5) if is_connected() else []
+
+    result["file_path"] = filepath
+    result["recent_alerts"] = recent_alerts  # Ajout des alertes récentes dans la réponse
+    logger.info("✅ Détection terminée et alertes récupérées")
+    return result
+
+
+def _upload_result_key(result_key, upload, zones=None):
+    """Clé de cache d'une analyse démarrée pendant l'upload : connue seulement une fois l'upload terminé."""
+    if result_key is None and upload is not None and upload.content_hash:
+        return _video_result_key(upload.content_hash, zones)
+    return result_key
+
+
+def _store_result(result, result_key):
+    """Fin d'une analyse réussie : rapport mis en cache (avec `result_key`) et alertes en attente écrites."""
+    if result_key is not None:
+        result = _cache_result(result_key, result, _video_artifacts(result))
+    alert_writer.flush()
+    return result
+
+
+def _cache_result(result_key, result, artifacts):
+    """Met un rapport en cache ; une erreur du cache (disque plein...) est journalisée, le rapport reste servi."""
+    try:
+        return get_result_cache().put(result_key, result, artifacts)
+    except Exception as e:
+        logger.warning(f"⚠️ Résultat non mis en cache ({result_key}): {e}")
+        return result
+
+
+def _render_video(detections_path, progress_callback, source_video_path=None):
+    """Rendu de la vidéo annotée entière d'une analyse, exécuté par un worker de la file (comme une analyse)."""
+    try:
+        clip = render_clip(detections_path, video_path=source_video_path, progress_callback=progress_callback)
+    except (RenderError, ValueError) as e:
+        return {"status": "error", "message": str(e)}
+    return {"status": "success", **clip}
+
+
+# Rendus complets en file ou en cours : chemin de la vidéo rendue -> identifiant du job
+_render_jobs = {}
+_render_jobs_lock = threading.Lock()
+
+
+def _render_job(result):
+    """Job de rendu de la vidéo entière d'un résultat ; un rendu déjà en file ou en cours est réutilisé."""
+    output_path = clip_path_for(result["detections_path"], 1, None)
+    with _render_jobs_lock:
+        job = video_jobs.get(_render_jobs.get(output_path, ""))
+        if job is None or job.status not in ("queued", "running"):
+            job = video_jobs.submit(result["detections_path"], handler=_render_video,
+                                    source_video_path=result.get("source_video_path"))
+            _render_jobs[output_path] = job.job_id
+    return job
+
+
+def _video_artifacts(result):
+    """Fichiers d'un rapport vidéo à conserver avec lui (la source permet de rendre la vidéo annotée plus tard)."""
+    return {field: result.get(field) for field in ("video_path", "detections_path", "source_video_path")}
+
+
+def _analyze_video_streamed(filepath, progress_callback, stream, capture=None, zones=None, result_key=None,
+                            upload=None):
+    """
+    Analyse en un seul processus (ordre des frames garanti), résultats publiés dans `stream`.
+    Le rapport est mis en cache et les alertes écrites avant l'envoi de l'événement final.
+    """
+    def on_progress(frames_processed, total_frames):
+        progress_callback(frames_processed, total_frames)
+        stream.on_progress(frames_processed, total_frames)
+
+    try:
+        result = detector.detect_intruder_in_video(filepath, progress_callback=on_progress,
+                                                   frame_callback=stream.on_frame, collect_detections=False,
+                                                   capture=capture, zones=zones)
+    except StreamClosed:
+        logger.info(f"🔌 Client déconnecté, analyse interrompue: {filepath}")
+        return {"status": "error", "message": "Client déconnecté"}
+    except Exception as e:
+        stream.fail(str(e))
+        raise
+    if result.get("status") == "success":
+        result_key = _upload_result_key(result_key, upload, zones)
+        if result_key is not None and result.get("detections") is None and result.get("detections_path"):
+            # Rapport en cache complet, comme celui d'une analyse non diffusée
+            result["detections"] = DetectionStore.load(result["detections_path"]).records()
+        result = _store_result(result, result_key)
+    result["file_path"] = filepath
+    stream.finish(result)
+    return result
+
+
+video_jobs = VideoJobQueue(_analyze_video, max_workers=VIDEO_WORKERS, max_pending=VIDEO_QUEUE_SIZE)
+
+# 📈 Jauges lues au moment du scrape de /metrics
+VIDEO_JOBS.labels(state="running").set_function(lambda: video_jobs.stats()["running"])
+VIDEO_JOBS.labels(state="queued").set_function(lambda: video_jobs.stats()["queued"])
+VIDEO_JOBS.labels(state="reserved").set_function(lambda: video_jobs.stats()["reserved"])
+QUEUE_DEPTH.labels(queue="alerts").set_function(alert_writer.pending)
+
+
+def _profile_requested():
+    return ENABLE_PROFILING and request.args.get("profile") == "1"
+
+
+def _requested_zones():
+    """Zones de détection de la requête (`?zones=<JSON>`, format de `ZoneSet.from_spec`) ; ValueError si invalides."""
+    return ZoneSet.from_spec(request.args.get("zones"))
+
+
+def _invalid_zones_response(error):
+    return jsonify({"status": "error", "message": str(error)}), 400
+
+
+def _queue_full_response():
+    response = jsonify({"status": "error", "message": "Trop de vidéos en cours d'analyse, réessayez plus tard",
+                        **video_jobs.stats()})
+    response.headers["Retry-After"] = "30"
+    return response, 503
+
+
+def _image_result_key(content_hash, confidence_threshold, zones=None):
+    return cache_key(content_hash, "image", {"model": resolve_model_name(detector.model_name),
+                                             "backend": resolve_backend(),
+                                             "threat_rules": THREAT_RULES.digest(),
+                                             "confidence_threshold": confidence_threshold,
+                                             "zones": zones.config() if zones is not None else None})
+
+
+def _check_container(upload, containers):
+    container = sniff_container(upload.head)
+    if container not in containers:
+        raise UploadRejected(f"Contenu non reconnu ({container or 'format inconnu'}) : "
+                             f"formats acceptés {', '.join(containers)}")
+
+
+def _ingest_upload(field, extensions, containers, max_bytes, probe, on_progressive=None):
+    """
+    Reçoit le fichier `field` en continu depuis le corps de la requête (multipart, ou corps brut nommé
+    par `?filename=`), l'écrit sur disque par morceaux et calcule son empreinte SHA-256 au passage.
+    - Taille : refus (413) dès que Content-Length ou les octets reçus dépassent `max_bytes`.
+    - Conteneur : reconnu sur les premiers octets (415 sans attendre la fin de l'upload).
+    - Décodage : `probe` (OpenCV) est tenté dès PROBE_BYTES reçus pour les vidéos ; si cette portion ne
+      suffit pas (index MP4 en fin de fichier), la vérification est refaite sur le fichier complet.
+    - `on_progressive(upload)` : appelé une fois, avant la fin de l'upload, si la vidéo reçue est
+      décodable et progressive (l'analyse peut démarrer sur la portion déjà reçue).
+    Retourne (StreamingUpload terminé, None) ou (None, réponse d'erreur).
+    """
+    upload = None
+    container_checked = early_probe_done = probed = False
+    try:
+        chunks = iter_request_file(request.stream, request.content_type, field,
+                                   filename=request.args.get("filename", ""))
+        for filename, chunk in chunks:
+            if upload is None:
+                if not filename.lower().endswith(extensions):
+                    raise UploadRejected("Format de fichier non supporté", status=400)
+                filepath = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}_{os.path.basename(filename)}")
+                upload = StreamingUpload(filepath, max_bytes, expected_size=request.content_length)
+            upload.write(chunk)
+            if not container_checked and len(upload.head) >= HEAD_BYTES:
+                _check_container(upload, containers)
+                container_checked = True
+            if on_progressive is not None and not early_probe_done and upload.size >= PROBE_BYTES:
+                early_probe_done = True
+                probed = probe(upload.path) is None  # Sinon : nouvelle vérification sur le fichier complet
+                if probed and is_progressive(upload.head):
+                    on_progressive(upload)
+
+        if upload is None:
+            return None, (jsonify({"status": "error", "message": "Aucun fichier reçu"}), 400)
+        if not container_checked:
+            _check_container(upload, containers)
+        content_hash = upload.finish()
+        if not probed:
+            error = probe(upload.path)
+            if error is not None:
+                raise UploadRejected(error)
+    except UploadRejected as e:
+        if upload is not None:
+            upload.abort(str(e))
+        logger.warning(f"⛔ Upload refusé: {e}")
+        return None, (jsonify({"status": "error", "message": str(e)}), e.status)
+    except ClientDisconnected:
+        if upload is not None:
+            upload.abort("Client déconnecté")
+        return None, (jsonify({"status": "error", "message": "Upload interrompu"}), 400)
+    except Exception as e:
+        if upload is not None:
+            upload.abort(str(e))
+        raise
+
+    logger.info(f"📂 Fichier reçu et enregistré: {upload.path} ({upload.size} octets, sha256 {content_hash[:12]})")
+    return upload, None
+
+
+def _ingest_video(on_progressive=None):
+    return _ingest_upload("video", VIDEO_EXTENSIONS, VIDEO_CONTAINERS, MAX_VIDEO_UPLOAD_BYTES, probe_video,
+                          on_progressive=on_progressive)
+
+
+def _video_result_key(content_hash, zones=None):
+    return cache_key(content_hash, "video", detector.result_config(zones))
+
+
+def _cached_video_result(filepath, content_hash, zones=None):
+    """Rapport déjà calculé pour ce contenu : l'upload en double est supprimé et un job terminé est créé."""
+    result_key = _video_result_key(content_hash, zones)
+    report = get_result_cache().get(result_key)
+    if report is None:
+        return result_key, None
+    os.remove(filepath)
+    logger.info(f"🗃️ Résultat servi par le cache ({result_key})")
+    job = video_jobs.add_finished(filepath, {**report, "cached": True})
+    return result_key, job
+
+
+def _cached_image_report(report):
+    """Rapport d'image servi par le cache : horodaté à la requête, l'analyse d'origine restant dans `analyzed_at`."""
+    return {**report, "cached": True, "analyzed_at": report.get("timestamp"),
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+
+
+def _cached_job_response(job):
+    return jsonify({
+        "status": "done",
+        "cached": True,
+        "job_id": job.job_id,
+        "status_url": url_for("detection_api.get_job_status", job_id=job.job_id),
+        "result_url": url_for("detection_api.get_job_result", job_id=job.job_id),
+        "result": job.result
+    }), 200
+
+
+def _job_accepted_response(job, filepath, started_during_upload=False):
+    return jsonify({
+        "status": "queued",
+        "job_id": job.job_id,
+        "file_path": filepath,
+        "started_during_upload": started_during_upload,
+        "status_url": url_for("detection_api.get_job_status", job_id=job.job_id),
+        "result_url": url_for("detection_api.get_job_result", job_id=job.job_id)
+    }), 202
+
 
 @detection_api.route("/detect_video", methods=["POST"])
 def detect_video():
     """
     📹 API pour détecter les intrusions dans une vidéo.
-    - Enregistre la vidéo reçue, exécute la détection et retourne les résultats.
+    - Enregistre la vidéo reçue et la place dans la file d'analyse.
+    - Répond dès la fin de l'upload (202) avec l'identifiant du job.
+    - File saturée : 503 avant la réception du corps (une place est réservée avant l'upload).
+    - Vidéo progressive (MP4 faststart) : l'analyse démarre pendant l'upload (`started_during_upload`).
+    - Contenu déjà analysé avec le même modèle et les mêmes réglages : rapport en cache (200) ; une
+      analyse démarrée pendant l'upload est alors annulée (l'empreinte n'est connue qu'à la fin).
+    - `?zones=<JSON>` : zones de détection de cette analyse (400 si invalides).
     """
     try:
-        if "video" not in request.files:
-            return jsonify({"status": "error", "message": "Aucune vidéo reçue"}), 400
+        zones = _requested_zones()
+    except ValueError as e:
+        return _invalid_zones_response(e)
+    try:
+        reservation = video_jobs.reserve()
+    except QueueFullError:
+        return _queue_full_response()
+    early_job = None
 
-        file = request.files["video"]
-        if file.filename == '' or not file.filename.lower().endswith(('.mp4', '.avi', '.mov', '.mkv')):
-            return jsonify({"status": "error", "message": "Format de fichier non supporté"}), 400
+    def start_during_upload(upload):
+        nonlocal early_job
+        early_job = video_jobs.submit(upload.path, reservation=reservation, profile=_profile_requested(),
+                                      upload=upload, zones=zones)
+        logger.info(f"⏩ Analyse démarrée pendant l'upload ({upload.size} octets reçus)")
 
-        filename = f"{uuid.uuid4().hex}_{file.filename}"
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
+    try:
+        upload, error_response = _ingest_video(on_progressive=start_during_upload)
+        if error_response is not None:
+            return error_response  # Un job démarré pendant l'upload échoue de lui-même
+        filepath = upload.path
 
-        logger.info(f"📂 Vidéo reçue et enregistrée: {filepath}")
+        result_key, cached_job = _cached_video_result(filepath, upload.content_hash, zones)
+        if cached_job is not None:
+            if early_job is not None:
+                video_jobs.cancel(early_job)
+            return _cached_job_response(cached_job)
+        if early_job is not None:
+            return _job_accepted_response(early_job, filepath, started_during_upload=True)
 
-        # Instanciation du détecteur et analyse de la vidéo
-        detector = IntruderDetector()
-        result = detector.detect_intruder_in_video(filepath)
+        job = video_jobs.submit(filepath, reservation=reservation, profile=_profile_requested(),
+                                result_key=result_key, zones=zones)
+        return _job_accepted_response(job, filepath)
 
-        # Vérifier les alertes stockées dans MongoDB
-        recent_alerts = list(alerts_collection.find().sort("timestamp", -1).limit(5))
-        for alert in recent_alerts:
-            alert["_id"] = str(alert["_id"])  # Convertir ObjectId en string pour le JSON
+    except Exception as e:
+        logger.exception(f"🚨 Erreur lors du traitement de la vidéo: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        video_jobs.release(reservation)  # Place non utilisée (upload refusé, résultat en cache, erreur)
 
-        result["file_path"] = filepath
-        result["recent_alerts"] = recent_alerts  # Ajout des alertes récentes dans la réponse
-        
-        logger.info("✅ Détection terminée et alertes récupérées")
-        return jsonify(result)
+@detection_api.route("/detect_video/stream", methods=["POST"])
+def detect_video_stream():
+    """
+    📡 API de détection vidéo en continu.
+    - `?format=ndjson` (défaut) ou `?format=sse` : un événement par frame contenant des détections
+      (détections + alertes), la progression, puis un résumé final (`end`) ou une erreur (`error`).
+    - L'analyse passe par la même file que `/detect_video` (503 avant la réception si saturée) ;
+      elle est interrompue si le client se déconnecte.
+    - Vidéo progressive : l'analyse démarre pendant l'upload, les premiers événements sont prêts
+      dès l'ouverture du flux.
+    - Contenu déjà analysé : seul le résumé final (`end`, `cached: true`) est envoyé ; le rapport d'une
+      analyse diffusée alimente le même cache que `/detect_video`.
+    - L'événement final est envoyé une fois les alertes de la vidéo écrites.
+    - `?zones=<JSON>` : zones de détection, comme pour `/detect_video`.
+    """
+    fmt = request.args.get("format", "ndjson").lower()
+    if fmt not in DetectionStream.FORMATS:
+        return jsonify({"status": "error", "message": "Format inconnu (ndjson ou sse)"}), 400
+    try:
+        zones = _requested_zones()
+    except ValueError as e:
+        return _invalid_zones_response(e)
+
+    try:
+        reservation = video_jobs.reserve()
+    except QueueFullError:
+        return _queue_full_response()
+    stream = DetectionStream()
+    job = None
 
+    def start_during_upload(upload):
+        nonlocal job
+        job = video_jobs.submit(upload.path, reservation=reservation, stream=stream, profile=_profile_requested(),
+                                upload=upload, zones=zones)
+
+    try:
+        upload, error_response = _ingest_video(on_progressive=start_during_upload)
+        if error_response is not None:
+            stream.close()  # Arrête un éventuel job démarré pendant l'upload
+            return error_response
+        filepath = upload.path
+
+        result_key, cached_job = _cached_video_result(filepath, upload.content_hash, zones)
+        if cached_job is not None:
+            if job is not None:
+                video_jobs.cancel(job)
+                stream.close()  # Analyse démarrée pendant l'upload : arrêtée, ses événements sont ignorés
+                stream = DetectionStream()
+            job = cached_job
+            stream.finish(job.result)
+        if job is None:
+            job = video_jobs.submit(filepath, reservation=reservation, stream=stream, profile=_profile_requested(),
+                                    result_key=result_key, zones=zones)
     except Exception as e:
         logger.exception(f"🚨 Erreur lors du traitement de la vidéo: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        video_jobs.release(reservation)
 
-@detection_api.route("/alerts", methods=["GET"])
-def get_alerts():
+    def generate():
+        try:
+            yield stream.format({"event": "start", "job_id": job.job_id, "file_path": filepath}, fmt)
+            for event in stream.events():
+                yield stream.format(event, fmt)
+        finally:
+            stream.close()  # Client déconnecté ou flux terminé : l'analyse s'arrête au prochain événement
+
+    response = Response(generate(), mimetype=DetectionStream.FORMATS[fmt])
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # Pas de mise en tampon par un proxy nginx
+    response.headers["X-Job-Id"] = job.job_id
+    return response
+
+@detection_api.route("/detect_image", methods=["POST"])
+def detect_image():
+    """
+    🖼️ API pour détecter les intrus dans une image (analyse synchrone).
+    - `confidence_threshold` optionnel (0.5 par défaut).
+    - Contenu déjà analysé avec le même modèle et le même seuil : rapport en cache.
+    - `?zones=<JSON>` : seules les personnes dans ces zones sont comptées.
+    """
+    try:
+        confidence_threshold = float(request.args.get("confidence_threshold", 0.5))
+        zones = _requested_zones()
+        upload, error_response = _ingest_upload("image", IMAGE_EXTENSIONS, IMAGE_CONTAINERS, MAX_IMAGE_UPLOAD_BYTES,
+                                                probe_image)
+        if error_response is not None:
+            return error_response
+        filepath = upload.path
+
+        result_key = _image_result_key(upload.content_hash, confidence_threshold, zones)
+        cache = get_result_cache()
+        report = cache.get(result_key)
+        if report is not None:
+            os.remove(filepath)
+            return jsonify(_cached_image_report(report)), 200
+
+        result = detect_intruder(filepath, confidence_threshold=confidence_threshold, zones=zones)
+        if result.get("status") != "success":
+            return jsonify(result), 500
+        result = _cache_result(result_key, result, {"annotated_image_path": result["annotated_image_path"]})
+        return jsonify({**result, "file_path": filepath}), 200
+
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.exception(f"🚨 Erreur lors du traitement de l'image: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+def _batch_images():
+    """
+    Images d'une requête /detect_images `(nom, octets)` : fichiers multipart `images` (autant que voulu),
+    ou archive ZIP (partie `archive`, ou corps `application/zip`). Lève UploadRejected au-delà des limites.
+    """
+    too_large = UploadRejected(f"Lot trop volumineux (max {MAX_BATCH_UPLOAD_BYTES // (1024 * 1024)} Mo)", status=413)
+    if request.content_length is not None and request.content_length > MAX_BATCH_UPLOAD_BYTES:
+        raise too_large
+    # Corps sans Content-Length (chunked) : les octets lus sont comptés, la lecture échoue au-delà de la limite
+    request.max_content_length = MAX_BATCH_UPLOAD_BYTES
+    try:
+        return _read_batch_images()
+    except RequestEntityTooLarge:
+        raise too_large
+
+
+def _read_batch_images():
+    limits = (IMAGE_EXTENSIONS, MAX_BATCH_IMAGES, MAX_IMAGE_UPLOAD_BYTES, MAX_BATCH_UPLOAD_BYTES)
+    if request.mimetype in ("application/zip", "application/x-zip-compressed"):
+        body = request.stream.read()  # S'arrête à la limite...
+        request.stream.read(1)  # ... et lire au-delà lève RequestEntityTooLarge
+        return read_image_archive(io.BytesIO(body), *limits)
+    archive = request.files.get("archive")
+    if archive is not None:
+        return read_image_archive(archive.stream, *limits)
+
+    files = request.files.getlist("images")
+    if len(files) > MAX_BATCH_IMAGES:
+        raise UploadRejected(f"Trop d'images (max {MAX_BATCH_IMAGES})", status=413)
+    images = []
+    for file in files:
+        data = file.read(MAX_IMAGE_UPLOAD_BYTES + 1)
+        if len(data) > MAX_IMAGE_UPLOAD_BYTES:
+            raise UploadRejected(f"Image trop volumineuse: {file.filename}", status=413)
+        images.append((os.path.basename(file.filename or f"image_{len(images) + 1}.jpg"), data))
+    return images
+
+
+@detection_api.route("/detect_images", methods=["POST"])
+def detect_images():
     """
-    📌 API pour récupérer les alertes stockées dans MongoDB.
-    - Permet le filtrage par type d'objet (`object_type`).
-    - Gère la pagination avec `limit` et `skip`.
+    🗂️ API de détection sur un lot d'images (rafales de clichés), analyse synchrone.
+    - Fichiers multipart `images` (plusieurs), ou archive ZIP (partie `archive` ou corps `application/zip`).
+    - Décodage en parallèle, inférence par paquets d'images de même forme (voir `detect_intruders_batch`).
+    - `confidence_threshold` (0.5 par défaut), `?zones=<JSON>` : comme /detect_image.
+    - `?annotate=1` : images annotées écrites (sinon aucune écriture).
+    - Images déjà analysées avec les mêmes réglages : rapports servis par le cache (partagé avec /detect_image).
+    Réponse : un rapport par image, dans l'ordre de réception (`status` "error" pour une image illisible).
     """
+    start = time.perf_counter()
     try:
-        object_type = request.args.get("object_type")  # Filtrage optionnel
-        limit = int(request.args.get("limit", 20))  # Nombre max d'alertes renvoyées
-        skip = int(request.args.get("skip", 0))  # Nombre d'alertes à ignorer
+        confidence_threshold = float(request.args.get("confidence_threshold", 0.5))
+        save_annotated = request.args.get("annotate") == "1"
+        zones = _requested_zones()
+        images = _batch_images()
+    except UploadRejected as e:
+        logger.warning(f"⛔ Lot d'images refusé: {e}")
+        return jsonify({"status": "error", "message": str(e)}), e.status
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if not images:
+        return jsonify({"status": "error", "message": "Aucune image reçue"}), 400
 
-        query = {}  
-        if object_type:
-            query["object_type"] = object_type  
+    try:
+        cache = get_result_cache()
+        results = [None] * len(images)
+        result_keys = [None] * len(images)
+        to_analyze = []
+        for index, (name, data) in enumerate(images):
+            container = sniff_container(data[:HEAD_BYTES])
+            if not name.lower().endswith(IMAGE_EXTENSIONS) or container not in IMAGE_CONTAINERS:
+                results[index] = {"status": "error", "message": f"Format non supporté ({container or 'inconnu'})"}
+                continue
+            result_keys[index] = _image_result_key(hashlib.sha256(data).hexdigest(), confidence_threshold, zones)
+            report = cache.get(result_keys[index])
+            # Un rapport en cache sans image annotée ne suffit pas si l'annotation est demandée
+            if report is not None and (not save_annotated or report["annotated_image_path"]
+                                       or not report["intrusion_detected"]):
+                results[index] = _cached_image_report(report)
+            else:
+                to_analyze.append(index)
 
-        alerts = list(alerts_collection.find(query).skip(skip).limit(limit))
+        analyzed = detect_intruders_batch([images[index] for index in to_analyze], confidence_threshold,
+                                          save_annotated=save_annotated, zones=zones)
+        for index, result in zip(to_analyze, analyzed):
+            if result["status"] == "success":
+                result = _cache_result(result_keys[index], result,
+                                       {"annotated_image_path": result["annotated_image_path"]})
+            results[index] = result
 
-        # Conversion de ObjectId en string pour le JSON
-        for alert in alerts:
-            alert["_id"] = str(alert["_id"])
+        logger.info(f"🗂️ Lot de {len(images)} images: {len(to_analyze)} analysées en "
+                    f"{time.perf_counter() - start:.2f}s")
+        return jsonify({
+            "status": "success",
+            "count": len(images),
+            "analyzed": len(to_analyze),
+            "cached": sum(1 for result in results if result.get("cached")),
+            "intrusions": sum(1 for result in results if result.get("intrusion_detected")),
+            "processing_time": round(time.perf_counter() - start, 3),
+            "results": [{"name": name, **result} for (name, _), result in zip(images, results)],
+        }), 200
+    except Exception as e:
+        logger.exception(f"🚨 Erreur lors du traitement du lot d'images: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-        logger.info(f"📊 {len(alerts)} alertes récupérées")
-        return jsonify({"status": "success", "alerts": alerts}), 200
+@detection_api.route("/jobs/<job_id>", methods=["GET"])
+def get_job_status(job_id):
+    """⏳ Statut et progression (frames traitées / total) d'un job d'analyse vidéo."""
+    job = video_jobs.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Job introuvable"}), 404
+    return jsonify(job.to_status()), 200
 
+@detection_api.route("/jobs/<job_id>/result", methods=["GET"])
+def get_job_result(job_id):
+    """📄 Résultat d'un job terminé (202 tant que l'analyse est en cours, 410 si elle a été annulée)."""
+    job = video_jobs.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Job introuvable"}), 404
+    if job.status in ("queued", "running"):
+        return jsonify(job.to_status()), 202
+    if job.status == "error":
+        return jsonify({"status": "error", "job_id": job_id, "message": job.error}), 500
+    if job.status == "cancelled":
+        return jsonify({"status": "cancelled", "job_id": job_id, "message": job.error}), 410
+    if job.result.get("detections_path"):
+        return jsonify({**job.result, "video_url": url_for("detection_api.get_job_video", job_id=job_id)}), 200
+    return jsonify(job.result), 200
+
+@detection_api.route("/jobs/<job_id>/video", methods=["GET"])
+def get_job_video(job_id):
+    """
+    🎬 Vidéo annotée d'un job terminé, rendue à la demande depuis ses détections enregistrées.
+    - `?start=<s>&end=<s>` : extrait entre deux instants (secondes depuis le début de la vidéo).
+    - `?around=<s>&padding=<s>` : extrait centré sur un instant (ex. le `time` d'une détection ou d'une alerte).
+    - Sans paramètre : vidéo entière (celle encodée pendant l'analyse si RENDER_ANNOTATED_VIDEO=1, ou déjà
+      rendue) ; sinon son rendu passe par la file d'analyse : 202 avec le job de rendu, dont `video_url`
+      sert la vidéo une fois terminé (503 si la file est saturée).
+    """
+    job = video_jobs.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Job introuvable"}), 404
+    if job.status in ("queued", "running"):
+        return jsonify(job.to_status()), 202
+    result = job.result or {}
+    try:
+        start = request.args.get("start", type=float)
+        end = request.args.get("end", type=float)
+        around = request.args.get("around", type=float)
+        if around is not None:
+            padding = request.args.get("padding", CLIP_PADDING_S, type=float)
+            start, end = max(around - padding, 0.0), around + padding
+        if start is None and end is None and result.get("video_path") and os.path.exists(result["video_path"]):
+            return send_file(os.path.abspath(result["video_path"]), mimetype="video/mp4")
+        if not result.get("detections_path"):
+            return jsonify({"status": "error", "message": "Aucune détection enregistrée pour ce job"}), 404
+        if start is None and end is None:
+            rendered_path = clip_path_for(result["detections_path"], 1, None)
+            if os.path.exists(rendered_path):
+                return send_file(os.path.abspath(rendered_path), mimetype="video/mp4")
+            render_job = _render_job(result)
+            return jsonify({**render_job.to_status(),
+                            "status_url": url_for("detection_api.get_job_status", job_id=render_job.job_id),
+                            "video_url": url_for("detection_api.get_job_video", job_id=render_job.job_id)}), 202
+        clip = render_clip(result["detections_path"], start, end, video_path=result.get("source_video_path"))
+    except QueueFullError:
+        return _queue_full_response()
+    except RenderError as e:
+        return jsonify({"status": "error", "message": str(e)}), 410
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.exception(f"🚨 Erreur lors du rendu de la vidéo: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+    return send_file(os.path.abspath(clip["video_path"]), mimetype="video/mp4")
+
+@detection_api.route("/metrics", methods=["GET"])
+def get_metrics():
+    """📈 Compteurs et histogrammes au format texte Prometheus (latences par étage, frames, alertes, MongoDB)."""
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+@detection_api.route("/alerts", methods=["GET"])
+def get_alerts():
+    """
+    📌 API pour récupérer les alertes stockées dans MongoDB, de la plus récente à la plus ancienne.
+    - Filtres optionnels : `object_type`, `threat_level`, `zone_id`, période `since` / `until` (ISO 8601).
+    - Pagination par curseur : `limit` (500 max) et `cursor` (le `next_cursor` de la page précédente) ;
+      409 avec `cursor` tant que d'anciennes alertes ont un timestamp texte (MIGRATE_ALERT_TIMESTAMPS=1).
+    - `fields` : liste de champs séparés par des virgules, ou `all` (par défaut sans `bbox` ni `frame`).
+    """
+    try:
+        page = find_alerts(limit=int(request.args.get("limit", 20)),
+                           cursor=request.args.get("cursor"),
+                           object_type=request.args.get("object_type"),
+                           threat_level=request.args.get("threat_level"),
+                           zone_id=request.args.get("zone_id"),
+                           since=request.args.get("since"),
+                           until=request.args.get("until"),
+                           fields=request.args.get("fields"))
+
+        logger.info(f"📊 {len(page['alerts'])} alertes récupérées")
+        return jsonify({"status": "success", **page}), 200
+
+    except (InvalidQueryError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except MigrationRequiredError as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
     except Exception as e:
         logger.error(f"🚨 Erreur lors de la récupération des alertes: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
+
+@detection_api.route("/alerts/summary", methods=["GET"])
+def get_alerts_summary():
+    """
+    📈 Résumé des alertes lu dans les agrégats pré-calculés (pas de parcours des alertes brutes).
+    - `granularity` : `minute` (défaut, 60 dernières minutes) ou `hour` (24 dernières heures).
+    - `since` / `until` (ISO 8601), `video_path` optionnel, `top` : taille des classements.
+    """
+    try:
+        since, until = request.args.get("since"), request.args.get("until")
+        summary = summarize(granularity=request.args.get("granularity", "minute"),
+                            since=parse_datetime(since) if since else None,
+                            until=parse_datetime(until) if until else None,
+                            video_path=request.args.get("video_path"),
+                            top=int(request.args.get("top", 10)))
+        return jsonify({"status": "success", **summary}), 200
+
+    except (InvalidQueryError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"🚨 Erreur lors du résumé des alertes: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@detection_api.route("/alerts/rollups/rebuild", methods=["POST"])
+def rebuild_alert_rollups():
+    """🔁 Recalcule les agrégats depuis les alertes brutes (en arrière-plan) ; `since` / `until` optionnels."""
+    try:
+        since, until = request.args.get("since"), request.args.get("until")
+        since = parse_datetime(since) if since else None
+        until = parse_datetime(until) if until else None
+    except InvalidQueryError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if is_rebuilding():
+        return jsonify({"status": "error", "message": "Reconstruction déjà en cours"}), 409
+
+    def rebuild():
+        try:
+            rebuild_rollups(since, until)
+        except Exception as e:
+            logger.error(f"🚨 Échec de la reconstruction des agrégats: {str(e)}")
+
+    threading.Thread(target=rebuild, name="rollup-rebuild", daemon=True).start()
+    return jsonify({"status": "started"}), 202
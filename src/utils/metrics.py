@@ -0,0 +1,245 @@
+import abc
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# 📈 Métriques de l'application au format texte Prometheus (exposées par /api/detection/metrics).
+# Implémentation minimale sans dépendance : un compteur ou un histogramme coûte un verrou et
+# une addition par observation, assez peu pour rester actif en production.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._child(())
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """Valeur d'une combinaison d'étiquettes (compteur, jauge ou histogramme)."""
+
+    def _child(self, values: Tuple[str, ...]):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def labels(self, **labels):
+        return self._child(tuple(str(labels[name]) for name in self.labelnames))
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for values, child in sorted(self._children.items()):
+            yield from child.render(self.name, self.labelnames, values)
+
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def render(self, name, labelnames, values):
+        yield f"{name}{_format_labels(labelnames, values)} {_format_value(self._value)}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self._value = value
+
+    def set_function(self, function: Callable[[], float]):
+        """Valeur calculée à chaque lecture (profondeur d'une file, nombre de jobs...)."""
+        self._function = function
+
+    def render(self, name, labelnames, values):
+        value = self._value
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception:
+                return
+        yield f"{name}{_format_labels(labelnames, values)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def set_function(self, function: Callable[[], float]):
+        self._default.set_function(function)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)  # Dernier : au-delà du plus grand seuil
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def render(self, name, labelnames, values):
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative = 0
+        for bound, count in zip(self._buckets + (float("inf"),), counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            yield f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}"
+        yield f"{name}_sum{_format_labels(labelnames, values)} {_format_value(total)}"
+        yield f"{name}_count{_format_labels(labelnames, values)} {cumulative}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrique déjà enregistrée : {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ⏱️ Durée de chaque étage du chemin critique, par source (video, image, live)
+STAGE_SECONDS = registry.register(Histogram(
+    "intrusdetect_stage_seconds", "Durée d'un étage de traitement, ramenée à une frame (secondes)",
+    ("source", "stage")))
+FRAMES = registry.register(Counter(
+    "intrusdetect_frames_total", "Frames traitées", ("source",)))
+FRAMES_INFERRED = registry.register(Counter(
+    "intrusdetect_frames_inferred_total", "Frames envoyées au modèle", ("source",)))
+INFERENCE_BATCH = registry.register(Histogram(
+    "intrusdetect_inference_batch_size", "Nombre d'images par appel au modèle", ("source",),
+    buckets=(1, 2, 4, 8, 16, 32, 64)))
+INFERENCE_PIXELS = registry.register(Counter(
+    "intrusdetect_inference_pixels_total",
+    "Pixels source analysés par le modèle (mode « full » : frame entière, « regions » : zones en mouvement)",
+    ("source", "mode")))
+
+# 🚨 Alertes et écritures MongoDB
+ALERTS = registry.register(Counter(
+    "intrusdetect_alerts_total", "Alertes produites", ("threat_level",)))
+ALERT_EVENTS = registry.register(Counter(
+    "intrusdetect_alert_events_total", "Évènements d'alerte ouverts (un par objet suivi)", ("threat_level",)))
+ALERT_SUBMIT_SECONDS = registry.register(Histogram(
+    "intrusdetect_alert_submit_seconds", "Durée de save_alert (construction + mise en file)",
+    buckets=(0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.001, 0.01)))
+MONGO_WRITE_SECONDS = registry.register(Histogram(
+    "intrusdetect_mongo_write_seconds", "Durée d'un insert_many groupé d'alertes"))
+MONGO_WRITE_FAILURES = registry.register(Counter(
+    "intrusdetect_mongo_write_failures_total", "Échecs d'écriture MongoDB (alertes envoyées au spool)"))
+ALERTS_WRITTEN = registry.register(Counter(
+    "intrusdetect_alerts_written_total", "Alertes écrites dans MongoDB"))
+ALERTS_SPOOLED = registry.register(Counter(
+    "intrusdetect_alerts_spooled_total", "Alertes écrites dans le spool local"))
+ROLLUP_WRITE_FAILURES = registry.register(Counter(
+    "intrusdetect_rollup_write_failures_total", "Échecs de mise à jour des agrégats d'alertes"))
+
+# 🎥 Détection multi-caméras
+LIVE_FRAMES_DROPPED = registry.register(Counter(
+    "intrusdetect_live_frames_dropped_total", "Frames remplacées par une plus récente avant d'être inférées",
+    ("camera",)))
+LIVE_FRAME_AGE_SECONDS = registry.register(Histogram(
+    "intrusdetect_live_frame_age_seconds", "Délai entre la capture d'une frame et la fin de son post-traitement"))
+LIVE_CAMERAS = registry.register(Gauge(
+    "intrusdetect_live_cameras", "Caméras par état de connexion", ("state",)))
+LIVE_QUALITY_LEVEL = registry.register(Gauge(
+    "intrusdetect_live_quality_level", "Niveau de qualité adaptatif (0 = qualité maximale)", ("camera",)))
+
+# 📥 Files d'attente (valeurs lues au moment du scrape)
+QUEUE_DEPTH = registry.register(Gauge(
+    "intrusdetect_queue_depth", "Éléments en attente dans une file", ("queue",)))
+VIDEO_JOBS = registry.register(Gauge(
+    "intrusdetect_video_jobs", "Jobs d'analyse vidéo par état", ("state",)))
+
+
+def observe_stage(source: str, stage: str, seconds: float):
+    STAGE_SECONDS.labels(source=source, stage=stage).observe(seconds)
@@ -0,0 +1,25 @@
+import cProfile
+import os
+import time
+from typing import Any, Callable, Tuple
+
+PROFILE_DIR = os.path.join("uploads", "profiles")
+
+
+def run_profiled(name: str, func: Callable[..., Any], *args, **kwargs) -> Tuple[Any, str]:
+    """
+    🔬 Exécute `func` sous cProfile et enregistre le profil dans `uploads/profiles/<name>_<horodatage>.prof`.
+    Lecture : `python -m pstats fichier.prof` ou snakeviz. Seul le thread appelant est profilé
+    (en mode pipeline, les étages décodage/encodage tournent dans d'autres threads).
+    Retourne le résultat de `func` et le chemin du profil.
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_path = os.path.join(PROFILE_DIR, f"{name}_{time.strftime('%Y%m%d_%H%M%S')}.prof")
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+    return result, profile_path
@@ -0,0 +1,286 @@
+import hashlib
+import os
+import struct
+import threading
+import time
+import zipfile
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+import cv2
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+CHUNK_SIZE = 1024 * 1024
+HEAD_BYTES = 64 * 1024  # Assez pour reconnaître le conteneur et la position des boîtes MP4 de tête
+PROBE_BYTES = 4 * 1024 * 1024  # Portion reçue sur laquelle OpenCV doit pouvoir décoder une frame
+
+# Signatures de fichiers (octets de tête) -> format
+VIDEO_CONTAINERS = ("mp4", "avi", "mkv")
+IMAGE_CONTAINERS = ("jpeg", "png", "bmp", "webp")
+
+
+class UploadRejected(Exception):
+    """Upload refusé pendant la réception (taille, conteneur ou codec) ; `status` est le code HTTP."""
+
+    def __init__(self, message: str, status: int = 415):
+        super().__init__(message)
+        self.status = status
+
+
+def sniff_container(head: bytes) -> Optional[str]:
+    """Format d'après les premiers octets (indépendant de l'extension annoncée par le client)."""
+    if len(head) >= 12 and head[4:8] == b"ftyp":
+        return "mp4"  # MP4 / MOV / M4V
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "avi"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return "mkv"  # Matroska / WebM (EBML)
+    if head[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    if head[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if head[:2] == b"BM":
+        return "bmp"
+    return None
+
+
+def _mp4_top_level_boxes(head: bytes) -> Iterator[str]:
+    offset = 0
+    while offset + 8 <= len(head):
+        size, box_type = struct.unpack(">I4s", head[offset:offset + 8])
+        if size == 1 and offset + 16 <= len(head):
+            size = struct.unpack(">Q", head[offset + 8:offset + 16])[0]  # Taille sur 64 bits
+        yield box_type.decode("latin-1")
+        if size < 8:
+            return  # 0 : la boîte va jusqu'à la fin du fichier
+        offset += size
+
+
+def is_progressive(head: bytes) -> bool:
+    """
+    MP4/MOV « faststart » : l'index (`moov`) précède les données (`mdat`), donc les frames reçues
+    sont décodables avant la fin de l'upload, et le positionnement par numéro de frame est exact.
+    """
+    if sniff_container(head) != "mp4":
+        return False
+    for box_type in _mp4_top_level_boxes(head):
+        if box_type == "moov":
+            return True
+        if box_type == "mdat":
+            return False
+    return False
+
+
+def probe_video(path: str) -> Optional[str]:
+    """Tente de décoder une frame avec OpenCV ; retourne un message d'erreur ou None si la vidéo est lisible."""
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return "Conteneur vidéo illisible"
+        ret, frame = cap.read()
+        if not ret or frame is None or frame.size == 0:
+            return "Codec vidéo non supporté ou flux vide"
+        return None
+    finally:
+        cap.release()
+
+
+def probe_image(path: str) -> Optional[str]:
+    """Vérifie via l'en-tête du fichier qu'OpenCV dispose d'un décodeur pour cette image."""
+    return None if cv2.haveImageReader(path) else "Image illisible ou format non supporté"
+
+
+def iter_request_file(stream: BinaryIO, content_type: str, field: str, filename: str = "",
+                      chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[str, bytes]]:
+    """
+    Lit le fichier `field` d'un corps de requête au fil de l'eau, en morceaux `(nom du fichier, octets)`.
+    - `multipart/form-data` : découpage incrémental (le corps n'est jamais chargé ni copié en entier).
+    - Autre type (`video/mp4`, `application/octet-stream`...) : le corps brut est le fichier, nommé `filename`.
+    """
+    mimetype, options = parse_options_header(content_type or "")
+    if mimetype != "multipart/form-data":
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return
+            yield filename, chunk
+
+    boundary = options.get("boundary")
+    if not boundary:
+        raise UploadRejected("Corps multipart sans délimiteur", status=400)
+    decoder = MultipartDecoder(boundary.encode("latin-1"))
+    current = None  # Nom du fichier si la partie en cours est celle attendue
+    while True:
+        chunk = stream.read(chunk_size)
+        decoder.receive_data(chunk or None)  # None : fin du corps
+        event = decoder.next_event()
+        while not isinstance(event, NeedData):
+            if isinstance(event, File):
+                current = event.filename if event.name == field else None
+            elif isinstance(event, Field):
+                current = None
+            elif isinstance(event, Data) and current is not None:
+                if event.data:
+                    yield current, event.data
+                if not event.more_data:
+                    return  # Fichier complet : les parties suivantes sont ignorées
+            elif isinstance(event, Epilogue):
+                return
+            event = decoder.next_event()
+        if not chunk:
+            return
+
+
+def read_image_archive(fileobj: BinaryIO, extensions: Tuple[str, ...], max_images: int, max_image_bytes: int,
+                       max_total_bytes: int) -> List[Tuple[str, bytes]]:
+    """
+    Images d'une archive ZIP `(nom, octets)`, dans l'ordre de l'archive (dossiers et autres fichiers ignorés).
+    Les tailles décompressées annoncées sont vérifiées avant toute extraction (archives piégées).
+    """
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise UploadRejected("Archive ZIP invalide", status=400)
+    with archive:
+        members = [info for info in archive.infolist()
+                   if not info.is_dir() and info.filename.lower().endswith(extensions)]
+        if len(members) > max_images:
+            raise UploadRejected(f"Trop d'images dans l'archive (max {max_images})", status=413)
+        if any(info.file_size > max_image_bytes for info in members) or \
+                sum(info.file_size for info in members) > max_total_bytes:
+            raise UploadRejected("Archive trop volumineuse une fois décompressée", status=413)
+        try:
+            return [(os.path.basename(info.filename), archive.read(info)) for info in members]
+        except (zipfile.BadZipFile, OSError, NotImplementedError, RuntimeError) as e:  # CRC, chiffrement...
+            raise UploadRejected(f"Archive ZIP illisible: {e}", status=400)
+
+
+class StreamingUpload:
+    """
+    📥 Fichier en cours de réception, écrit sur disque morceau par morceau.
+    - SHA-256 et taille calculés au passage ; au-delà de `max_bytes`, l'upload est refusé (413).
+    - Des lecteurs d'autres threads (analyse démarrée avant la fin) attendent la suite avec `wait_for`.
+    """
+
+    def __init__(self, path: str, max_bytes: int, expected_size: Optional[int] = None):
+        if expected_size is not None and expected_size > max_bytes:
+            raise UploadRejected(f"Fichier trop volumineux (max {max_bytes // (1024 * 1024)} Mo)", status=413)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.expected_size = expected_size  # Content-Length (corps complet) si connu
+        self.size = 0
+        self.head = b""
+        self.content_hash: Optional[str] = None
+        self.complete = False
+        self.error: Optional[str] = None
+        self._digest = hashlib.sha256()
+        self._file = open(path, "wb")
+        self._changed = threading.Condition()
+
+    def write(self, chunk: bytes):
+        if self.size + len(chunk) > self.max_bytes:
+            self.abort("Fichier trop volumineux")
+            raise UploadRejected(f"Fichier trop volumineux (max {self.max_bytes // (1024 * 1024)} Mo)", status=413)
+        self._digest.update(chunk)
+        self._file.write(chunk)
+        self._file.flush()  # Visible des lecteurs (OpenCV) dès maintenant
+        if len(self.head) < HEAD_BYTES:
+            self.head += chunk[:HEAD_BYTES - len(self.head)]
+        with self._changed:
+            self.size += len(chunk)
+            self._changed.notify_all()
+
+    def finish(self) -> str:
+        self._file.close()
+        self.content_hash = self._digest.hexdigest()
+        with self._changed:
+            self.complete = True
+            self._changed.notify_all()
+        return self.content_hash
+
+    def abort(self, reason: str):
+        """Upload interrompu ou refusé : le fichier partiel est supprimé et les lecteurs sont réveillés."""
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        with self._changed:
+            self.error = reason
+            self._changed.notify_all()
+
+    def wait_for(self, size: int, timeout: float) -> bool:
+        """Attend que `size` octets soient reçus (ou la fin de l'upload) ; lève UploadRejected si l'upload échoue."""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while self.size < size and not self.complete and self.error is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            if self.error is not None:
+                raise UploadRejected(f"Upload interrompu: {self.error}", status=400)
+            return self.size >= size or self.complete
+
+
+class GrowingVideoCapture:
+    """
+    🎞️ Équivalent de `cv2.VideoCapture` pour une vidéo progressive en cours d'upload.
+    - Une frame n'est lue que lorsque la part du fichier qui la contient est reçue (estimation linéaire
+      sur la taille annoncée, avec une marge), sinon la lecture attend.
+    - Si OpenCV atteint malgré tout la fin des données reçues, la capture est rouverte et repositionnée
+      sur la frame suivante dès que de nouveaux octets arrivent.
+    """
+
+    def __init__(self, upload: StreamingUpload, stall_timeout: float = 60.0, margin_bytes: int = CHUNK_SIZE):
+        self.upload = upload
+        self.stall_timeout = stall_timeout  # Upload bloqué plus longtemps : la lecture échoue
+        self.margin_bytes = margin_bytes
+        self.position = 0  # Frames déjà lues
+        self._cap = cv2.VideoCapture(upload.path)
+        self.total_frames = int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def isOpened(self) -> bool:  # noqa: N802 (interface de cv2.VideoCapture)
+        return self._cap.isOpened()
+
+    def get(self, prop: int) -> float:
+        return self._cap.get(prop)
+
+    def set(self, prop: int, value: float) -> bool:
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.position = int(value)
+        return self._cap.set(prop, value)
+
+    def _bytes_needed(self, frame_index: int) -> int:
+        expected = self.upload.expected_size
+        if not expected or not self.total_frames:
+            return 0
+        margin = max(self.margin_bytes, expected // 50)
+        return min(expected * (frame_index + 1) // self.total_frames + margin, expected)
+
+    def read(self):
+        self._wait(self._bytes_needed(self.position))
+        reopened_after_complete = False
+        while True:
+            ret, frame = self._cap.read()
+            if ret:
+                self.position += 1
+                return ret, frame
+            if self.upload.complete:
+                if reopened_after_complete:
+                    return False, None  # Fin réelle de la vidéo
+                reopened_after_complete = True
+            else:
+                self._wait(self.upload.size + 1)
+            # Fin des données disponibles : reprise sur la frame suivante avec les nouveaux octets
+            self._cap.release()
+            self._cap = cv2.VideoCapture(self.upload.path)
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, self.position)
+
+    def _wait(self, size: int):
+        if not self.upload.wait_for(size, self.stall_timeout):
+            raise UploadRejected("Upload interrompu: plus aucune donnée reçue", status=408)
+
+    def release(self):
+        self._cap.release()
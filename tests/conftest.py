@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+
+@pytest.fixture(scope="session")
+def client(tmp_path_factory):
+    """Client de test de l'API ; les dossiers d'upload sont créés dans un dossier temporaire."""
+    os.chdir(tmp_path_factory.mktemp("api"))
+    from app import create_app
+    return create_app().test_client()
@@ -0,0 +1,35 @@
+import threading
+import time
+
+from routes.detectionRoutes import video_jobs
+
+
+def _wait_finished(job, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while job.status in ("queued", "running") and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_cancelled_job_result_is_gone(client):
+    started = threading.Event()
+    release = threading.Event()
+
+    def handler(video_path, progress_callback):
+        started.set()
+        release.wait(5)
+        progress_callback(1, 1)  # Lève JobCancelled : le job a été annulé entre-temps
+        return {"status": "success"}
+
+    job = video_jobs.submit("video.mp4", handler=handler)
+    assert started.wait(5)
+    video_jobs.cancel(job)
+    release.set()
+    _wait_finished(job)
+    assert job.status == "cancelled"
+
+    response = client.get(f"/api/detection/jobs/{job.job_id}/result")
+    assert response.status_code == 410
+    assert response.get_json() == {"status": "cancelled", "job_id": job.job_id, "message": "Job annulé"}
+
+    response = client.get(f"/api/detection/jobs/{job.job_id}")
+    assert response.get_json()["status"] == "cancelled"